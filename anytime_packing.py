@@ -0,0 +1,372 @@
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.calculations import TruckCalculator
+
+# Relative slack when checking whether boxes fit, against floating point noise
+EPSILON = 1e-9
+
+# Least loaded trucks tried per step when emptying trucks into the others
+EMPTY_CANDIDATES = 3
+
+# Fit count of a box without volume or weight; more boxes than any manifest holds
+FIT_CAP = 1e12
+
+
+def _fit_counts(free_volume: np.ndarray, free_weight: np.ndarray, volume: float, weight: float) -> np.ndarray:
+    """Boxes of one size that still fit into each truck"""
+    limits = np.full(free_volume.shape, FIT_CAP)
+    if volume > 0:
+        limits = np.minimum(limits, free_volume / volume)
+    if weight > 0:
+        limits = np.minimum(limits, free_weight / weight)
+    return np.floor(np.maximum(limits, 0) + EPSILON)
+
+
+def dimension_bound(sizes: np.ndarray, counts: np.ndarray) -> int:
+    """
+    Martello-Toth L2 bound for one dimension with capacity 1
+
+    Boxes above half a truck cannot share a truck with each other, and boxes between
+    alpha and one half can only fill the room those large boxes leave; the bound is the
+    best over all alpha taken from the box sizes.
+
+    Args:
+        sizes: Box sizes as a share of the truck capacity (clipped at 1)
+        counts: Number of boxes of each size
+
+    Returns:
+        Lower bound on the number of trucks
+    """
+    mask = counts > 0
+    sizes, counts = sizes[mask], counts[mask]
+    if sizes.size == 0:
+        return 0
+
+    alphas = np.unique(np.concatenate([[0.0], sizes[sizes <= 0.5]]))
+    large = sizes > 0.5
+    small = ~large
+
+    # Rows: alpha candidates; columns: box sizes
+    j1 = large[None, :] & (sizes[None, :] > 1 - alphas[:, None] + EPSILON)
+    j2 = large[None, :] & ~j1
+    j3 = small[None, :] & (sizes[None, :] >= alphas[:, None] - EPSILON)
+
+    n1 = (j1 * counts).sum(axis=1)
+    n2 = (j2 * counts).sum(axis=1)
+    room = n2 - (j2 * counts * sizes).sum(axis=1)
+    demand = (j3 * counts * sizes).sum(axis=1)
+
+    bounds = n1 + n2 + np.maximum(0, np.ceil(demand - room - EPSILON))
+    return int(bounds.max())
+
+
+class AnytimePacker:
+    """Box-to-truck assignment that keeps improving within a time budget and reports its optimality gap"""
+
+    def __init__(self, truck_spec: Dict[str, float], seed: Optional[int] = None):
+        """
+        Initialize packer
+
+        Args:
+            truck_spec: Dictionary containing 'volume' and 'weight' capacity
+            seed: Seed for the randomized restarts
+        """
+        self.calculator = TruckCalculator(truck_spec)
+        self.truck_volume_capacity = truck_spec['volume']
+        self.truck_weight_capacity = truck_spec['weight']
+        self.rng = np.random.default_rng(seed)
+
+    def lower_bound(self, skus: List[Dict[str, Any]]) -> int:
+        """
+        Lower bound on the trucks needed
+
+        The continuous volume and weight bounds, strengthened by the L2 bound of each
+        dimension for loads with large boxes.
+
+        Args:
+            skus: List of SKU dictionaries
+
+        Returns:
+            Trucks no assignment can go below
+        """
+        return self._lower_bound(*self._arrays(skus))
+
+    def _lower_bound(self, volumes: np.ndarray, weights: np.ndarray, counts: np.ndarray) -> int:
+        """Lower bound from per-SKU box arrays"""
+        # A box larger than a truck still takes exactly one truck
+        volume_sizes = np.minimum(volumes / self.truck_volume_capacity, 1.0)
+        weight_sizes = np.minimum(weights / self.truck_weight_capacity, 1.0)
+
+        return max(
+            # Boxes without volume or weight still ride in a truck
+            1 if counts.sum() > 0 else 0,
+            math.ceil((volume_sizes * counts).sum() - EPSILON),
+            math.ceil((weight_sizes * counts).sum() - EPSILON),
+            dimension_bound(volume_sizes, counts),
+            dimension_bound(weight_sizes, counts)
+        )
+
+    def solve(self, skus: List[Dict[str, Any]], time_budget: float = 1.0,
+              progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+        """
+        Assign boxes to trucks, improving until the lower bound is reached or time runs out
+
+        Args:
+            skus: List of SKU dictionaries
+            time_budget: Seconds to spend; the first-fit decreasing solution is always completed
+            progress: Optional callback receiving the elapsed share of the budget and the incumbent
+
+        Returns:
+            Dictionary in the TruckCalculator format with 'trucks_needed' from the best
+            assignment, plus 'lower_bound', 'optimality_gap' (% of the incumbent),
+            'solver_status', 'iterations', 'solve_time' and the per-truck 'truck_loads'
+        """
+        return self.report(skus, self.solve_arrays(*self._arrays(skus), time_budget=time_budget, progress=progress))
+
+    def solve_arrays(self, volumes: np.ndarray, weights: np.ndarray, counts: np.ndarray, time_budget: float = 1.0,
+                     progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+        """
+        Assignment of per-SKU box arrays, e.g. views of a shared manifest
+
+        Starts from first-fit decreasing, then alternates emptying the least loaded truck
+        into the others with restarts on perturbed box orders, keeping the best assignment.
+
+        Args:
+            volumes: Box volume per SKU
+            weights: Box weight per SKU
+            counts: Quantity per SKU
+            time_budget: Seconds to spend; the first-fit decreasing solution is always completed
+            progress: Optional callback receiving the elapsed share of the budget and the incumbent
+
+        Returns:
+            Dictionary with the per-truck 'free_volume', 'free_weight' and 'contents'
+            (SKU index -> boxes), plus 'lower_bound', 'solver_status', 'iterations' and 'solve_time'
+        """
+        start = time.perf_counter()
+        bound = self._lower_bound(volumes, weights, counts)
+
+        # Boxes without volume or weight take no room; they are packed last, into the first truck
+        sizeless = np.flatnonzero((volumes <= 0) & (weights <= 0) & (counts > 0))
+        if sizeless.size:
+            counts = counts.copy()
+            sizeless_counts = counts[sizeless]
+            counts[sizeless] = 0
+
+        sizes = np.maximum(volumes / self.truck_volume_capacity, weights / self.truck_weight_capacity)
+        deadline = start + time_budget
+        best = self._first_fit(volumes, weights, counts, np.argsort(-sizes, kind='stable'))
+        best = self._empty_trucks(best, volumes, weights, sizes, deadline)
+        iterations = 1
+
+        orders = [
+            np.argsort(-volumes, kind='stable'),
+            np.argsort(-weights, kind='stable'),
+            np.argsort(-(volumes / self.truck_volume_capacity + weights / self.truck_weight_capacity), kind='stable')
+        ]
+
+        while len(best['contents']) > bound:
+            elapsed = time.perf_counter() - start
+            if elapsed >= time_budget:
+                break
+            if progress:
+                progress(elapsed / time_budget, f"{len(best['contents'])} trucks, bound {bound}")
+
+            if iterations <= len(orders):
+                order = orders[iterations - 1]
+            else:
+                order = np.argsort(-sizes * self.rng.uniform(0.7, 1.3, sizes.size), kind='stable')
+
+            candidate = self._first_fit(volumes, weights, counts, order)
+            if time.perf_counter() < deadline:
+                candidate = self._empty_trucks(candidate, volumes, weights, sizes, deadline)
+            if len(candidate['contents']) < len(best['contents']):
+                best = candidate
+            iterations += 1
+
+        if sizeless.size:
+            best = self._place_sizeless(best, sizeless, sizeless_counts)
+
+        return dict(
+            best,
+            lower_bound=bound,
+            solver_status='optimal' if len(best['contents']) <= bound else 'time_budget',
+            iterations=iterations,
+            solve_time=time.perf_counter() - start
+        )
+
+    def _place_sizeless(self, solution: Dict[str, Any], sizeless: np.ndarray,
+                        sizeless_counts: np.ndarray) -> Dict[str, Any]:
+        """Put boxes without volume or weight into the first truck, opening one if there is none"""
+        if not solution['contents']:
+            solution = {'free_volume': np.array([float(self.truck_volume_capacity)]),
+                        'free_weight': np.array([float(self.truck_weight_capacity)]),
+                        'contents': [{}]}
+        solution['contents'][0].update(zip(sizeless.tolist(), sizeless_counts.tolist()))
+        return solution
+
+    def _arrays(self, skus: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Per-SKU box volume, box weight and quantity"""
+        return (
+            np.array([float(sku['volume_per_box']) for sku in skus]),
+            np.array([float(sku['weight_per_box']) for sku in skus]),
+            np.array([int(sku['quantity']) for sku in skus], dtype=float)
+        )
+
+    def _first_fit(self, volumes: np.ndarray, weights: np.ndarray, counts: np.ndarray,
+                   order: np.ndarray) -> Dict[str, Any]:
+        """First-fit of whole SKU groups in the given order, vectorized over the open trucks"""
+        # Free capacity arrays grow by doubling; only the first len(contents) entries are trucks
+        free_volume = np.empty(16)
+        free_weight = np.empty(16)
+        # Per truck: SKU index -> boxes
+        contents: List[Dict[int, float]] = []
+
+        for sku in order.tolist():
+            remaining = counts[sku]
+            if remaining <= 0:
+                continue
+
+            opened = len(contents)
+            if opened:
+                fits = _fit_counts(free_volume[:opened], free_weight[:opened], volumes[sku], weights[sku])
+                # Take from each truck in order until the SKU is placed
+                before = np.cumsum(fits) - fits
+                placed = np.clip(remaining - before, 0, fits)
+                touched = np.flatnonzero(placed)
+                free_volume[touched] -= placed[touched] * volumes[sku]
+                free_weight[touched] -= placed[touched] * weights[sku]
+                for truck, count in zip(touched.tolist(), placed[touched].tolist()):
+                    contents[truck][sku] = count
+                remaining -= placed[touched].sum()
+
+            if remaining > 0:
+                per_truck = _fit_counts(np.array([self.truck_volume_capacity]), np.array([self.truck_weight_capacity]),
+                                        volumes[sku], weights[sku])[0]
+                # An oversized box still gets its own truck
+                per_truck = max(1.0, min(per_truck, remaining))
+                new_trucks = math.ceil(remaining / per_truck)
+
+                while opened + new_trucks > free_volume.size:
+                    free_volume = np.concatenate([free_volume, np.empty(free_volume.size)])
+                    free_weight = np.concatenate([free_weight, np.empty(free_weight.size)])
+
+                placed = np.full(new_trucks, per_truck)
+                placed[-1] = remaining - per_truck * (new_trucks - 1)
+                free_volume[opened:opened + new_trucks] = self.truck_volume_capacity - placed * volumes[sku]
+                free_weight[opened:opened + new_trucks] = self.truck_weight_capacity - placed * weights[sku]
+                contents.extend({sku: count} for count in placed.tolist())
+
+        return {'free_volume': free_volume[:len(contents)].copy(), 'free_weight': free_weight[:len(contents)].copy(),
+                'contents': contents}
+
+    def _empty_trucks(self, solution: Dict[str, Any], volumes: np.ndarray, weights: np.ndarray,
+                      sizes: np.ndarray, deadline: float) -> Dict[str, Any]:
+        """Move the contents of lightly loaded trucks into the room left in the others while time allows"""
+        free_volume = solution['free_volume']
+        free_weight = solution['free_weight']
+        contents = solution['contents']
+
+        while len(contents) > 1 and time.perf_counter() < deadline:
+            fill = np.maximum(1 - free_volume / self.truck_volume_capacity, 1 - free_weight / self.truck_weight_capacity)
+
+            # Try the few least loaded trucks; stop once none of them can be emptied
+            for target in np.argsort(fill)[:EMPTY_CANDIDATES].tolist():
+                moves = self._moves_out_of(target, free_volume, free_weight, contents[target], volumes, weights, sizes)
+                if moves is not None:
+                    break
+            else:
+                break
+
+            for sku, trucks, placed in moves:
+                free_volume[trucks] -= placed * volumes[sku]
+                free_weight[trucks] -= placed * weights[sku]
+                for truck, count in zip(trucks.tolist(), placed.tolist()):
+                    contents[truck][sku] = contents[truck].get(sku, 0) + count
+
+            free_volume = np.delete(free_volume, target)
+            free_weight = np.delete(free_weight, target)
+            del contents[target]
+
+        return {'free_volume': free_volume, 'free_weight': free_weight, 'contents': contents}
+
+    def _moves_out_of(self, target: int, free_volume: np.ndarray, free_weight: np.ndarray,
+                      boxes: Dict[int, float], volumes: np.ndarray, weights: np.ndarray,
+                      sizes: np.ndarray) -> Optional[List[Tuple[int, np.ndarray, np.ndarray]]]:
+        """Placements that move every box of one truck into the others, or None if they do not fit"""
+        trial_volume = free_volume.copy()
+        trial_weight = free_weight.copy()
+        # The emptied truck takes nothing back
+        trial_volume[target] = -1.0
+        trial_weight[target] = -1.0
+
+        moves = []
+        # Largest boxes first, into the fullest trucks that still have room
+        for sku in sorted(boxes, key=lambda sku: -sizes[sku]):
+            count = boxes[sku]
+            fits = _fit_counts(trial_volume, trial_weight, volumes[sku], weights[sku])
+            fits[target] = 0
+            candidates = np.flatnonzero(fits)
+            if fits[candidates].sum() < count:
+                return None
+
+            tightness = candidates[np.argsort(trial_volume[candidates] / self.truck_volume_capacity +
+                                              trial_weight[candidates] / self.truck_weight_capacity, kind='stable')]
+            ordered = fits[tightness]
+            before = np.cumsum(ordered) - ordered
+            placed = np.clip(count - before, 0, ordered)
+            used = placed > 0
+
+            trucks, placed = tightness[used], placed[used]
+            trial_volume[trucks] -= placed * volumes[sku]
+            trial_weight[trucks] -= placed * weights[sku]
+            moves.append((sku, trucks, placed))
+
+        return moves
+
+    def report(self, skus: List[Dict[str, Any]], solution: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Result of an assignment in the TruckCalculator format
+
+        Args:
+            skus: The SKUs the assignment was solved for, in the same order
+            solution: Assignment as returned by solve_arrays
+
+        Returns:
+            Dictionary as returned by solve
+        """
+        results = self.calculator.calculate_requirements(skus)
+        trucks_needed = len(solution['contents'])
+        bound = solution['lower_bound']
+
+        if trucks_needed > 0:
+            results['trucks_needed'] = trucks_needed
+            results['volume_utilization'] = results['total_volume'] / (self.truck_volume_capacity * trucks_needed) * 100
+            results['weight_utilization'] = results['total_weight'] / (self.truck_weight_capacity * trucks_needed) * 100
+            results['utilization_percentage'] = (results['volume_utilization'] if results['limiting_factor'] == 'volume'
+                                                 else results['weight_utilization'])
+
+        truck_loads = []
+        for i, boxes in enumerate(solution['contents']):
+            # SKU names are not safe as document keys, so boxes are listed per name
+            named: Dict[str, int] = {}
+            for sku, count in boxes.items():
+                named[skus[sku]['name']] = named.get(skus[sku]['name'], 0) + int(count)
+            truck_loads.append({
+                'volume': self.truck_volume_capacity - float(solution['free_volume'][i]),
+                'weight': self.truck_weight_capacity - float(solution['free_weight'][i]),
+                'boxes': [{'name': name, 'boxes': count} for name, count in named.items()]
+            })
+
+        results.update({
+            'lower_bound': bound,
+            'optimality_gap': (trucks_needed - bound) / trucks_needed * 100 if trucks_needed else 0.0,
+            'solver_status': solution['solver_status'],
+            'iterations': solution['iterations'],
+            'solve_time': solution['solve_time'],
+            'truck_loads': truck_loads
+        })
+        return results
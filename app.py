@@ -1,11 +1,40 @@
+import io
+import json
 import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import datetime
 from utils.calculations import TruckCalculator
-from utils.visualizations import create_utilization_chart, create_sku_breakdown_chart
+from utils.visualizations import create_utilization_chart, create_sku_breakdown_chart, create_route_map, create_sensitivity_heatmap, create_truck_distribution_chart
 from utils.optimization import OptimizationEngine
-from utils.database import MongoDBManager
+from utils.database import MongoDBManager, PLAN_RETENTION_DAYS
+from utils.metrics import stage_metrics
+from utils.read_cache import read_cache
+from utils.consolidation import ConsolidationPlanner
+from utils.routing import RoutePlanner, load_gazetteer
+from utils.incremental import IncrementalPlanner
+from utils.sensitivity import capacity_sensitivity
+from utils.uncertainty import simulate_demand, DISTRIBUTIONS
+from utils.fleet_planning import run_daily_plan
+from utils.sku_catalog import SkuCatalog
+from utils.session_history import SessionHistory
+from utils.deferral import DeferralOptimizer
+from utils.palletization import DEFAULT_PALLET_SPEC, pattern_cache_info
+from utils.precompute import PlanPrecomputer, normalize_skus, plan_key
+from utils.jobs import JobRunner, DONE, FAILED, CANCELLED, TIMED_OUT
+from utils.columnar_export import export_calculations
+from utils.archive import archive_calculations, DEFAULT_ARCHIVE_AFTER_DAYS
+from utils.worker_pool import SharedWorkerPool
+from utils.replay import replay_history, REPLAY_PERIODS
+
+# Seconds between progress polls while background jobs run
+JOB_POLL_SECONDS = 1.0
+
+# Seconds a daily fleet plan may run before it is stopped
+FLEET_PLAN_TIME_BUDGET = 300
+
+# Seconds a fleet replay over the stored history may run before it is stopped
+FLEET_REPLAY_TIME_BUDGET = 3600
 
 # Page configuration
 st.set_page_config(
@@ -17,12 +46,189 @@ st.set_page_config(
 def initialize_session_state():
     """Initialize session state variables"""
     if 'calculation_history' not in st.session_state:
-        st.session_state.calculation_history = []
+        st.session_state.calculation_history = SessionHistory()
     if 'sku_counter' not in st.session_state:
         st.session_state.sku_counter = 1
     if 'db_manager' not in st.session_state:
         st.session_state.db_manager = MongoDBManager()
 
+def get_incremental_planner(truck_spec):
+    """Return the session's incremental planner, rebuilding it when the truck spec changes"""
+    planner = st.session_state.get('incremental_planner')
+    if planner is None or not planner.matches(truck_spec):
+        planner = IncrementalPlanner(truck_spec)
+        st.session_state.incremental_planner = planner
+    return planner
+
+@st.cache_resource(show_spinner=False)
+def get_worker_pool():
+    """Solver worker processes shared by all sessions of the server process"""
+    return SharedWorkerPool()
+
+@st.cache_resource(show_spinner=False)
+def get_plan_precomputer():
+    """Background plan precomputation shared by all sessions of the server process"""
+    return PlanPrecomputer(pool=get_worker_pool())
+
+def submit_precompute(skus, truck_types, pallet_spec, solver_budget):
+    """Queue plans for every truck type, superseding this session's earlier requests"""
+    get_plan_precomputer().submit(
+        skus, truck_types, pallet_spec, solver_budget,
+        store=st.session_state.db_manager,
+        session=st.session_state.calculation_history.session_id
+    )
+
+def schedule_precompute():
+    """Precompute plans for the SKUs of this rerun once the page has rendered"""
+    request = st.session_state.pop('precompute_request', None)
+    if request:
+        submit_precompute(*request)
+
+def resolve_plan(skus, truck_type, truck_types, pallet_spec, solver_budget):
+    """
+    Plan for the results view without solving on the script thread
+
+    A packed plan that is not finished yet is solved as a background job; the capacity
+    estimate stands in for it until the job lands and the page reruns.
+
+    Returns:
+        Tuple of the plan and the packing job while the estimate stands in, else None
+    """
+    precomputer = get_plan_precomputer()
+    store = st.session_state.db_manager
+    if solver_budget <= 0 or pallet_spec:
+        return precomputer.get(skus, truck_type, truck_types, pallet_spec, solver_budget, store=store), None
+    
+    plan = precomputer.peek(skus, truck_type, truck_types, pallet_spec, solver_budget)
+    if plan is not None:
+        return plan, None
+    
+    key = plan_key(normalize_skus(skus), truck_type, truck_types, pallet_spec, solver_budget)
+    packing_jobs = st.session_state.setdefault('packing_jobs', {})
+    job = get_job_runner().get(packing_jobs.get(key, ''))
+    if job is None:
+        packing_jobs[key] = submit_job(
+            f"Packing {truck_type}", precomputer.get, skus, truck_type, truck_types, pallet_spec, solver_budget,
+            store=store
+        )
+        job = get_job_runner().get(packing_jobs[key])
+    elif job.status == DONE:
+        return job.result, None
+    
+    # A failed or cancelled packing job is not resubmitted; the estimate stays
+    return precomputer.get(skus, truck_type, truck_types, pallet_spec, 0, store=store), job
+
+def show_packing_status(job):
+    """Explain why the capacity estimate is shown instead of the packed plan"""
+    if not job.finished:
+        st.info(f"⏳ Packing boxes with the solver in the background ({job.progress * 100:.0f}%); "
+                "showing the capacity estimate until it finishes")
+    else:
+        st.warning(f"⚠️ Packing {job.status.replace('_', ' ')}; showing the capacity estimate")
+
+def record_calculation(destination, truck_type, truck_types, skus, results, plan):
+    """Add a calculation to the session history and the database"""
+    calculation_data = {
+        'destination': destination,
+        'truck_type': truck_type,
+        'truck_spec': truck_types[truck_type],
+        'skus': skus.copy(),
+        'results': results,
+        'plan_hash': plan['plan_hash'],
+        'timestamp': pd.Timestamp.now()
+    }
+    st.session_state.calculation_history.append(calculation_data)
+    
+    # Save to MongoDB if connected
+    db_manager = st.session_state.db_manager
+    if db_manager.connected:
+        with stage_metrics.timed('save_calculation'):
+            db_manager.save_calculation(calculation_data)
+        db_manager.upsert_catalog_items(skus)
+    
+    # Newly typed SKUs become catalog entries for later autocompletion
+    catalog = load_sku_catalog(db_manager)
+    for sku in skus:
+        catalog.add(sku)
+
+def record_pending_calculation():
+    """Save a calculation whose packed plan was still solving when Calculate was pressed"""
+    pending = st.session_state.get('pending_calculation')
+    if not pending:
+        return
+    
+    plan, job = resolve_plan(pending['skus'], pending['truck_type'], pending['truck_types'], None, pending['solver_budget'])
+    if job is not None and not job.finished:
+        return
+    
+    st.session_state.pending_calculation = None
+    record_calculation(pending['destination'], pending['truck_type'], pending['truck_types'], pending['skus'],
+                       dict(plan['results']), plan)
+
+@st.cache_resource(show_spinner=False)
+def get_job_runner():
+    """Background job runner shared by all sessions of the server process"""
+    return JobRunner()
+
+def submit_job(name, fn, *args, time_budget=None, **kwargs):
+    """Submit a background job and track its ID in the session"""
+    job_id = get_job_runner().submit(name, fn, *args, time_budget=time_budget, **kwargs)
+    st.session_state.setdefault('job_ids', []).append(job_id)
+    return job_id
+
+def render_background_jobs():
+    """Progress and cancel buttons for this session's jobs"""
+    runner = get_job_runner()
+    jobs = runner.jobs(st.session_state.get('job_ids', []))
+    st.session_state.job_ids = [job.id for job in jobs]
+    
+    st.subheader("⏳ Background Jobs")
+    for job in reversed(jobs):
+        if job.finished:
+            st.caption(f"{job.name}: {job.status.replace('_', ' ')} after {job.elapsed:.1f}s")
+            continue
+        st.progress(job.progress, text=f"{job.name}: {job.message or job.status}")
+        if st.button("✖️ Cancel", key=f"cancel_job_{job.id}"):
+            runner.cancel(job.id)
+    
+    # Rerun the whole page once a job finishes so its results replace the progress view
+    finished = {job.id for job in jobs if job.finished}
+    if finished - st.session_state.get('jobs_finished', set()):
+        st.session_state.jobs_finished = finished
+        st.rerun()
+
+def show_background_jobs():
+    """Sidebar job list, polled as a fragment while any job is unfinished"""
+    jobs = get_job_runner().jobs(st.session_state.get('job_ids', []))
+    if not jobs:
+        return
+    
+    active = any(not job.finished for job in jobs)
+    with st.sidebar:
+        st.markdown("---")
+        st.fragment(run_every=JOB_POLL_SECONDS if active else None)(render_background_jobs)()
+
+@st.cache_resource(show_spinner=False)
+def load_sku_catalog(_db_manager):
+    """Load the SKU master catalog once per server process"""
+    return SkuCatalog(_db_manager.get_sku_catalog())
+
+def autofill_sku_dimensions(i):
+    """Fill box volume and weight when the typed name is a catalog SKU"""
+    catalog = load_sku_catalog(st.session_state.db_manager)
+    item = catalog.get(st.session_state.get(f"sku_name_{i}", ""))
+    if item:
+        st.session_state[f"volume_{i}"] = item['volume_per_box']
+        st.session_state[f"weight_{i}"] = item['weight_per_box']
+
+def apply_catalog_pick(i):
+    """Copy the catalog SKU picked from the suggestions into row i"""
+    picked = st.session_state.get(f"catalog_pick_{i}")
+    if picked:
+        st.session_state[f"sku_name_{i}"] = picked
+        autofill_sku_dimensions(i)
+        st.session_state[f"catalog_pick_{i}"] = ""
+
 def add_sku_row():
     """Add a new SKU row"""
     st.session_state.sku_counter += 1
@@ -35,6 +241,7 @@ def remove_sku_row():
 def collect_sku_inputs():
     """Collect SKU inputs from the user interface"""
     skus = []
+    catalog = load_sku_catalog(st.session_state.db_manager)
     
     st.subheader("📦 SKU Information")
     
@@ -56,8 +263,23 @@ def collect_sku_inputs():
                 sku_name = st.text_input(
                     f"SKU Name",
                     key=f"sku_name_{i}",
-                    placeholder=f"Enter SKU {i+1} name"
+                    placeholder=f"Enter SKU {i+1} name",
+                    on_change=autofill_sku_dimensions,
+                    args=(i,)
                 )
+                
+                # Offer catalog matches until the name is a known SKU
+                if sku_name and len(catalog) and not catalog.get(sku_name):
+                    matches = catalog.search(sku_name, limit=8)
+                    if matches:
+                        st.selectbox(
+                            "Catalog matches",
+                            options=[""] + [item['name'] for item in matches],
+                            key=f"catalog_pick_{i}",
+                            on_change=apply_catalog_pick,
+                            args=(i,),
+                            label_visibility="collapsed"
+                        )
             
             with col2:
                 quantity = st.number_input(
@@ -106,10 +328,53 @@ def collect_sku_inputs():
     
     return skus
 
+def show_sku_summary(skus, planner):
+    """Running totals of the SKU rows from the incremental planner"""
+    results = planner.results()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("SKU Volume", f"{results['total_volume']:.2f} m³")
+    with col2:
+        st.metric("SKU Weight", f"{results['total_weight']:.1f} kg")
+    with col3:
+        st.metric("Estimated Trucks", results['trucks_needed'])
+    
+    calculated = st.session_state.get('results_inputs')
+    if calculated and calculated[1] != normalize_skus(skus):
+        st.caption("SKUs changed since the last calculation - recalculate to update the results")
+
+@st.fragment
+def sku_editor(truck_types, truck_type, pallet_spec, solver_budget, sku_views):
+    """
+    SKU rows and their summary; editing a row reruns only this fragment
+    
+    sku_views is True while other panels on the page are computed from the SKUs, in
+    which case a changed SKU list reruns the whole page instead.
+    """
+    with stage_metrics.timed('collect_sku_inputs'):
+        skus = collect_sku_inputs()
+    
+    # Apply only the changed SKU rows to the running plan
+    planner = get_incremental_planner(truck_types[truck_type])
+    planner.sync(skus)
+    show_sku_summary(skus, planner)
+    
+    # Plans for every truck type are computed in the background after this rerun
+    st.session_state.precompute_request = (skus, truck_types, pallet_spec, solver_budget)
+    
+    if not st.session_state.get('full_rerun'):
+        if sku_views and normalize_skus(skus) != st.session_state.get('rendered_skus'):
+            st.rerun(scope="app")
+        schedule_precompute()
+    
+    return skus
+
 def main():
     """Main application function"""
     # Initialize session state
     initialize_session_state()
+    # Fragments check this to tell their own reruns from full page runs
+    st.session_state.full_rerun = True
     
     # Header
     st.title("🚛 Truck Utilization Calculator")
@@ -130,6 +395,18 @@ def main():
         if st.sidebar.button("📈 View Analytics Dashboard"):
             st.session_state.show_analytics = True
         
+        if st.sidebar.button("🔗 Consolidation Planner"):
+            st.session_state.show_consolidation = True
+        
+        if st.sidebar.button("🗺️ Route Planner"):
+            st.session_state.show_routes = True
+        
+        if st.sidebar.button("📅 Daily Fleet Plan"):
+            st.session_state.show_fleet_plan = True
+        
+        if st.sidebar.button("🔁 Fleet Replay"):
+            st.session_state.show_fleet_replay = True
+        
         if st.sidebar.button("⚙️ View Database Info"):
             st.session_state.show_db_info = True
         
@@ -167,6 +444,50 @@ def main():
         )
         st.sidebar.markdown("---")
     
+    sensitivity_mode = st.sidebar.checkbox(
+        "📐 Capacity Sensitivity Mode",
+        help="Evaluate the current SKUs over a range of truck capacities"
+    )
+    
+    stochastic_mode = st.sidebar.checkbox(
+        "🎲 Demand Uncertainty Mode",
+        help="Plan trucks on the distribution of quantities instead of a point estimate"
+    )
+    
+    deferral_mode = st.sidebar.checkbox(
+        "🕒 Deferral Planner",
+        help="Find the lowest-priority boxes to hold back so the load needs one truck fewer"
+    )
+    
+    pallet_mode = st.sidebar.checkbox(
+        "🧱 Pallet Mode",
+        help="Pack boxes onto pallets first, then pallets into trucks"
+    )
+    pallet_spec = None
+    if pallet_mode:
+        pallet_spec = {
+            'volume': st.sidebar.number_input(
+                "Pallet - Load Volume (m³)", min_value=0.1, value=DEFAULT_PALLET_SPEC['volume'], step=0.05, key="pallet_volume"
+            ),
+            'height': st.sidebar.number_input(
+                "Pallet - Load Height (m)", min_value=0.1, value=DEFAULT_PALLET_SPEC['height'], step=0.1, key="pallet_height"
+            ),
+            'weight': st.sidebar.number_input(
+                "Pallet - Max Load (kg)", min_value=1.0, value=DEFAULT_PALLET_SPEC['weight'], step=50.0, key="pallet_weight"
+            ),
+            'tare_weight': st.sidebar.number_input(
+                "Pallet - Tare Weight (kg)", min_value=0.0, value=DEFAULT_PALLET_SPEC['tare_weight'], step=1.0, key="pallet_tare"
+            )
+        }
+    
+    solver_budget = 0.0
+    if not pallet_mode:
+        solver_budget = st.sidebar.slider(
+            "⏱️ Solver Time Budget (s)",
+            min_value=0.0, max_value=10.0, value=0.0, step=0.5,
+            help="Assign boxes to trucks and keep improving until the lower bound or the budget is reached; 0 uses the capacity estimate"
+        )
+    
     # Main input section
     col1, col2 = st.columns([2, 1])
     
@@ -195,10 +516,13 @@ def main():
         
         with col2:
             if st.button("📋 Load SKU Template"):
-                show_load_template_dialog()
+                show_load_template_dialog(truck_types, pallet_spec, solver_budget)
         
-        # Collect SKU inputs
-        skus = collect_sku_inputs()
+        # SKU rows rerun on their own; only the panels below that use the SKUs need the full page
+        sku_views = sensitivity_mode or stochastic_mode or deferral_mode
+        skus = sku_editor(truck_types, selected_truck_type, pallet_spec, solver_budget, sku_views)
+        st.session_state.rendered_skus = normalize_skus(skus)
+        planner = get_incremental_planner(truck_types[selected_truck_type])
     
     with col2:
         # Display selected truck specifications
@@ -208,6 +532,15 @@ def main():
             st.metric("Volume Capacity", f"{truck_spec['volume']} m³")
             st.metric("Weight Capacity", f"{truck_spec['weight']} kg")
     
+    if sensitivity_mode:
+        show_sensitivity_analysis(skus, truck_types)
+    
+    if stochastic_mode:
+        show_demand_uncertainty(skus, selected_truck_type, truck_types[selected_truck_type])
+    
+    if deferral_mode:
+        show_deferral_planner(skus, selected_truck_type, truck_types[selected_truck_type])
+    
     # Calculate button and results
     if st.button("🔍 Calculate Truck Requirements", type="primary"):
         if not skus:
@@ -219,33 +552,73 @@ def main():
             return
         
         # Perform calculations
-        calculator = TruckCalculator(truck_types[selected_truck_type])
-        results = calculator.calculate_requirements(skus)
-        
-        # Store in history (both local and database)
-        calculation_data = {
-            'destination': destination,
-            'truck_type': selected_truck_type,
-            'truck_spec': truck_types[selected_truck_type],
-            'skus': skus.copy(),
-            'results': results,
-            'timestamp': pd.Timestamp.now()
-        }
-        st.session_state.calculation_history.append(calculation_data)
+        with stage_metrics.timed('calculation'):
+            plan, packing = resolve_plan(skus, selected_truck_type, truck_types, pallet_spec, solver_budget)
+            results = dict(plan['results'])
+            if not pallet_mode:
+                results['packed_trucks'] = planner.results()['packed_trucks']
         
-        # Save to MongoDB if connected
-        db_manager = st.session_state.db_manager
-        if db_manager.connected:
-            db_manager.save_calculation(calculation_data)
+        # Store in history (both local and database), once the packed plan is in
+        if packing is None:
+            record_calculation(destination, selected_truck_type, truck_types, skus, results, plan)
+        else:
+            st.session_state.pending_calculation = {
+                'destination': destination,
+                'truck_type': selected_truck_type,
+                'truck_types': dict(truck_types),
+                'skus': skus.copy(),
+                'solver_budget': solver_budget
+            }
+            show_packing_status(packing)
         
         # Display results
-        display_results(results, skus, destination, selected_truck_type, truck_types[selected_truck_type])
+        with stage_metrics.timed('display_results'):
+            display_results(results, skus, destination, selected_truck_type, truck_types[selected_truck_type], truck_types, plan)
+        
+        # Keep the results on screen while the user compares truck types
+        st.session_state.results_inputs = (destination, normalize_skus(skus), pallet_spec, solver_budget)
+    
+    elif skus and st.session_state.get('results_inputs') == (destination, normalize_skus(skus), pallet_spec, solver_budget):
+        with stage_metrics.timed('calculation'):
+            plan, packing = resolve_plan(skus, selected_truck_type, truck_types, pallet_spec, solver_budget)
+            results = dict(plan['results'])
+            if not pallet_mode:
+                results['packed_trucks'] = planner.results()['packed_trucks']
+        
+        if packing is not None:
+            show_packing_status(packing)
+        
+        with stage_metrics.timed('display_results'):
+            display_results(results, skus, destination, selected_truck_type, truck_types[selected_truck_type], truck_types, plan)
+    
+    record_pending_calculation()
     
     # Show analytics or database info if requested
     if st.session_state.get('show_analytics', False):
-        show_analytics_dashboard(db_manager)
-        if st.button("❌ Close Analytics"):
-            st.session_state.show_analytics = False
+        analytics_panel(db_manager)
+    
+    if st.session_state.get('show_consolidation', False):
+        show_consolidation_planner(db_manager, selected_truck_type, truck_types[selected_truck_type])
+        if st.button("❌ Close Consolidation Planner"):
+            st.session_state.show_consolidation = False
+            st.rerun()
+    
+    if st.session_state.get('show_routes', False):
+        show_route_planner(db_manager, selected_truck_type, truck_types[selected_truck_type])
+        if st.button("❌ Close Route Planner"):
+            st.session_state.show_routes = False
+            st.rerun()
+    
+    if st.session_state.get('show_fleet_plan', False):
+        show_daily_fleet_plan(db_manager, truck_types)
+        if st.button("❌ Close Daily Fleet Plan"):
+            st.session_state.show_fleet_plan = False
+            st.rerun()
+    
+    if st.session_state.get('show_fleet_replay', False):
+        show_fleet_replay(db_manager, truck_types)
+        if st.button("❌ Close Fleet Replay"):
+            st.session_state.show_fleet_replay = False
             st.rerun()
     
     if st.session_state.get('show_db_info', False):
@@ -254,8 +627,8 @@ def main():
             st.session_state.show_db_info = False
             st.rerun()
 
-def display_results(results, skus, destination, truck_type, truck_spec):
-    """Display calculation results"""
+def display_results(results, skus, destination, truck_type, truck_spec, truck_types=None, plan=None):
+    """Display calculation results, reusing the suggestions and charts of a precomputed plan"""
     st.markdown("---")
     st.header("📊 Calculation Results")
     
@@ -303,20 +676,44 @@ def display_results(results, skus, destination, truck_type, truck_spec):
         st.write(f"**Weight Utilization:** {weight_utilization:.1f}%")
         st.progress(min(weight_utilization / 100, 1.0))
         
+        if 'packed_trucks' in results:
+            st.write(f"**Box-Level Assignment:** {results['packed_trucks']} trucks")
+        
+        if 'pallets' in results:
+            st.write(f"**Pallets:** {results['pallets']} ({results['mixed_pallets']} mixed), "
+                     f"{results['pallet_positions']} positions per truck")
+            st.write(f"**Pallet Position Utilization:** {results['volume_utilization']:.1f}%")
+        
+        if 'lower_bound' in results:
+            status = "optimal" if results['solver_status'] == 'optimal' else "stopped at time budget"
+            st.write(f"**Lower Bound:** {results['lower_bound']} trucks "
+                     f"(gap {results['optimality_gap']:.1f}%, {status} after {results['iterations']} iterations "
+                     f"in {results['solve_time']:.2f}s)")
+        
         # Limiting factor
         if results['limiting_factor'] == 'volume':
             st.info("📏 **Limiting Factor:** Volume")
         else:
             st.info("⚖️ **Limiting Factor:** Weight")
     
+    if 'pallet_patterns' in results:
+        st.subheader("🧱 Pallet Patterns")
+        df_patterns = pd.DataFrame(results['pallet_patterns'])
+        df_patterns = df_patterns[['name', 'per_layer', 'layers', 'boxes_per_pallet', 'full_pallets', 'loose_boxes']]
+        df_patterns.columns = ['SKU Name', 'Boxes/Layer', 'Layers', 'Boxes/Pallet', 'Full Pallets', 'Loose Boxes']
+        st.dataframe(df_patterns, use_container_width=True)
+    
     # Utilization warnings and recommendations
     if utilization < 70:
         st.warning(f"⚠️ **Low Utilization Warning**")
         st.write("Your truck utilization is below 70%. Consider the following recommendations:")
         
         # Generate optimization suggestions
-        optimizer = OptimizationEngine(truck_spec)
-        suggestions = optimizer.generate_suggestions(results, skus)
+        if plan is not None:
+            suggestions = plan['suggestions']
+        else:
+            optimizer = OptimizationEngine(truck_spec, truck_types)
+            suggestions = optimizer.generate_suggestions(results, skus)
         
         for suggestion in suggestions:
             st.write(f"• {suggestion}")
@@ -326,17 +723,27 @@ def display_results(results, skus, destination, truck_type, truck_spec):
     # Visualizations
     st.subheader("📈 Visualizations")
     
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        # Utilization chart
-        fig_utilization = create_utilization_chart(results, truck_spec, trucks_needed)
-        st.plotly_chart(fig_utilization, use_container_width=True)
-    
-    with col2:
-        # SKU breakdown chart
-        fig_breakdown = create_sku_breakdown_chart(skus)
-        st.plotly_chart(fig_breakdown, use_container_width=True)
+    with stage_metrics.timed('plotly_render'):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            # Utilization chart
+            fig_utilization = plan['utilization_chart'] if plan else create_utilization_chart(results, truck_spec, trucks_needed)
+            st.plotly_chart(fig_utilization, use_container_width=True)
+        
+        with col2:
+            # SKU breakdown chart
+            fig_breakdown = plan['sku_breakdown_chart'] if plan else create_sku_breakdown_chart(skus)
+            st.plotly_chart(fig_breakdown, use_container_width=True)
+
+@st.fragment
+def analytics_panel(db_manager):
+    """Analytics dashboard; its filters rerun only this fragment"""
+    with stage_metrics.timed('analytics_dashboard'):
+        show_analytics_dashboard(db_manager)
+    if st.button("❌ Close Analytics"):
+        st.session_state.show_analytics = False
+        st.rerun(scope="app")
 
 def show_analytics_dashboard(db_manager):
     """Display analytics dashboard with database insights"""
@@ -367,6 +774,48 @@ def show_analytics_dashboard(db_manager):
         total_volume = analytics_data.get('total_volume_shipped', 0)
         st.metric("Total Volume Shipped", f"{total_volume:.1f} m³")
     
+    # Percentiles from the per truck type and day sketches, independent of the number of calculations
+    st.subheader("📉 Utilization Distribution")
+    col1, col2 = st.columns(2)
+    with col1:
+        sketch_truck_type = st.selectbox("Truck Type", ["All", "Small", "Medium", "Large"], key="sketch_truck_type")
+    with col2:
+        sketch_period = st.selectbox("Period", ["Last 7 days", "Last 30 days", "Last 90 days", "All time"], index=1, key="sketch_period")
+    
+    percentiles = db_manager.get_utilization_percentiles(
+        truck_type=None if sketch_truck_type == "All" else sketch_truck_type,
+        days={"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90}.get(sketch_period)
+    )
+    
+    if percentiles.get('calculations'):
+        col1, col2, col3, col4, col5 = st.columns(5)
+        
+        with col1:
+            st.metric("P10 Utilization", f"{percentiles['utilization_p10']:.1f}%")
+        
+        with col2:
+            st.metric("P50 Utilization", f"{percentiles['utilization_p50']:.1f}%")
+        
+        with col3:
+            st.metric("P90 Utilization", f"{percentiles['utilization_p90']:.1f}%")
+        
+        with col4:
+            st.metric("Distinct Destinations", f"~{percentiles['distinct_destinations']:,}")
+        
+        with col5:
+            st.metric("Distinct SKUs", f"~{percentiles['distinct_skus']:,}")
+        
+        st.caption(f"Approximate, over {percentiles['calculations']:,} calculations; P90 trucks needed: {percentiles['trucks_p90']:.0f}")
+    else:
+        st.info("No calculations in this period")
+    
+    if analytics_data.get('archived_calculations'):
+        st.caption(f"Includes {analytics_data['archived_calculations']:,} archived calculations")
+        with st.expander("🗃️ Archived Months"):
+            df_archive = pd.DataFrame(db_manager.archive.monthly_summary())
+            df_archive.columns = ['Month', 'Calculations', 'Avg Utilization (%)', 'Trucks', 'Volume (m³)']
+            st.dataframe(df_archive, use_container_width=True)
+    
     # Recent calculations from database
     st.subheader("📋 Recent Database History")
     db_history = db_manager.get_calculation_history(limit=20)
@@ -382,6 +831,409 @@ def show_analytics_dashboard(db_manager):
                     st.write(f"**Utilization:** {calc['results']['utilization_percentage']:.1f}%")
                     st.write(f"**Volume:** {calc['results']['total_volume']:.2f} m³")
 
+def show_sensitivity_analysis(skus, truck_types):
+    """Display trucks needed and utilization over a grid of truck capacities"""
+    st.markdown("---")
+    st.header("📐 Capacity Sensitivity")
+    
+    if not skus:
+        st.info("📦 Add SKUs to see how truck capacity changes the plan")
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        span = st.slider("Capacity Range (±%)", min_value=10, max_value=90, value=50, step=5) / 100
+    with col2:
+        metric = st.radio("Metric", ["Trucks Needed", "Utilization"], horizontal=True)
+    
+    sensitivity = capacity_sensitivity(skus, truck_types, size=200, span=span)
+    metric_key = 'trucks_needed' if metric == "Trucks Needed" else 'utilization'
+    
+    tabs = st.tabs(sensitivity['truck_types'])
+    for i, tab in enumerate(tabs):
+        with tab:
+            st.plotly_chart(create_sensitivity_heatmap(sensitivity, i, metric_key), use_container_width=True)
+
+def show_demand_uncertainty(skus, truck_type, truck_spec):
+    """Display the Monte Carlo distribution of trucks needed"""
+    st.markdown("---")
+    st.header("🎲 Demand Uncertainty")
+    
+    if not skus:
+        st.info("📦 Add SKUs to simulate demand uncertainty")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        spread = st.slider("Quantity Variation (±%)", min_value=0, max_value=50, value=15) / 100
+    with col2:
+        distribution = st.selectbox("Distribution", DISTRIBUTIONS, key="demand_distribution")
+    with col3:
+        booked_trucks = st.number_input("Booked Trucks (0 = point estimate)", min_value=0, value=0, step=1)
+    
+    simulation = simulate_demand(
+        skus, truck_spec,
+        spread=spread,
+        distribution=distribution,
+        booked_trucks=booked_trucks or None
+    )
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("P50 Trucks", simulation['p50'])
+    
+    with col2:
+        st.metric("P90 Trucks", simulation['p90'])
+    
+    with col3:
+        st.metric("P99 Trucks", simulation['p99'])
+    
+    with col4:
+        st.metric("Overflow Probability", f"{simulation['overflow_probability'] * 100:.1f}%")
+    
+    st.write(
+        f"**{simulation['scenarios']:,} scenarios** for {truck_type} trucks - "
+        f"booked {simulation['booked_trucks']}, point estimate {simulation['point_estimate']}"
+    )
+    st.plotly_chart(create_truck_distribution_chart(simulation), use_container_width=True)
+
+def show_deferral_planner(skus, truck_type, truck_spec):
+    """Display which boxes to defer so the shipment needs one truck fewer"""
+    st.markdown("---")
+    st.header("🕒 Deferral Planner")
+    
+    if not skus:
+        st.info("📦 Add SKUs to plan deferrals")
+        return
+    
+    st.write("Set a priority per SKU (higher ships first) and an optional due date; boxes due before the next shipment are never deferred.")
+    df_priorities = pd.DataFrame({
+        'SKU Name': [sku['name'] for sku in skus],
+        'Priority': [1] * len(skus),
+        'Due Date': [None] * len(skus)
+    })
+    edited = st.data_editor(
+        df_priorities,
+        column_config={
+            'SKU Name': st.column_config.TextColumn(disabled=True),
+            'Priority': st.column_config.NumberColumn(min_value=1, max_value=10, step=1),
+            'Due Date': st.column_config.DateColumn()
+        },
+        hide_index=True,
+        use_container_width=True,
+        key="deferral_priorities"
+    )
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        next_shipment = st.date_input("Next Shipment", value=datetime.now().date(), key="deferral_next_shipment")
+    
+    prioritized = [
+        dict(sku, priority=int(row['Priority']), due_date=row['Due Date'] if pd.notna(row['Due Date']) else None)
+        for sku, (_, row) in zip(skus, edited.iterrows())
+    ]
+    
+    current = TruckCalculator(truck_spec).calculate_requirements(skus)['trucks_needed']
+    with col2:
+        target_trucks = st.number_input(
+            f"Target {truck_type} Trucks",
+            min_value=1,
+            max_value=max(current, 1),
+            value=max(current - 1, 1),
+            step=1,
+            key="deferral_target"
+        )
+    
+    plan = DeferralOptimizer(truck_spec).plan(prioritized, target_trucks=target_trucks, next_shipment=next_shipment)
+    
+    if not plan['feasible']:
+        st.error(f"⚠️ The load cannot fit {target_trucks} truck(s) by deferring deferrable boxes")
+        return
+    
+    if not plan['deferred']:
+        st.success(f"✅ The load already fits {target_trucks} truck(s)")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("Trucks After Deferral", plan['results_after']['trucks_needed'], delta=plan['results_after']['trucks_needed'] - current)
+    
+    with col2:
+        st.metric("Boxes Deferred", plan['boxes_deferred'])
+    
+    with col3:
+        st.metric("Utilization After", f"{plan['results_after']['utilization_percentage']:.1f}%")
+    
+    df_deferred = pd.DataFrame(plan['deferred'])
+    df_deferred.columns = ['SKU Name', 'Boxes Deferred', 'Of Quantity']
+    st.dataframe(df_deferred, use_container_width=True)
+
+def show_consolidation_planner(db_manager, truck_type, truck_spec):
+    """Display consolidation of stored partial loads into shared trucks"""
+    st.markdown("---")
+    st.header("🔗 Load Consolidation Planner")
+    st.write(f"Merging partial loads from stored calculations into shared **{truck_type}** trucks")
+    
+    shipments = db_manager.iter_calculations(
+        projection={'destination': 1, 'results.total_volume': 1, 'results.total_weight': 1}
+    )
+    planner = ConsolidationPlanner(truck_spec)
+    plan = planner.plan(shipments)
+    
+    if plan['shipments'] == 0:
+        st.info("📈 No stored shipments to consolidate yet.")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Shipments", plan['shipments'])
+    
+    with col2:
+        st.metric("Trucks (Separate)", plan['trucks_before'])
+    
+    with col3:
+        st.metric("Trucks (Consolidated)", plan['trucks_after'])
+    
+    with col4:
+        st.metric("Trucks Saved", plan['trucks_saved'])
+    
+    if plan['shared_trucks']:
+        df_shared = pd.DataFrame(plan['shared_trucks'])
+        df_shared['destinations'] = df_shared['destinations'].apply(', '.join)
+        df_shared['shipments'] = df_shared['shipment_ids'].apply(len)
+        df_shared = df_shared[['region', 'destinations', 'shipments', 'volume', 'weight', 'utilization']]
+        df_shared.columns = ['Region', 'Destinations', 'Shipments', 'Volume (m³)', 'Weight (kg)', 'Utilization (%)']
+        st.dataframe(df_shared, use_container_width=True)
+    else:
+        st.success("✅ No partial loads can be combined")
+
+def show_route_planner(db_manager, truck_type, truck_spec):
+    """Display multi-stop routes for stored shipments"""
+    st.markdown("---")
+    st.header("🗺️ Multi-Stop Route Planner")
+    
+    gazetteer = load_gazetteer()
+    depot = st.selectbox("🏭 Depot", options=sorted(name.title() for name in gazetteer), key="route_depot")
+    
+    shipments = db_manager.iter_calculations(
+        projection={'destination': 1, 'results.total_volume': 1, 'results.total_weight': 1}
+    )
+    route_plan = RoutePlanner(truck_spec, depot, gazetteer).plan(shipments)
+    
+    if not route_plan['routes'] and not route_plan['dedicated_loads']:
+        st.info("📈 No routable shipments found.")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric(f"{truck_type} Trucks", route_plan['trucks_needed'])
+    
+    with col2:
+        st.metric("Multi-Stop Routes", len(route_plan['routes']))
+    
+    with col3:
+        st.metric("Total Distance", f"{route_plan['total_distance_km']:.0f} km")
+    
+    if route_plan['unresolved_destinations']:
+        st.warning(f"⚠️ Not in gazetteer: {', '.join(route_plan['unresolved_destinations'])}")
+    
+    if route_plan['routes']:
+        df_routes = pd.DataFrame(route_plan['routes'])
+        df_routes['stops'] = df_routes['stops'].apply(' → '.join)
+        df_routes = df_routes[['stops', 'distance_km', 'volume_utilization', 'weight_utilization']]
+        df_routes.columns = ['Stops', 'Distance (km)', 'Volume Utilization (%)', 'Weight Utilization (%)']
+        st.dataframe(df_routes, use_container_width=True)
+        
+        st.plotly_chart(create_route_map(route_plan), use_container_width=True)
+
+def show_daily_fleet_plan(db_manager, truck_types):
+    """Display the joint fleet plan for one day of stored calculations"""
+    st.markdown("---")
+    st.header("📅 Daily Fleet Plan")
+    
+    plan_date = st.date_input("Plan Date", value=datetime.now().date())
+    
+    st.write("**Available Fleet**")
+    fleet = {}
+    fleet_cols = st.columns(len(truck_types))
+    for col, truck_type in zip(fleet_cols, truck_types):
+        with col:
+            fleet[truck_type] = st.number_input(
+                f"{truck_type} Trucks",
+                min_value=0,
+                value=10,
+                step=1,
+                key=f"fleet_{truck_type}"
+            )
+    
+    if st.button("🧮 Plan Day", type="primary"):
+        # Planning a busy day can take a while; it runs as a job so the page stays responsive
+        st.session_state.fleet_plan_job = submit_job(
+            f"Fleet plan {plan_date.isoformat()}",
+            run_daily_plan, db_manager, plan_date, dict(truck_types), fleet,
+            time_budget=FLEET_PLAN_TIME_BUDGET
+        )
+    
+    job = get_job_runner().get(st.session_state.get('fleet_plan_job', ''))
+    if job is None:
+        return
+    
+    if not job.finished:
+        st.info(f"⏳ Planning {job.name} in the background ({job.progress * 100:.0f}%)")
+        return
+    
+    if job.status == FAILED:
+        st.error(f"❌ Fleet planning failed: {job.error}")
+        return
+    
+    if job.status in (CANCELLED, TIMED_OUT):
+        st.warning(f"⚠️ {job.name} was {'cancelled' if job.status == CANCELLED else 'stopped at its time budget'}")
+        return
+    
+    plan = job.result
+    
+    if plan['calculations'] == 0:
+        st.info("📈 No calculations stored for this day.")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Calculations", plan['calculations'])
+    
+    with col2:
+        st.metric("Trucks (Independent)", plan['separate_trucks'])
+    
+    with col3:
+        st.metric("Trucks (Joint Plan)", plan['joint_trucks'])
+    
+    with col4:
+        st.metric("Destinations", plan['destinations'])
+    
+    if plan['shortage']:
+        shortage = ', '.join(f"{count} {name}" for name, count in plan['shortage'].items())
+        st.error(f"⚠️ Fleet shortage: {shortage}")
+    else:
+        st.success("✅ The day fits the available fleet")
+    
+    df_plan = pd.DataFrame(plan['assignments'])
+    df_plan['calculations'] = df_plan['calculation_ids'].apply(len)
+    df_plan['trucks'] = df_plan['trucks'].apply(lambda trucks: ', '.join(f"{count} × {name}" for name, count in trucks.items()))
+    df_plan = df_plan[['destination', 'calculations', 'volume', 'weight', 'trucks', 'within_fleet']]
+    df_plan.columns = ['Destination', 'Calculations', 'Volume (m³)', 'Weight (kg)', 'Trucks', 'Within Fleet']
+    st.dataframe(df_plan, use_container_width=True)
+
+def show_fleet_replay(db_manager, truck_types):
+    """Replay stored calculations under proposed truck specifications"""
+    st.markdown("---")
+    st.header("🔁 Fleet Replay")
+    st.write("How would past shipments have fared with different truck contracts?")
+    
+    st.write("**Proposed Truck Specifications**")
+    proposed = {}
+    spec_cols = st.columns(len(truck_types))
+    for col, (truck_type, spec) in zip(spec_cols, truck_types.items()):
+        with col:
+            proposed[truck_type] = {
+                'volume': st.number_input(
+                    f"{truck_type} - Volume (m³)", min_value=1.0, value=float(spec['volume']), step=1.0,
+                    key=f"replay_volume_{truck_type}"
+                ),
+                'weight': st.number_input(
+                    f"{truck_type} - Weight (kg)", min_value=1.0, value=float(spec['weight']), step=100.0,
+                    key=f"replay_weight_{truck_type}"
+                )
+            }
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        period = st.selectbox("Period", list(REPLAY_PERIODS), index=2, format_func=str.title, key="replay_period")
+    with col2:
+        packing = st.checkbox(
+            "Re-pack stored SKUs",
+            help="Assign the stored boxes with the packing solver instead of the capacity estimate (slower, live calculations only)"
+        )
+    
+    if st.button("🔁 Run Replay", type="primary"):
+        # Millions of calculations take a while; the replay runs as a job so the page stays responsive
+        st.session_state.fleet_replay_job = submit_job(
+            "Fleet replay", replay_history, db_manager, proposed, period=period, packing=packing,
+            time_budget=FLEET_REPLAY_TIME_BUDGET
+        )
+    
+    job = get_job_runner().get(st.session_state.get('fleet_replay_job', ''))
+    if job is None:
+        return
+    
+    if not job.finished:
+        st.info(f"⏳ {job.message or 'Replaying calculations'} ({job.progress * 100:.0f}%)")
+        return
+    
+    if job.status == FAILED:
+        st.error(f"❌ Fleet replay failed: {job.error}")
+        return
+    
+    if job.status in (CANCELLED, TIMED_OUT):
+        st.warning(f"⚠️ {job.name} was {'cancelled' if job.status == CANCELLED else 'stopped at its time budget'}")
+        return
+    
+    replay = job.result
+    
+    if replay['calculations'] == 0:
+        st.info("📈 No stored calculations to replay.")
+        return
+    
+    totals = replay['totals']
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Calculations", f"{replay['calculations']:,}")
+    
+    with col2:
+        st.metric("Trucks (Current)", f"{totals['trucks_before']:,}")
+    
+    with col3:
+        st.metric("Trucks (Proposed)", f"{totals['trucks_after']:,}", delta=totals['trucks_delta'], delta_color="inverse")
+    
+    with col4:
+        st.metric("Avg Utilization (Proposed)", f"{totals['utilization_after']:.1f}%",
+                  delta=f"{totals['utilization_delta']:+.1f}%")
+    
+    if replay['skipped']:
+        st.caption(f"{replay['skipped']:,} calculations of other truck types were skipped")
+    
+    columns = {
+        'calculations': 'Calculations',
+        'trucks_before': 'Trucks (Current)',
+        'trucks_after': 'Trucks (Proposed)',
+        'trucks_delta': 'Truck Delta',
+        'utilization_before': 'Utilization (Current) %',
+        'utilization_after': 'Utilization (Proposed) %',
+        'utilization_delta': 'Utilization Delta %'
+    }
+    
+    st.subheader("📍 By Destination")
+    df_destinations = pd.DataFrame(replay['by_destination'])[['destination'] + list(columns)]
+    df_destinations.columns = ['Destination'] + list(columns.values())
+    st.dataframe(df_destinations, use_container_width=True)
+    
+    st.subheader(f"📆 By {replay['period'].title()}")
+    df_periods = pd.DataFrame(replay['by_period'])[['period'] + list(columns)]
+    st.line_chart(df_periods.set_index('period')[['trucks_before', 'trucks_after']].rename(columns=columns))
+    df_periods.columns = ['Period'] + list(columns.values())
+    st.dataframe(df_periods, use_container_width=True)
+    
+    st.download_button(
+        label="⬇️ Download Destination × Period Deltas",
+        data=pd.DataFrame(replay['by_destination_period']).to_csv(index=False),
+        file_name=f"fleet_replay_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+        mime="text/csv"
+    )
+
 def show_save_template_dialog():
     """Show dialog to save current SKUs as template"""
     if st.session_state.sku_counter == 0:
@@ -418,7 +1270,7 @@ def show_save_template_dialog():
                 else:
                     st.error("❌ Failed to save template")
 
-def show_load_template_dialog():
+def show_load_template_dialog(truck_types=None, pallet_spec=None, solver_budget=0.0):
     """Show dialog to load SKU template"""
     db_manager = st.session_state.db_manager
     if not db_manager.connected:
@@ -452,6 +1304,10 @@ def show_load_template_dialog():
                     st.session_state[f"volume_{i}"] = sku['volume_per_box']
                     st.session_state[f"weight_{i}"] = sku['weight_per_box']
                 
+                # Start planning the template for every truck type before the widgets rerender
+                if truck_types:
+                    submit_precompute(skus, truck_types, pallet_spec, solver_budget)
+                
                 st.success(f"✅ Template '{selected_template}' loaded successfully!")
                 st.rerun()
 
@@ -486,6 +1342,35 @@ def show_database_info(db_manager):
                     if 'name' in idx:
                         st.write(f"• {idx['name']}")
     
+    # Plan store
+    plan_stats = db_manager.get_plan_store_stats()
+    if plan_stats:
+        st.subheader("🧾 Plan Store")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Stored Plans", plan_stats['plans'])
+        with col2:
+            st.metric("Referencing Calculations", plan_stats['references'])
+        with col3:
+            st.metric("Unreferenced", plan_stats['unreferenced'])
+        if st.button("🧹 Prune Unused Plans"):
+            pruned = db_manager.prune_plans()
+            st.success(f"✅ Pruned {pruned} plans unused for {PLAN_RETENTION_DAYS} days")
+    
+    # Archive option
+    if db_manager.archive.enabled:
+        st.subheader("🗃️ Archive")
+        st.write(f"**Archive Directory:** {db_manager.archive.directory} ({len(db_manager.archive.months())} months)")
+        older_than_days = st.number_input(
+            "Archive whole months older than (days)",
+            min_value=30,
+            value=DEFAULT_ARCHIVE_AFTER_DAYS,
+            step=30
+        )
+        if st.button("🗃️ Archive Old Calculations"):
+            submit_job("Archive calculations", archive_calculations, db_manager, db_manager.archive, older_than_days)
+            st.info("⏳ Archiving in the background")
+    
     # Export data option
     st.subheader("💾 Data Export")
     if st.button("📥 Export All Data to JSON"):
@@ -493,51 +1378,128 @@ def show_database_info(db_manager):
         if export_data:
             st.download_button(
                 label="⬇️ Download JSON Export",
-                data=str(export_data),
+                data=json.dumps(export_data, default=str, indent=2),
                 file_name=f"truck_calculator_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
                 mime="application/json"
             )
+    
+    if st.button("📦 Export History to Parquet"):
+        calculations_file, sku_lines_file = io.BytesIO(), io.BytesIO()
+        counts = export_calculations(db_manager.iter_calculations(), calculations_file, sku_lines_file)
+        st.write(f"**{counts['calculations']:,} calculations** and **{counts['sku_lines']:,} SKU lines** exported")
+        
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                label="⬇️ Download Calculations",
+                data=calculations_file.getvalue(),
+                file_name=f"calculations_{stamp}.parquet",
+                mime="application/vnd.apache.parquet"
+            )
+        with col2:
+            st.download_button(
+                label="⬇️ Download SKU Lines",
+                data=sku_lines_file.getvalue(),
+                file_name=f"sku_lines_{stamp}.parquet",
+                mime="application/vnd.apache.parquet"
+            )
 
 # Calculation history sidebar
 def show_calculation_history():
     """Display calculation history in sidebar"""
+    with st.sidebar:
+        calculation_history()
+
+@st.fragment
+def calculation_history():
+    """Database and session history; opening SKU details reruns only this fragment"""
     db_manager = st.session_state.db_manager
     
     # Show database history if connected
     if db_manager.connected:
-        st.sidebar.header("🗄️ Database History")
-        db_history = db_manager.get_calculation_history(limit=5)
+        st.header("🗄️ Database History")
+        with stage_metrics.timed('history_query'):
+            db_history = db_manager.get_calculation_history(limit=5)
         
         if db_history:
             for calc in db_history:
-                with st.sidebar.expander(f"{calc['destination']} - {calc['truck_type']}"):
+                with st.expander(f"{calc['destination']} - {calc['truck_type']}"):
                     st.write(f"**Time:** {calc['timestamp'].strftime('%H:%M:%S')}")
                     st.write(f"**SKUs:** {len(calc['skus'])}")
                     st.write(f"**Trucks:** {calc['results']['trucks_needed']}")
                     st.write(f"**Utilization:** {calc['results']['utilization_percentage']:.1f}%")
             
-            if st.sidebar.button("🗑️ Clear Database History"):
+            if st.button("🗑️ Clear Database History"):
                 if db_manager.clear_calculation_history():
-                    st.sidebar.success("✅ Database history cleared!")
-                    st.rerun()
+                    st.success("✅ Database history cleared!")
+                    st.rerun(scope="app")
         else:
-            st.sidebar.info("No database history yet")
+            st.info("No database history yet")
     
     # Show local session history
     if st.session_state.calculation_history:
-        st.sidebar.header("📋 Session History")
+        st.header("📋 Session History")
         
-        for i, calc in enumerate(reversed(st.session_state.calculation_history[-3:])):  # Show last 3
-            with st.sidebar.expander(f"{calc['destination']} - {calc['truck_type']}"):
+        history = st.session_state.calculation_history
+        for calc in history.recent(3):  # Show last 3
+            with st.expander(f"{calc['destination']} - {calc['truck_type']}"):
                 st.write(f"**Time:** {calc['timestamp'].strftime('%H:%M:%S')}")
-                st.write(f"**SKUs:** {len(calc['skus'])}")
-                st.write(f"**Trucks:** {calc['results']['trucks_needed']}")
-                st.write(f"**Utilization:** {calc['results']['utilization_percentage']:.1f}%")
+                st.write(f"**SKUs:** {calc['sku_count']}")
+                st.write(f"**Trucks:** {calc['trucks_needed']}")
+                st.write(f"**Utilization:** {calc['utilization_percentage']:.1f}%")
+                
+                # Full details stay on disk until asked for
+                if calc['has_details'] and st.checkbox("Show SKUs", key=f"history_details_{calc['id']}"):
+                    details = history.load_details(calc['id'])
+                    if details:
+                        st.dataframe(pd.DataFrame(details['skus'])[['name', 'quantity']], use_container_width=True)
         
-        if st.sidebar.button("🗑️ Clear Session History"):
-            st.session_state.calculation_history = []
-            st.rerun()
+        if st.button("🗑️ Clear Session History"):
+            st.session_state.calculation_history.clear()
+            st.rerun(scope="app")
+
+def show_diagnostics_panel():
+    """Display per-stage rerun timings (enabled with ?diagnostics=1)"""
+    st.markdown("---")
+    st.header("🩺 Diagnostics")
+    
+    summary = stage_metrics.summary()
+    if not summary:
+        st.info("No timings recorded yet")
+        return
+    
+    df_timings = pd.DataFrame.from_dict(summary, orient='index')
+    df_timings[['last', 'p50', 'p90', 'p99']] = df_timings[['last', 'p50', 'p90', 'p99']] * 1000
+    df_timings = df_timings[['count', 'last', 'p50', 'p90', 'p99']]
+    df_timings.columns = ['Samples', 'Last (ms)', 'P50 (ms)', 'P90 (ms)', 'P99 (ms)']
+    st.dataframe(df_timings.sort_values('P90 (ms)', ascending=False), use_container_width=True)
+    st.caption(f"Shared read cache: {read_cache.hits} hits, {read_cache.misses} database reads")
+    precomputer = get_plan_precomputer()
+    st.caption(f"Precomputed plans: {precomputer.hits} hits, {precomputer.misses} computed on demand, "
+               f"{precomputer.store_hits} reused from the plan store")
+    patterns = pattern_cache_info()
+    st.caption(f"Pallet pattern cache: {patterns.hits} hits, {patterns.misses} solves")
+    
+    st.download_button(
+        label="⬇️ Download Prometheus Metrics",
+        data=stage_metrics.to_prometheus(),
+        file_name="truck_app_metrics.prom",
+        mime="text/plain"
+    )
 
 if __name__ == "__main__":
-    main()
-    show_calculation_history()
+    with stage_metrics.timed('rerun_total'):
+        with stage_metrics.timed('main'):
+            main()
+        with stage_metrics.timed('sidebar_history'):
+            show_calculation_history()
+        show_background_jobs()
+    
+    schedule_precompute()
+    st.session_state.full_rerun = False
+    
+    stage_metrics.write_prometheus_file()
+    
+    if st.query_params.get("diagnostics") == "1":
+        show_diagnostics_panel()
@@ -0,0 +1,258 @@
+import os
+import glob
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from utils.columnar_export import export_calculations
+
+# Whole months older than this many days move to the archive
+DEFAULT_ARCHIVE_AFTER_DAYS = 180
+
+
+def month_key(timestamp: datetime) -> str:
+    """Archive partition of a timestamp, e.g. '2025-05'"""
+    return timestamp.strftime('%Y-%m')
+
+
+def month_bounds(month: str) -> Tuple[datetime, datetime]:
+    """Start (inclusive) and end (exclusive) of an archive partition"""
+    start = datetime.strptime(month, '%Y-%m')
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def archive_cutoff(older_than_days: int, now: Optional[datetime] = None) -> datetime:
+    """Start of the month containing the day older_than_days ago; only whole months before it are archived"""
+    boundary = (now or datetime.now()) - timedelta(days=older_than_days)
+    return datetime(boundary.year, boundary.month, 1)
+
+
+def combine_analytics(live: Dict[str, Any], archived: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merge live aggregates with archive sums into the get_analytics_data format
+
+    Args:
+        live: Live analytics with averages over the hot collection
+        archived: Archive summary with sums, as returned by CalculationArchive.summary
+
+    Returns:
+        Analytics over live and archived calculations
+    """
+    live_count = live.get('total_calculations', 0)
+    total = live_count + archived['total_calculations']
+    if total == 0:
+        return dict(live)
+
+    return dict(
+        live,
+        total_calculations=total,
+        archived_calculations=archived['total_calculations'],
+        avg_utilization=(live.get('avg_utilization', 0) * live_count + archived['utilization_sum']) / total,
+        avg_trucks_needed=(live.get('avg_trucks_needed', 0) * live_count + archived['trucks_sum']) / total,
+        total_volume_shipped=live.get('total_volume_shipped', 0) + archived['total_volume_shipped'],
+        total_weight_shipped=live.get('total_weight_shipped', 0) + archived['total_weight_shipped']
+    )
+
+
+class CalculationArchive:
+    """Monthly partitions of old calculations as memory-mapped Arrow files"""
+
+    def __init__(self, directory: Optional[str] = None):
+        """
+        Initialize archive
+
+        Args:
+            directory: Archive root, defaults to CALCULATION_ARCHIVE_DIR (disabled if unset)
+        """
+        self.directory = directory or os.getenv('CALCULATION_ARCHIVE_DIR')
+        # Part files are immutable, so their summaries are computed once
+        self._summaries: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def months(self) -> List[str]:
+        """Archived months, oldest first"""
+        if not self.enabled:
+            return []
+        return sorted(name for name in os.listdir(self.directory)
+                      if os.path.isdir(os.path.join(self.directory, name)))
+
+    def table(self, name: str = 'calculations', months: Optional[List[str]] = None,
+              columns: Optional[List[str]] = None) -> Optional[pa.Table]:
+        """
+        Archived rows as one Arrow table backed by memory-mapped files
+
+        Args:
+            name: 'calculations' or 'sku_lines'
+            months: Months to read, defaults to all
+            columns: Columns to keep, defaults to all
+
+        Returns:
+            Arrow table, or None if nothing is archived
+        """
+        tables = [self._read(path, columns) for path in self._parts(name, months)]
+        if not tables:
+            return None
+        return pa.concat_tables(tables)
+
+    def summary(self, months: Optional[List[str]] = None) -> Dict[str, float]:
+        """
+        Count and sums over archived calculations
+
+        Returns:
+            Dictionary with 'total_calculations', 'utilization_sum', 'trucks_sum',
+            'total_volume_shipped' and 'total_weight_shipped'
+        """
+        total = {'total_calculations': 0, 'utilization_sum': 0.0, 'trucks_sum': 0.0,
+                 'total_volume_shipped': 0.0, 'total_weight_shipped': 0.0}
+
+        for path in self._parts('calculations', months):
+            with self._lock:
+                part = self._summaries.get(path)
+            if part is None:
+                part = self._summarize(path)
+                with self._lock:
+                    self._summaries[path] = part
+            for key in total:
+                total[key] += part[key]
+
+        return total
+
+    def monthly_summary(self) -> List[Dict[str, Any]]:
+        """Calculations, average utilization and trucks per archived month"""
+        rows = []
+        for month in self.months():
+            part = self.summary([month])
+            count = part['total_calculations']
+            rows.append({
+                'month': month,
+                'calculations': count,
+                'avg_utilization': part['utilization_sum'] / count if count else 0.0,
+                'trucks_needed': part['trucks_sum'],
+                'total_volume': part['total_volume_shipped']
+            })
+        return rows
+
+    def write_month(self, month: str, calculations) -> Dict[str, int]:
+        """
+        Write calculations of one month as a new part of its partition
+
+        Files are written under a temporary name and renamed, so readers never see a
+        partial part.
+
+        Args:
+            month: Partition, e.g. '2025-05'
+            calculations: Iterable of stored calculations
+
+        Returns:
+            Dictionary with the number of 'calculations' and 'sku_lines' rows written
+        """
+        partition = os.path.join(self.directory, month)
+        os.makedirs(partition, exist_ok=True)
+
+        part = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        paths = {name: os.path.join(partition, f"{name}.{part}.arrow") for name in ('calculations', 'sku_lines')}
+        temporary = {name: path + '.tmp' for name, path in paths.items()}
+
+        counts = export_calculations(calculations, temporary['calculations'], temporary['sku_lines'],
+                                     export_format='arrow')
+        if counts['calculations'] == 0:
+            for path in temporary.values():
+                os.remove(path)
+            return counts
+
+        # SKU lines first: a part counts as archived once its calculations file exists
+        os.replace(temporary['sku_lines'], paths['sku_lines'])
+        os.replace(temporary['calculations'], paths['calculations'])
+        return counts
+
+    def _parts(self, name: str, months: Optional[List[str]] = None) -> List[str]:
+        """Part files of a table in the given months"""
+        paths = []
+        for month in months or self.months():
+            paths.extend(sorted(glob.glob(os.path.join(self.directory, month, f"{name}.*.arrow"))))
+        return paths
+
+    @staticmethod
+    def _read(path: str, columns: Optional[List[str]] = None) -> pa.Table:
+        """Map an Arrow file into memory; column buffers point into the mapping without copying"""
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        return table.select(columns) if columns else table
+
+    def _summarize(self, path: str) -> Dict[str, float]:
+        """Sums over one part file"""
+        table = self._read(path, ['utilization_percentage', 'trucks_needed', 'total_volume', 'total_weight'])
+
+        def total(column):
+            value = pc.sum(table[column]).as_py()
+            return float(value or 0.0)
+
+        return {
+            'total_calculations': table.num_rows,
+            'utilization_sum': total('utilization_percentage'),
+            'trucks_sum': total('trucks_needed'),
+            'total_volume_shipped': total('total_volume'),
+            'total_weight_shipped': total('total_weight')
+        }
+
+
+def archive_calculations(db_manager, archive: CalculationArchive,
+                         older_than_days: int = DEFAULT_ARCHIVE_AFTER_DAYS,
+                         progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+    """
+    Move whole months of old calculations from the live collection into the archive
+
+    Each month is streamed into a new part file; only the calculations that were written
+    are then deleted from the database.
+
+    Args:
+        db_manager: Connected MongoDBManager
+        archive: Enabled CalculationArchive
+        older_than_days: Age after which whole months are archived
+        progress: Optional callback receiving the completed share and the current step
+
+    Returns:
+        Dictionary with the archived months and the number of calculations moved
+    """
+    cutoff = archive_cutoff(older_than_days)
+    oldest = db_manager.get_oldest_calculation_timestamp()
+
+    archived = {'months': [], 'calculations': 0}
+    if oldest is None or oldest >= cutoff:
+        return archived
+
+    month = month_key(oldest)
+    months = (cutoff.year - oldest.year) * 12 + cutoff.month - oldest.month
+    while month_bounds(month)[0] < cutoff:
+        start, end = month_bounds(month)
+        ids = []
+        if progress:
+            progress(len(archived['months']) / months, f"Archiving {month}")
+
+        def collect(calculations):
+            for calculation in calculations:
+                ids.append(calculation['_id'])
+                yield calculation
+
+        counts = archive.write_month(
+            month,
+            collect(db_manager.iter_calculations(query={'timestamp': {'$gte': start, '$lt': end}}))
+        )
+        if counts['calculations']:
+            db_manager.delete_calculations(ids)
+            archived['months'].append(month)
+            archived['calculations'] += counts['calculations']
+
+        month = month_key(end)
+
+    return archived
@@ -1,6 +1,12 @@
 import math
 from typing import List, Dict, Any
 
+
+def truck_cost(truck_spec: Dict[str, float]) -> float:
+    """Cost of dispatching one truck; an explicit 'cost' wins, otherwise its volume capacity"""
+    return float(truck_spec.get('cost', truck_spec['volume']))
+
+
 class TruckCalculator:
     """Handles all truck utilization calculations"""
     
@@ -0,0 +1,230 @@
+import os
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterable, Optional, Union
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Rows buffered per table before they are written out as one row group / record batch
+DEFAULT_ROW_GROUP_SIZE = 100_000
+
+EXPORT_FORMATS = ('parquet', 'arrow')
+
+# One row per calculation, with its truck spec and results flattened into columns
+CALCULATION_SCHEMA = pa.schema([
+    ('calculation_id', pa.string()),
+    ('timestamp', pa.timestamp('ms')),
+    ('destination', pa.string()),
+    ('truck_type', pa.string()),
+    ('truck_volume_capacity', pa.float64()),
+    ('truck_weight_capacity', pa.float64()),
+    ('sku_count', pa.int32()),
+    ('total_volume', pa.float64()),
+    ('total_weight', pa.float64()),
+    ('trucks_needed', pa.int32()),
+    ('trucks_needed_volume', pa.int32()),
+    ('trucks_needed_weight', pa.int32()),
+    ('utilization_percentage', pa.float64()),
+    ('volume_utilization', pa.float64()),
+    ('weight_utilization', pa.float64()),
+    ('limiting_factor', pa.string())
+])
+
+# One row per SKU line of a calculation, joinable on calculation_id
+SKU_LINE_SCHEMA = pa.schema([
+    ('calculation_id', pa.string()),
+    ('timestamp', pa.timestamp('ms')),
+    ('destination', pa.string()),
+    ('truck_type', pa.string()),
+    ('line', pa.int32()),
+    ('sku_name', pa.string()),
+    ('quantity', pa.int64()),
+    ('volume_per_box', pa.float64()),
+    ('weight_per_box', pa.float64()),
+    ('total_volume', pa.float64()),
+    ('total_weight', pa.float64())
+])
+
+Sink = Union[str, BinaryIO]
+
+
+class _ColumnWriter:
+    """Buffers rows column-wise and writes them out in fixed-size row groups"""
+
+    def __init__(self, sink: Sink, schema: pa.Schema, export_format: str, row_group_size: int):
+        """
+        Initialize column writer
+
+        Args:
+            sink: Path or binary file object
+            schema: Table schema
+            export_format: 'parquet' or 'arrow'
+            row_group_size: Rows per row group / record batch
+        """
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._columns = {name: [] for name in schema.names}
+        self._buffered = 0
+
+        if export_format == 'parquet':
+            self._writer = pq.ParquetWriter(sink, schema, compression='zstd')
+        else:
+            self._writer = pa.ipc.new_file(sink, schema)
+
+    def extend(self, count: int, **columns):
+        """Add rows given as one list per column; scalar values repeat across the rows"""
+        for name, values in self._columns.items():
+            value = columns.get(name)
+            if isinstance(value, list):
+                values.extend(value)
+            else:
+                values.extend([value] * count)
+        self._buffered += count
+        if self._buffered >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows as one row group"""
+        if not self._buffered:
+            return
+        table = pa.Table.from_pydict(self._columns, schema=self.schema)
+        self._writer.write_table(table)
+        self.rows += self._buffered
+        self._columns = {name: [] for name in self.schema.names}
+        self._buffered = 0
+
+    def close(self):
+        """Write the remaining rows and finish the file"""
+        self.flush()
+        self._writer.close()
+
+
+def _number(value, cast=float):
+    """Numeric column value, None for missing or empty values"""
+    if value is None or value == '':
+        return None
+    return cast(value)
+
+
+def _timestamp(value) -> Optional[datetime]:
+    """Stored timestamps come back as datetimes, ISO strings or pandas Timestamps"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if hasattr(value, 'to_pydatetime'):
+        return value.to_pydatetime()
+    return value
+
+
+def export_calculations(calculations: Iterable[Dict[str, Any]], calculations_sink: Sink, sku_lines_sink: Sink,
+                        export_format: str = 'parquet',
+                        row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> Dict[str, int]:
+    """
+    Write calculations and their SKU lines as two flat columnar tables
+
+    Rows are streamed from the iterable into column buffers and written one row group at
+    a time, so memory stays bounded by the row group size however long the history is.
+
+    Args:
+        calculations: Iterable of stored calculations, e.g. MongoDBManager.iter_calculations()
+        calculations_sink: Path or binary file object for the calculations table
+        sku_lines_sink: Path or binary file object for the SKU lines table
+        export_format: 'parquet' or 'arrow' (Arrow IPC file)
+        row_group_size: Rows per row group / record batch
+
+    Returns:
+        Dictionary with the number of 'calculations' and 'sku_lines' rows written
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{export_format}', expected one of {EXPORT_FORMATS}")
+
+    calculation_writer = _ColumnWriter(calculations_sink, CALCULATION_SCHEMA, export_format, row_group_size)
+    sku_writer = _ColumnWriter(sku_lines_sink, SKU_LINE_SCHEMA, export_format, row_group_size)
+
+    try:
+        for calculation in calculations:
+            results = calculation.get('results') or {}
+            truck_spec = calculation.get('truck_spec') or {}
+            skus = calculation.get('skus') or []
+            key = {
+                'calculation_id': str(calculation.get('_id', '')),
+                'timestamp': _timestamp(calculation.get('timestamp')),
+                'destination': calculation.get('destination'),
+                'truck_type': calculation.get('truck_type')
+            }
+
+            calculation_writer.extend(
+                1,
+                **key,
+                truck_volume_capacity=_number(truck_spec.get('volume')),
+                truck_weight_capacity=_number(truck_spec.get('weight')),
+                sku_count=len(skus),
+                total_volume=_number(results.get('total_volume')),
+                total_weight=_number(results.get('total_weight')),
+                trucks_needed=_number(results.get('trucks_needed'), int),
+                trucks_needed_volume=_number(results.get('trucks_needed_volume'), int),
+                trucks_needed_weight=_number(results.get('trucks_needed_weight'), int),
+                utilization_percentage=_number(results.get('utilization_percentage')),
+                volume_utilization=_number(results.get('volume_utilization')),
+                weight_utilization=_number(results.get('weight_utilization')),
+                limiting_factor=results.get('limiting_factor')
+            )
+
+            if not skus:
+                continue
+
+            # SKU lines go in column-wise per calculation instead of row by row
+            quantities = [_number(sku.get('quantity'), int) for sku in skus]
+            volumes = [_number(sku.get('volume_per_box')) for sku in skus]
+            weights = [_number(sku.get('weight_per_box')) for sku in skus]
+            sku_writer.extend(
+                len(skus),
+                **key,
+                line=list(range(len(skus))),
+                sku_name=[sku.get('name') for sku in skus],
+                quantity=quantities,
+                volume_per_box=volumes,
+                weight_per_box=weights,
+                total_volume=[_number(sku.get('total_volume', (q or 0) * (v or 0))) for sku, q, v in zip(skus, quantities, volumes)],
+                total_weight=[_number(sku.get('total_weight', (q or 0) * (w or 0))) for sku, q, w in zip(skus, quantities, weights)]
+            )
+    finally:
+        calculation_writer.close()
+        sku_writer.close()
+
+    return {'calculations': calculation_writer.rows, 'sku_lines': sku_writer.rows}
+
+
+def export_history(db_manager, directory: str, export_format: str = 'parquet',
+                   query: Optional[Dict[str, Any]] = None,
+                   row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> Dict[str, Any]:
+    """
+    Export stored calculations from the database into a directory
+
+    Args:
+        db_manager: Connected MongoDBManager
+        directory: Output directory, created if missing
+        export_format: 'parquet' or 'arrow'
+        query: Optional filter on the calculations collection
+        row_group_size: Rows per row group / record batch
+
+    Returns:
+        Dictionary with the row counts and the written file paths
+    """
+    os.makedirs(directory, exist_ok=True)
+    extension = 'parquet' if export_format == 'parquet' else 'arrow'
+    paths = {
+        'calculations': os.path.join(directory, f"calculations.{extension}"),
+        'sku_lines': os.path.join(directory, f"sku_lines.{extension}")
+    }
+
+    counts = export_calculations(
+        db_manager.iter_calculations(query=query, batch_size=min(row_group_size, 10_000)),
+        paths['calculations'],
+        paths['sku_lines'],
+        export_format=export_format,
+        row_group_size=row_group_size
+    )
+    return dict(counts, paths=paths)
@@ -0,0 +1,189 @@
+import math
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Iterable
+
+
+def normalize_destination(destination: str) -> str:
+    """Normalize a free-text destination so spelling variants share an index key"""
+    return ' '.join(str(destination or '').lower().replace(',', ' , ').split()).replace(' ,', ',')
+
+
+def region_of(destination: str, region_map: Optional[Dict[str, str]] = None) -> str:
+    """
+    Resolve the consolidation region for a destination
+
+    Args:
+        destination: Free-text destination
+        region_map: Optional explicit mapping of normalized destination to region
+
+    Returns:
+        Region key; the text after the last comma (e.g. "Newark, NJ" -> "nj") or the destination itself
+    """
+    key = normalize_destination(destination)
+    if region_map and key in region_map:
+        return region_map[key]
+    if ',' in key:
+        return key.rsplit(',', 1)[1].strip()
+    return key
+
+
+def split_load(load: Dict[str, Any], volume_capacity: float, weight_capacity: float):
+    """
+    Split a load into full truckloads and the remaining partial load
+
+    Args:
+        load: Dictionary with 'volume' and 'weight'
+        volume_capacity: Truck volume capacity
+        weight_capacity: Truck weight capacity
+
+    Returns:
+        Tuple of (number of full trucks, partial load dictionary or None)
+    """
+    fractional_trucks = max(load['volume'] / volume_capacity, load['weight'] / weight_capacity)
+    full = math.floor(fractional_trucks + 1e-9)
+    remainder = 1 - full / fractional_trucks
+
+    if remainder <= 1e-9:
+        return full, None
+
+    partial = dict(load)
+    partial['volume'] = load['volume'] * remainder
+    partial['weight'] = load['weight'] * remainder
+    return full, partial
+
+
+class ConsolidationPlanner:
+    """Merges partial truck loads of pending shipments into shared trucks"""
+
+    def __init__(self, truck_spec: Dict[str, float], region_map: Optional[Dict[str, str]] = None):
+        """
+        Initialize consolidation planner
+
+        Args:
+            truck_spec: Dictionary containing 'volume' and 'weight' capacity
+            region_map: Optional mapping of normalized destination to region
+        """
+        self.truck_volume_capacity = truck_spec['volume']
+        self.truck_weight_capacity = truck_spec['weight']
+        self.region_map = region_map or {}
+
+    def build_index(self, shipments: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+        """
+        Index shipments by region and destination
+
+        Args:
+            shipments: Shipments with 'destination' and either 'results' or 'total_volume'/'total_weight'
+
+        Returns:
+            Nested dictionary region -> destination -> list of normalized shipment loads
+        """
+        index = defaultdict(lambda: defaultdict(list))
+
+        for position, shipment in enumerate(shipments):
+            results = shipment.get('results', shipment)
+            volume = float(results.get('total_volume', 0) or 0)
+            weight = float(results.get('total_weight', 0) or 0)
+            if volume <= 0 and weight <= 0:
+                continue
+
+            destination = normalize_destination(shipment.get('destination', ''))
+            index[region_of(destination, self.region_map)][destination].append({
+                'id': str(shipment.get('_id', shipment.get('id', position))),
+                'destination': shipment.get('destination', ''),
+                'volume': volume,
+                'weight': weight
+            })
+
+        return index
+
+    def plan(self, shipments: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Consolidate shipments into shared trucks
+
+        Full truckloads stay dedicated to their shipment. The leftover partial load of
+        every shipment is merged first with partials to the same destination, then with
+        the remaining partials of the same region.
+
+        Args:
+            shipments: Iterable of pending shipments or stored calculations
+
+        Returns:
+            Dictionary with trucks before/after consolidation and the shared truck plan
+        """
+        index = self.build_index(shipments)
+
+        trucks_before = 0
+        dedicated_trucks = 0
+        shared_trucks = []
+        shipment_count = 0
+
+        for region, destinations in index.items():
+            region_leftovers = []
+
+            for destination, loads in destinations.items():
+                partials = []
+                for load in loads:
+                    shipment_count += 1
+                    full, partial = split_load(load, self.truck_volume_capacity, self.truck_weight_capacity)
+                    trucks_before += full + (1 if partial else 0)
+                    dedicated_trucks += full
+                    if partial:
+                        partials.append(partial)
+
+                # Merge within the destination first; single-shipment trucks go to the region pass
+                for truck in self._pack(partials):
+                    if len(truck['loads']) > 1:
+                        shared_trucks.append(self._describe_truck(truck, region))
+                    else:
+                        region_leftovers.extend(truck['loads'])
+
+            for truck in self._pack(region_leftovers):
+                shared_trucks.append(self._describe_truck(truck, region))
+
+        trucks_after = dedicated_trucks + len(shared_trucks)
+
+        return {
+            'shipments': shipment_count,
+            'regions': len(index),
+            'trucks_before': trucks_before,
+            'trucks_after': trucks_after,
+            'trucks_saved': trucks_before - trucks_after,
+            'dedicated_trucks': dedicated_trucks,
+            'shared_trucks': sorted(
+                (truck for truck in shared_trucks if len(truck['shipment_ids']) > 1),
+                key=lambda truck: -truck['utilization']
+            )
+        }
+
+    def _pack(self, partials: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """First-fit decreasing packing of partial loads on both capacity dimensions"""
+        partials = sorted(
+            partials,
+            key=lambda p: -max(p['volume'] / self.truck_volume_capacity, p['weight'] / self.truck_weight_capacity)
+        )
+
+        trucks = []
+        for partial in partials:
+            for truck in trucks:
+                if (truck['volume'] + partial['volume'] <= self.truck_volume_capacity + 1e-9 and
+                        truck['weight'] + partial['weight'] <= self.truck_weight_capacity + 1e-9):
+                    truck['volume'] += partial['volume']
+                    truck['weight'] += partial['weight']
+                    truck['loads'].append(partial)
+                    break
+            else:
+                trucks.append({'volume': partial['volume'], 'weight': partial['weight'], 'loads': [partial]})
+
+        return trucks
+
+    def _describe_truck(self, truck: Dict[str, Any], region: str) -> Dict[str, Any]:
+        """Summarize a shared truck for reporting"""
+        return {
+            'region': region,
+            'destinations': sorted({load['destination'] for load in truck['loads']}),
+            'shipment_ids': [load['id'] for load in truck['loads']],
+            'volume': truck['volume'],
+            'weight': truck['weight'],
+            'utilization': max(truck['volume'] / self.truck_volume_capacity,
+                               truck['weight'] / self.truck_weight_capacity) * 100
+        }
@@ -1,9 +1,22 @@
 import pymongo
 from pymongo import MongoClient
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Iterator
 import streamlit as st
 import os
+from utils.sku_codec import encode_skus, pack_calculation, unpack_calculation
+from utils.sku_catalog import normalize_sku_name
+from utils.read_cache import cached_read, invalidates, mark_read_failed, start_change_listener
+from utils.archive import CalculationArchive, combine_analytics
+from utils.sketches import CalculationSketch, sketch_day
+from utils.plan_store import SOLVER_VERSION, plan_summary
+
+# Attempts at an optimistic read-merge-write of a sketch document before giving up
+SKETCH_UPDATE_RETRIES = 5
+
+# Unreferenced stored plans are pruned after this many days without use
+PLAN_RETENTION_DAYS = 30
 
 class MongoDBManager:
     """Handles all MongoDB operations for the truck utilization calculator"""
@@ -13,6 +26,10 @@ class MongoDBManager:
         self.client = None
         self.db = None
         self.connected = False
+        # Store SKU arrays as packed binary columns instead of a list of dicts
+        self.compact_skus = os.getenv('SKU_STORAGE_FORMAT', 'plain') == 'packed'
+        # Old months moved out of the calculations collection, combined back in for analytics
+        self.archive = CalculationArchive()
         self.connect()
     
     def connect(self):
@@ -31,6 +48,9 @@ class MongoDBManager:
             # Initialize collections and indexes
             self._setup_database()
             
+            # Let writes from other server processes invalidate cached reads
+            start_change_listener(self.db, ['calculations', 'sku_templates'])
+            
             st.success("✅ Connected to MongoDB Atlas cluster successfully!")
             return True
             
@@ -79,9 +99,47 @@ class MongoDBManager:
             except:
                 pass
             
+            # Setup SKU master catalog collection
+            if 'sku_catalog' not in collections:
+                self.db.create_collection('sku_catalog')
+            
+            try:
+                self.db.sku_catalog.create_index([('name_key', 1)], unique=True)
+            except:
+                pass
+            
+            # Setup daily fleet plans collection
+            if 'fleet_plans' not in collections:
+                self.db.create_collection('fleet_plans')
+            
+            try:
+                self.db.fleet_plans.create_index([('plan_date', 1)], unique=True)
+            except:
+                pass
+            
+            # Setup per truck type and day statistics sketches
+            if 'calculation_sketches' not in collections:
+                self.db.create_collection('calculation_sketches')
+            
+            try:
+                self.db.calculation_sketches.create_index([('truck_type', 1), ('day', 1)], unique=True)
+            except:
+                pass
+            
+            # Setup content-addressed plan store
+            if 'plans' not in collections:
+                self.db.create_collection('plans')
+            
+            try:
+                self.db.plans.create_index([('plan_hash', 1)], unique=True)
+                self.db.plans.create_index([('ref_count', 1), ('last_used_at', 1)])
+            except:
+                pass
+            
         except Exception as e:
             st.warning(f"Database setup completed with some warnings: {str(e)}")
     
+    @invalidates('calculations')
     def save_calculation(self, calculation_data: Dict[str, Any]) -> Optional[str]:
         """Save a calculation to the database"""
         if not self.connected or self.client is None:
@@ -92,14 +150,28 @@ class MongoDBManager:
             if 'timestamp' not in calculation_data:
                 calculation_data['timestamp'] = datetime.now()
             
+            document = calculation_data
+            plan_hash = calculation_data.get('plan_hash')
+            if plan_hash:
+                # Plan details stay in the stored plan; the calculation keeps the summary and a reference
+                document = dict(calculation_data, results=plan_summary(calculation_data['results']))
+            document = pack_calculation(document) if self.compact_skus else document
+            
             # Insert into calculations collection
-            result = self.db.calculations.insert_one(calculation_data)
+            result = self.db.calculations.insert_one(document)
+            if plan_hash:
+                self.db.plans.update_one(
+                    {'plan_hash': plan_hash},
+                    {'$inc': {'ref_count': 1}, '$set': {'last_used_at': datetime.now()}}
+                )
+            self._update_sketches([calculation_data])
             return str(result.inserted_id)
             
         except Exception as e:
             st.error(f"Failed to save calculation: {str(e)}")
             return None
     
+    @cached_read('calculations')
     def get_calculation_history(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Retrieve calculation history from database"""
         if not self.connected or self.client is None:
@@ -114,12 +186,78 @@ class MongoDBManager:
                 .limit(limit)
             )
             
-            return calculations
+            return [unpack_calculation(calculation) for calculation in calculations]
             
         except Exception as e:
             st.error(f"Failed to retrieve calculation history: {str(e)}")
+            mark_read_failed()
             return []
     
+    def iter_calculations(self, query: Optional[Dict[str, Any]] = None,
+                          projection: Optional[Dict[str, Any]] = None,
+                          batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Stream stored calculations with batched cursor reads"""
+        if not self.connected or self.client is None:
+            return
+            
+        try:
+            cursor = (
+                self.db.calculations
+                .find(query or {}, projection)
+                .batch_size(batch_size)
+            )
+            
+            for calculation in cursor:
+                yield unpack_calculation(calculation)
+                
+        except Exception as e:
+            st.error(f"Failed to stream calculations: {str(e)}")
+    
+    def count_calculations(self, query: Optional[Dict[str, Any]] = None) -> int:
+        """Number of stored calculations matching a filter"""
+        if not self.connected or self.client is None:
+            return 0
+            
+        try:
+            return self.db.calculations.count_documents(query or {})
+            
+        except Exception as e:
+            st.error(f"Failed to count calculations: {str(e)}")
+            return 0
+    
+    @invalidates('calculations')
+    def save_fleet_plan(self, plan_date: str, plan: Dict[str, Any]) -> bool:
+        """Write a daily fleet assignment back to its calculations and store the day summary"""
+        if not self.connected or self.client is None:
+            return False
+            
+        try:
+            operations = [
+                pymongo.UpdateMany(
+                    {'_id': {'$in': assignment['calculation_ids']}},
+                    {'$set': {'fleet_plan': {
+                        'plan_date': plan_date,
+                        'trucks': assignment['trucks'],
+                        'shared_with': len(assignment['calculation_ids']),
+                        'within_fleet': assignment['within_fleet']
+                    }}}
+                )
+                for assignment in plan['assignments']
+            ]
+            
+            if operations:
+                self.db.calculations.bulk_write(operations, ordered=False)
+            
+            summary = {key: value for key, value in plan.items() if key != 'assignments'}
+            summary.update({'plan_date': plan_date, 'updated_at': datetime.now()})
+            self.db.fleet_plans.replace_one({'plan_date': plan_date}, summary, upsert=True)
+            return True
+            
+        except Exception as e:
+            st.error(f"Failed to save fleet plan: {str(e)}")
+            return False
+    
+    @invalidates('sku_templates')
     def save_sku_template(self, template_name: str, skus: List[Dict[str, Any]]) -> bool:
         """Save SKU configuration as a reusable template"""
         if not self.connected or self.client is None:
@@ -146,6 +284,7 @@ class MongoDBManager:
             st.error(f"Failed to save SKU template: {str(e)}")
             return False
     
+    @cached_read('sku_templates')
     def get_sku_templates(self) -> List[Dict[str, Any]]:
         """Retrieve all saved SKU templates"""
         if not self.connected or self.client is None:
@@ -162,8 +301,10 @@ class MongoDBManager:
             
         except Exception as e:
             st.error(f"Failed to retrieve SKU templates: {str(e)}")
+            mark_read_failed()
             return []
     
+    @invalidates('sku_templates')
     def delete_sku_template(self, template_name: str) -> bool:
         """Delete a SKU template"""
         if not self.connected or self.client is None:
@@ -177,6 +318,51 @@ class MongoDBManager:
             st.error(f"Failed to delete SKU template: {str(e)}")
             return False
     
+    def get_sku_catalog(self) -> List[Dict[str, Any]]:
+        """Retrieve all SKU master catalog items"""
+        if not self.connected or self.client is None:
+            return []
+            
+        try:
+            return list(
+                self.db.sku_catalog
+                .find({}, {'_id': 0, 'name': 1, 'volume_per_box': 1, 'weight_per_box': 1})
+                .batch_size(10000)
+            )
+            
+        except Exception as e:
+            st.error(f"Failed to retrieve SKU catalog: {str(e)}")
+            return []
+    
+    def upsert_catalog_items(self, skus: List[Dict[str, Any]]) -> bool:
+        """Insert or update SKU master catalog items by name"""
+        if not self.connected or self.client is None:
+            return False
+            
+        try:
+            operations = [
+                pymongo.UpdateOne(
+                    {'name_key': normalize_sku_name(sku['name'])},
+                    {'$set': {
+                        'name': sku['name'],
+                        'volume_per_box': sku['volume_per_box'],
+                        'weight_per_box': sku['weight_per_box'],
+                        'updated_at': datetime.now()
+                    }},
+                    upsert=True
+                )
+                for sku in skus
+            ]
+            
+            if operations:
+                self.db.sku_catalog.bulk_write(operations, ordered=False)
+            return True
+            
+        except Exception as e:
+            st.error(f"Failed to update SKU catalog: {str(e)}")
+            return False
+    
+    @cached_read('calculations')
     def get_analytics_data(self) -> Dict[str, Any]:
         """Get analytics data from stored calculations"""
         if not self.connected or self.client is None:
@@ -187,13 +373,13 @@ class MongoDBManager:
             total_calculations = self.db.calculations.count_documents({})
             
             if total_calculations == 0:
-                return {
+                return combine_analytics({
                     'total_calculations': 0,
                     'avg_utilization': 0,
                     'avg_trucks_needed': 0,
                     'total_volume_shipped': 0,
                     'total_weight_shipped': 0
-                }
+                }, self.archive.summary())
             
             # Get average utilization using aggregation
             pipeline = [
@@ -214,20 +400,204 @@ class MongoDBManager:
                 analytics = result[0]
                 analytics['total_calculations'] = total_calculations
                 analytics.pop('_id', None)  # Remove MongoDB _id
-                return analytics
+                return combine_analytics(analytics, self.archive.summary())
             else:
-                return {
+                return combine_analytics({
                     'total_calculations': total_calculations,
                     'avg_utilization': 0,
                     'avg_trucks_needed': 0,
                     'total_volume_shipped': 0,
                     'total_weight_shipped': 0
-                }
+                }, self.archive.summary())
                 
         except Exception as e:
             st.error(f"Failed to retrieve analytics data: {str(e)}")
+            mark_read_failed()
+            return {}
+    
+    def _update_sketches(self, calculations: List[Dict[str, Any]]):
+        """Merge calculations into their truck type and day sketches"""
+        groups = {}
+        for calculation in calculations:
+            key = (calculation.get('truck_type', ''), sketch_day(calculation['timestamp']))
+            groups.setdefault(key, CalculationSketch()).add(calculation)
+        
+        try:
+            for (truck_type, day), sketch in groups.items():
+                # Read, merge and write back only if nobody updated the document in between
+                for _ in range(SKETCH_UPDATE_RETRIES):
+                    current = self.db.calculation_sketches.find_one({'truck_type': truck_type, 'day': day})
+                    merged = CalculationSketch.from_dict(current['sketch'] if current else None)
+                    merged.merge(sketch)
+                    version = current['version'] if current else 0
+                    document = {
+                        'truck_type': truck_type,
+                        'day': day,
+                        'version': version + 1,
+                        'sketch': merged.to_dict(),
+                        'updated_at': datetime.now()
+                    }
+                    
+                    if current:
+                        result = self.db.calculation_sketches.replace_one({'_id': current['_id'], 'version': version}, document)
+                        if result.matched_count:
+                            break
+                    else:
+                        try:
+                            self.db.calculation_sketches.insert_one(document)
+                            break
+                        except pymongo.errors.DuplicateKeyError:
+                            continue
+                else:
+                    st.warning(f"Statistics sketch for {truck_type} on {day} kept changing; "
+                               f"{sketch.calculations} calculation(s) are missing from its percentiles")
+                
+        except Exception as e:
+            st.warning(f"Failed to update statistics sketches: {str(e)}")
+    
+    @cached_read('calculations')
+    def get_utilization_percentiles(self, truck_type: Optional[str] = None, days: Optional[int] = None) -> Dict[str, Any]:
+        """Approximate utilization percentiles and distinct counts from the stored sketches"""
+        if not self.connected or self.client is None:
+            return {}
+            
+        try:
+            query = {}
+            if truck_type:
+                query['truck_type'] = truck_type
+            if days:
+                query['day'] = {'$gte': sketch_day(datetime.now() - timedelta(days=days - 1))}
+            
+            # One document per truck type and day, however many calculations they hold
+            merged = CalculationSketch()
+            for document in self.db.calculation_sketches.find(query, {'sketch': 1}):
+                merged.merge(CalculationSketch.from_dict(document['sketch']))
+            
+            return merged.summary()
+            
+        except Exception as e:
+            st.error(f"Failed to read statistics sketches: {str(e)}")
+            mark_read_failed()
+            return {}
+    
+    def get_stored_plan(self, plan_hash: str) -> Optional[Dict[str, Any]]:
+        """Results of a stored plan by content hash, or None if it was never stored"""
+        if not self.connected or self.client is None:
+            return None
+            
+        try:
+            plan = self.db.plans.find_one({'plan_hash': plan_hash}, {'_id': 0, 'results': 1})
+            return plan['results'] if plan else None
+            
+        except Exception as e:
+            st.error(f"Failed to read stored plan: {str(e)}")
+            return None
+    
+    def store_plan(self, plan_hash: str, truck_spec: Dict[str, float], skus: List[Dict[str, Any]],
+                   results: Dict[str, Any]) -> bool:
+        """Store a plan under its content hash; a plan already stored by another process is kept"""
+        if not self.connected or self.client is None:
+            return False
+            
+        try:
+            now = datetime.now()
+            self.db.plans.update_one(
+                {'plan_hash': plan_hash},
+                {'$setOnInsert': {
+                    'solver_version': SOLVER_VERSION,
+                    'truck_spec': truck_spec,
+                    'skus_packed': encode_skus(skus),
+                    'results': results,
+                    'ref_count': 0,
+                    'created_at': now,
+                    'last_used_at': now
+                }},
+                upsert=True
+            )
+            return True
+            
+        except pymongo.errors.DuplicateKeyError:
+            # Two processes upserted the same plan at once; either copy is the same plan
+            return True
+        except Exception as e:
+            st.error(f"Failed to store plan: {str(e)}")
+            return False
+    
+    def get_plan_store_stats(self) -> Dict[str, int]:
+        """Stored plans, the calculations referencing them and the unreferenced plans"""
+        if not self.connected or self.client is None:
             return {}
+            
+        try:
+            totals = list(self.db.plans.aggregate([
+                {'$group': {
+                    '_id': None,
+                    'plans': {'$sum': 1},
+                    'references': {'$sum': '$ref_count'},
+                    'unreferenced': {'$sum': {'$cond': [{'$lte': ['$ref_count', 0]}, 1, 0]}}
+                }}
+            ]))
+            if not totals:
+                return {'plans': 0, 'references': 0, 'unreferenced': 0}
+            totals[0].pop('_id')
+            return totals[0]
+            
+        except Exception as e:
+            st.error(f"Failed to read plan store statistics: {str(e)}")
+            return {}
+    
+    def prune_plans(self, older_than_days: int = PLAN_RETENTION_DAYS) -> int:
+        """Delete stored plans that no calculation references and that were not used recently"""
+        if not self.connected or self.client is None:
+            return 0
+            
+        try:
+            cutoff = datetime.now() - timedelta(days=older_than_days)
+            result = self.db.plans.delete_many({'ref_count': {'$lte': 0}, 'last_used_at': {'$lt': cutoff}})
+            return result.deleted_count
+            
+        except Exception as e:
+            st.error(f"Failed to prune stored plans: {str(e)}")
+            return 0
+    
+    def get_oldest_calculation_timestamp(self) -> Optional[datetime]:
+        """Timestamp of the oldest calculation in the live collection"""
+        if not self.connected or self.client is None:
+            return None
+            
+        try:
+            oldest = self.db.calculations.find_one({}, {'timestamp': 1}, sort=[('timestamp', 1)])
+            return oldest['timestamp'] if oldest else None
+            
+        except Exception as e:
+            st.error(f"Failed to read the oldest calculation: {str(e)}")
+            return None
+    
+    @invalidates('calculations')
+    def delete_calculations(self, calculation_ids: List[Any], batch_size: int = 10000) -> int:
+        """Delete calculations by ID in batches, e.g. after they were archived"""
+        if not self.connected or self.client is None:
+            return 0
+            
+        try:
+            deleted = 0
+            for i in range(0, len(calculation_ids), batch_size):
+                batch = {'_id': {'$in': calculation_ids[i:i + batch_size]}}
+                references = Counter(
+                    calculation['plan_hash']
+                    for calculation in self.db.calculations.find(dict(batch, plan_hash={'$exists': True}), {'plan_hash': 1})
+                )
+                result = self.db.calculations.delete_many(batch)
+                deleted += result.deleted_count
+                for plan_hash, count in references.items():
+                    self.db.plans.update_one({'plan_hash': plan_hash}, {'$inc': {'ref_count': -count}})
+            return deleted
+            
+        except Exception as e:
+            st.error(f"Failed to delete calculations: {str(e)}")
+            return 0
     
+    @invalidates('calculations')
     def clear_calculation_history(self) -> bool:
         """Clear all calculation history"""
         if not self.connected or self.client is None:
@@ -235,6 +605,9 @@ class MongoDBManager:
             
         try:
             self.db.calculations.delete_many({})
+            self.db.calculation_sketches.delete_many({})
+            # Stored plans stay reusable, but nothing references them any more
+            self.db.plans.update_many({}, {'$set': {'ref_count': 0}})
             return True
             
         except Exception as e:
@@ -271,6 +644,7 @@ class MongoDBManager:
             st.error(f"Failed to get schema info: {str(e)}")
             return {}
     
+    @invalidates('calculations', 'sku_templates')
     def create_sample_data(self) -> bool:
         """Create sample data for demonstration (only if collections are empty)"""
         if not self.connected or self.client is None:
@@ -299,6 +673,7 @@ class MongoDBManager:
                 ]
                 
                 self.db.calculations.insert_many(sample_calculations)
+                self._update_sketches(sample_calculations)
             
             # Create sample SKU template if none exist
             if self.db.sku_templates.count_documents({}) == 0:
@@ -328,7 +703,7 @@ class MongoDBManager:
         try:
             export_data = {
                 'export_timestamp': datetime.now().isoformat(),
-                'calculations': list(self.db.calculations.find({}, {'_id': 0})),
+                'calculations': [unpack_calculation(calculation) for calculation in self.db.calculations.find({}, {'_id': 0})],
                 'sku_templates': list(self.db.sku_templates.find({}, {'_id': 0}))
             }
             
@@ -0,0 +1,212 @@
+import math
+from datetime import date, datetime
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from utils.calculations import TruckCalculator
+
+# Grid cells per constrained dimension in the covering-knapsack table
+DEFAULT_RESOLUTION = 256
+
+# Days ahead over which an approaching due date raises the cost of deferring
+URGENCY_HORIZON_DAYS = 14
+
+
+def _as_date(value) -> Optional[date]:
+    """Parse a due date given as date, datetime or ISO string"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)).date()
+
+
+def deferral_cost(sku: Dict[str, Any], next_shipment: date) -> float:
+    """
+    Cost of deferring one box of a SKU to the next shipment
+
+    Args:
+        sku: SKU dictionary with optional 'priority' (default 1) and 'due_date'
+        next_shipment: Date of the shipment that would carry deferred boxes
+
+    Returns:
+        Cost per box, or infinity if the box is due before the next shipment
+    """
+    priority = float(sku.get('priority', 1) or 1)
+    due = _as_date(sku.get('due_date'))
+    if due is None:
+        return priority
+
+    slack_days = (due - next_shipment).days
+    if slack_days < 0:
+        return math.inf
+
+    # Due right at the next shipment costs double; a due date beyond the horizon costs nothing extra
+    return priority * (1 + max(0, URGENCY_HORIZON_DAYS - slack_days) / URGENCY_HORIZON_DAYS)
+
+
+class DeferralOptimizer:
+    """Finds the cheapest set of boxes to hold back so a shipment needs fewer trucks"""
+
+    def __init__(self, truck_spec: Dict[str, float], resolution: int = DEFAULT_RESOLUTION):
+        """
+        Initialize deferral optimizer
+
+        Args:
+            truck_spec: Dictionary containing 'volume' and 'weight' capacity
+            resolution: Grid cells per constrained dimension
+        """
+        self.calculator = TruckCalculator(truck_spec)
+        self.truck_volume_capacity = truck_spec['volume']
+        self.truck_weight_capacity = truck_spec['weight']
+        self.resolution = resolution
+
+    def plan(self, skus: List[Dict[str, Any]], target_trucks: Optional[int] = None,
+             next_shipment: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Choose boxes to defer so the remaining load fits the target number of trucks
+
+        Solved as a bounded covering knapsack over the excess volume and weight: SKU
+        quantities are split into power-of-two box groups and a min-cost table over the
+        discretized excess is updated one group at a time with NumPy. Item sizes are
+        rounded down and the excess up, so the chosen set always fits.
+
+        Args:
+            skus: List of SKU dictionaries, optionally with 'priority' and 'due_date'
+            target_trucks: Trucks to fit into, defaults to one fewer than needed now
+            next_shipment: Date of the next shipment, defaults to today
+
+        Returns:
+            Dictionary with 'feasible', deferred boxes per SKU, total deferral cost and the
+            calculation results after deferral
+        """
+        results = self.calculator.calculate_requirements(skus)
+        if target_trucks is None:
+            target_trucks = results['trucks_needed'] - 1
+        next_shipment = next_shipment or date.today()
+
+        excess_volume = max(results['total_volume'] - target_trucks * self.truck_volume_capacity, 0.0)
+        excess_weight = max(results['total_weight'] - target_trucks * self.truck_weight_capacity, 0.0)
+
+        if target_trucks < 1:
+            return self._report(False, skus, {}, 0.0, results, target_trucks)
+        if excess_volume <= 0 and excess_weight <= 0:
+            return self._report(True, skus, {}, 0.0, results, target_trucks)
+
+        groups = self._box_groups(skus, next_shipment)
+        chosen = self._solve(groups, excess_volume, excess_weight)
+        if chosen is None:
+            return self._report(False, skus, {}, 0.0, results, target_trucks)
+
+        deferred = {}
+        cost = 0.0
+        for index in chosen:
+            group = groups[index]
+            deferred[group['sku']] = deferred.get(group['sku'], 0) + group['boxes']
+            cost += group['cost']
+
+        remaining = []
+        for i, sku in enumerate(skus):
+            quantity = sku['quantity'] - deferred.get(i, 0)
+            if quantity > 0:
+                remaining.append(dict(
+                    sku,
+                    quantity=quantity,
+                    total_volume=quantity * sku['volume_per_box'],
+                    total_weight=quantity * sku['weight_per_box']
+                ))
+
+        results_after = self.calculator.calculate_requirements(remaining)
+        return self._report(results_after['trucks_needed'] <= target_trucks, skus, deferred, cost,
+                            results_after, target_trucks)
+
+    def _box_groups(self, skus: List[Dict[str, Any]], next_shipment: date) -> List[Dict[str, Any]]:
+        """Split every deferrable SKU quantity into 1, 2, 4, ... box groups"""
+        groups = []
+        for i, sku in enumerate(skus):
+            unit_cost = deferral_cost(sku, next_shipment)
+            if not math.isfinite(unit_cost):
+                continue
+
+            remaining = int(sku['quantity'])
+            size = 1
+            while remaining > 0:
+                boxes = min(size, remaining)
+                groups.append({
+                    'sku': i,
+                    'boxes': boxes,
+                    'volume': boxes * sku['volume_per_box'],
+                    'weight': boxes * sku['weight_per_box'],
+                    # Tiny per-box term prefers deferring fewer boxes among equal costs
+                    'cost': boxes * (unit_cost + 1e-6)
+                })
+                remaining -= boxes
+                size *= 2
+
+        return groups
+
+    def _solve(self, groups: List[Dict[str, Any]], excess_volume: float, excess_weight: float) -> Optional[List[int]]:
+        """Min-cost covering of the excess on a grid; returns the chosen group indexes"""
+        # Halve the grid when both dimensions are constrained to keep the table small
+        cells = self.resolution if excess_volume <= 0 or excess_weight <= 0 else self.resolution // 2
+        volume_cells = cells if excess_volume > 0 else 0
+        weight_cells = cells if excess_weight > 0 else 0
+        volume_unit = excess_volume / volume_cells if volume_cells else 1.0
+        weight_unit = excess_weight / weight_cells if weight_cells else 1.0
+
+        # table[a, b] = min cost to cover at least a volume cells and b weight cells
+        table = np.full((volume_cells + 1, weight_cells + 1), np.inf)
+        table[0, 0] = 0.0
+        # Per group, a bitmap of the cells it improved, for walking back the solution
+        taken = []
+
+        a_index = np.arange(volume_cells + 1)
+        b_index = np.arange(weight_cells + 1)
+
+        for g, group in enumerate(groups):
+            cover_a = int(group['volume'] / volume_unit + 1e-9) if volume_cells else 0
+            cover_b = int(group['weight'] / weight_unit + 1e-9) if weight_cells else 0
+            if cover_a == 0 and cover_b == 0:
+                taken.append(None)
+                continue
+
+            source = table[np.maximum(a_index - cover_a, 0)[:, None], np.maximum(b_index - cover_b, 0)[None, :]]
+            candidate = source + group['cost']
+            better = candidate < table
+            taken.append(np.packbits(better))
+            table = np.where(better, candidate, table)
+
+        if not np.isfinite(table[volume_cells, weight_cells]):
+            return None
+
+        # Walk back through the groups that improved the final cell
+        chosen = []
+        a, b = volume_cells, weight_cells
+        for g in range(len(groups) - 1, -1, -1):
+            if a == 0 and b == 0:
+                break
+            if taken[g] is not None and np.unpackbits(taken[g])[a * (weight_cells + 1) + b]:
+                chosen.append(g)
+                a = max(a - int(groups[g]['volume'] / volume_unit + 1e-9), 0) if volume_cells else 0
+                b = max(b - int(groups[g]['weight'] / weight_unit + 1e-9), 0) if weight_cells else 0
+
+        return chosen
+
+    @staticmethod
+    def _report(feasible: bool, skus: List[Dict[str, Any]], deferred: Dict[int, int], cost: float,
+                results_after: Dict[str, Any], target_trucks: int) -> Dict[str, Any]:
+        """Build the deferral plan report"""
+        return {
+            'feasible': feasible,
+            'target_trucks': target_trucks,
+            'deferred': [
+                {'name': skus[i]['name'], 'boxes': boxes, 'of': skus[i]['quantity']}
+                for i, boxes in sorted(deferred.items())
+            ],
+            'boxes_deferred': sum(deferred.values()),
+            'deferral_cost': cost,
+            'results_after': results_after
+        }
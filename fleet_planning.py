@@ -0,0 +1,227 @@
+import math
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date, time, timedelta
+from multiprocessing import get_context
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+from utils.calculations import truck_cost
+from utils.consolidation import normalize_destination
+
+# Below this many subproblems the process pool costs more than it saves
+PARALLEL_THRESHOLD = 200
+
+
+def day_bounds(plan_date: date) -> Tuple[datetime, datetime]:
+    """Start (inclusive) and end (exclusive) timestamps of a calendar day"""
+    start = datetime.combine(plan_date, time.min)
+    return start, start + timedelta(days=1)
+
+
+def evaluate_load(volume: float, weight: float, truck_types: Dict[str, Dict[str, float]]) -> List[Dict[str, Any]]:
+    """
+    Enumerate fleet options for one destination's combined load
+
+    Options are a single truck type for the whole load, or full trucks of one type with
+    the remainder on the cheapest type that carries it.
+
+    Args:
+        volume: Combined volume
+        weight: Combined weight
+        truck_types: Dictionary of truck types with their specifications
+
+    Returns:
+        List of options {'trucks': {type: count}, 'cost': float} sorted by cost
+    """
+    options = {}
+
+    for name, spec in truck_types.items():
+        fractional = max(volume / spec['volume'], weight / spec['weight'])
+        count = math.ceil(fractional - 1e-9)
+        if count > 0:
+            options[((name, count),)] = count * truck_cost(spec)
+
+        full = math.floor(fractional + 1e-9)
+        if 0 < full < count:
+            remaining_volume = max(volume - full * spec['volume'], 0.0)
+            remaining_weight = max(weight - full * spec['weight'], 0.0)
+            for other, other_spec in truck_types.items():
+                if other == name:
+                    continue
+                if remaining_volume <= other_spec['volume'] and remaining_weight <= other_spec['weight']:
+                    key = tuple(sorted(((name, full), (other, 1))))
+                    options[key] = full * truck_cost(spec) + truck_cost(other_spec)
+
+    return sorted(
+        ({'trucks': dict(key), 'cost': cost} for key, cost in options.items()),
+        key=lambda option: option['cost']
+    )
+
+
+def _evaluate_chunk(chunk: List[Tuple[str, float, float]], truck_types: Dict[str, Dict[str, float]]):
+    """Worker entry point: evaluate the fleet options of a chunk of subproblems"""
+    return [(key, evaluate_load(volume, weight, truck_types)) for key, volume, weight in chunk]
+
+
+class DailyFleetPlanner:
+    """Plans a day's stored calculations jointly against the available fleet"""
+
+    def __init__(self, truck_types: Dict[str, Dict[str, float]], fleet: Dict[str, int],
+                 workers: Optional[int] = None):
+        """
+        Initialize daily fleet planner
+
+        Args:
+            truck_types: Dictionary of truck types with their specifications
+            fleet: Number of available trucks per type
+            workers: Process pool size, defaults to the CPU count
+        """
+        self.truck_types = truck_types
+        self.fleet = dict(fleet)
+        self.workers = workers or os.cpu_count() or 1
+
+    def plan(self, calculations, progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+        """
+        Solve a day's calculations jointly
+
+        Calculations for the same destination share trucks. Every destination is a
+        subproblem whose fleet options are evaluated in the process pool; options are then
+        assigned against the fleet counts with a regret heuristic.
+
+        Args:
+            calculations: Iterable of stored calculations (with '_id', 'destination' and 'results')
+            progress: Optional callback receiving the completed share and the current step
+
+        Returns:
+            Dictionary with per-destination assignments, fleet usage and shortages
+        """
+        groups = defaultdict(lambda: {'ids': [], 'destination': '', 'volume': 0.0, 'weight': 0.0, 'separate_trucks': 0})
+
+        for calculation in calculations:
+            results = calculation.get('results', {})
+            group = groups[normalize_destination(calculation.get('destination', ''))]
+            group['ids'].append(calculation.get('_id'))
+            group['destination'] = group['destination'] or calculation.get('destination', '')
+            group['volume'] += float(results.get('total_volume', 0) or 0)
+            group['weight'] += float(results.get('total_weight', 0) or 0)
+            group['separate_trucks'] += int(results.get('trucks_needed', 0) or 0)
+
+        subproblems = [(key, group['volume'], group['weight']) for key, group in groups.items()
+                       if group['volume'] > 0 or group['weight'] > 0]
+        if progress:
+            progress(0.3, f"Evaluating {len(subproblems)} destinations")
+
+        options = dict(self._evaluate(subproblems, progress))
+        if progress:
+            progress(0.9, "Assigning the fleet")
+        assignments = self._assign(options)
+
+        used = defaultdict(int)
+        for option in assignments.values():
+            for name, count in option['trucks'].items():
+                used[name] += count
+
+        return {
+            'calculations': sum(len(group['ids']) for group in groups.values()),
+            'destinations': len(subproblems),
+            'separate_trucks': sum(group['separate_trucks'] for group in groups.values()),
+            'joint_trucks': sum(used.values()),
+            'fleet_used': dict(used),
+            'shortage': {name: used[name] - self.fleet.get(name, 0)
+                         for name in used if used[name] > self.fleet.get(name, 0)},
+            'assignments': [
+                {
+                    'destination': groups[key]['destination'],
+                    'calculation_ids': groups[key]['ids'],
+                    'volume': groups[key]['volume'],
+                    'weight': groups[key]['weight'],
+                    'trucks': option['trucks'],
+                    'cost': option['cost'],
+                    'within_fleet': option['within_fleet']
+                }
+                for key, option in assignments.items()
+            ]
+        }
+
+    def _evaluate(self, subproblems: List[Tuple[str, float, float]],
+                  progress: Optional[Callable[[float, str], None]] = None):
+        """Evaluate subproblem options, fanning out to a process pool for large days"""
+        if len(subproblems) < PARALLEL_THRESHOLD or self.workers <= 1:
+            return _evaluate_chunk(subproblems, self.truck_types)
+
+        chunk_size = math.ceil(len(subproblems) / (self.workers * 4))
+        chunks = [subproblems[i:i + chunk_size] for i in range(0, len(subproblems), chunk_size)]
+
+        evaluated = []
+        # Spawned, not forked: plans run on a job thread of the multi-threaded server
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context('spawn')) as pool:
+            try:
+                for done, result in enumerate(pool.map(_evaluate_chunk, chunks, [self.truck_types] * len(chunks)), start=1):
+                    evaluated.extend(result)
+                    if progress:
+                        progress(0.3 + 0.6 * done / len(chunks), f"Evaluated {len(evaluated)} of {len(subproblems)} destinations")
+            except BaseException:
+                # A cancelled plan should not wait for the chunks still queued
+                pool.shutdown(cancel_futures=True)
+                raise
+        return evaluated
+
+    def _assign(self, options: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+        """Assign options to the fleet, most constrained (highest regret) destinations first"""
+        remaining = dict(self.fleet)
+
+        def regret(key):
+            costs = [option['cost'] for option in options[key]]
+            return costs[1] - costs[0] if len(costs) > 1 else math.inf
+
+        assignments = {}
+        for key in sorted(options, key=regret, reverse=True):
+            chosen = None
+            for option in options[key]:
+                if all(remaining.get(name, 0) >= count for name, count in option['trucks'].items()):
+                    chosen = dict(option, within_fleet=True)
+                    break
+
+            if chosen is None:
+                # Nothing fits the remaining fleet; keep the cheapest option and report the shortage
+                chosen = dict(options[key][0], within_fleet=False)
+
+            for name, count in chosen['trucks'].items():
+                remaining[name] = remaining.get(name, 0) - count
+            assignments[key] = chosen
+
+        return assignments
+
+
+def run_daily_plan(db_manager, plan_date: date, truck_types: Dict[str, Dict[str, float]],
+                   fleet: Dict[str, int], workers: Optional[int] = None,
+                   progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+    """
+    Stream a day's calculations from the database, plan them jointly and write the assignment back
+
+    Args:
+        db_manager: Connected MongoDBManager
+        plan_date: Day to plan
+        truck_types: Dictionary of truck types with their specifications
+        fleet: Number of available trucks per type
+        workers: Process pool size
+        progress: Optional callback receiving the completed share and the current step
+
+    Returns:
+        Plan as returned by DailyFleetPlanner.plan
+    """
+    start, end = day_bounds(plan_date)
+    calculations = db_manager.iter_calculations(
+        query={'timestamp': {'$gte': start, '$lt': end}},
+        projection={'destination': 1, 'results.total_volume': 1, 'results.total_weight': 1, 'results.trucks_needed': 1}
+    )
+
+    if progress:
+        progress(0.0, "Reading calculations")
+
+    plan = DailyFleetPlanner(truck_types, fleet, workers).plan(calculations, progress)
+    if progress:
+        progress(0.95, "Saving the plan")
+    db_manager.save_fleet_plan(plan_date.isoformat(), plan)
+    return plan
@@ -0,0 +1,252 @@
+import math
+from bisect import bisect_left
+from typing import List, Dict, Any, Hashable
+
+from utils.calculations import TruckCalculator
+
+
+class IncrementalPlanner:
+    """Keeps running totals and a box-to-truck assignment that is repaired locally on SKU edits"""
+
+    def __init__(self, truck_spec: Dict[str, float]):
+        """
+        Initialize incremental planner
+
+        Args:
+            truck_spec: Dictionary containing 'volume' and 'weight' capacity
+        """
+        self.truck_spec = dict(truck_spec)
+        self.calculator = TruckCalculator(truck_spec)
+        self.truck_volume_capacity = truck_spec['volume']
+        self.truck_weight_capacity = truck_spec['weight']
+
+        self.rows: Dict[Hashable, Dict[str, Any]] = {}
+
+        # truck id -> {'volume', 'weight', 'boxes': {row key: count}}
+        self.trucks: Dict[int, Dict[str, Any]] = {}
+        # row key -> {truck id: count}
+        self.locations: Dict[Hashable, Dict[int, int]] = {}
+        # Sorted ids of trucks with meaningful free space left; full trucks are skipped when adding boxes
+        self.open_trucks: List[int] = []
+        self._next_truck_id = 0
+
+    @property
+    def total_volume(self) -> float:
+        """Total volume of all rows, summed exactly so edits do not accumulate rounding"""
+        return math.fsum(row['quantity'] * row['volume_per_box'] for row in self.rows.values())
+
+    @property
+    def total_weight(self) -> float:
+        """Total weight of all rows, summed exactly so edits do not accumulate rounding"""
+        return math.fsum(row['quantity'] * row['weight_per_box'] for row in self.rows.values())
+
+    def matches(self, truck_spec: Dict[str, float]) -> bool:
+        """Check whether the planner was built for the given truck specification"""
+        return (self.truck_spec['volume'] == truck_spec['volume'] and
+                self.truck_spec['weight'] == truck_spec['weight'])
+
+    def sync(self, skus: List[Dict[str, Any]]):
+        """
+        Apply the difference between the current rows and a freshly collected SKU list
+
+        Rows are keyed by position, matching how the SKU editor adds and removes rows.
+        Unchanged rows cost a dictionary comparison; only changed rows touch the assignment.
+
+        Args:
+            skus: List of SKU dictionaries as returned by collect_sku_inputs
+        """
+        for key, sku in enumerate(skus):
+            self.set_row(key, sku['quantity'], sku['volume_per_box'], sku['weight_per_box'])
+
+        for key in [key for key in self.rows if not isinstance(key, int) or key >= len(skus)]:
+            self.remove_row(key)
+
+    def set_row(self, key: Hashable, quantity: int, volume_per_box: float, weight_per_box: float):
+        """Add a SKU row or change its quantity or box dimensions"""
+        current = self.rows.get(key)
+        if current and current['volume_per_box'] == volume_per_box and current['weight_per_box'] == weight_per_box:
+            delta = quantity - current['quantity']
+            if delta > 0:
+                self._add_boxes(key, delta)
+            elif delta < 0:
+                self._remove_boxes(key, -delta)
+            current['quantity'] = quantity
+            return
+
+        # New row or changed box dimensions: re-place this row's boxes only
+        if current:
+            self.remove_row(key)
+        self.rows[key] = {
+            'quantity': quantity,
+            'volume_per_box': volume_per_box,
+            'weight_per_box': weight_per_box
+        }
+        self.locations[key] = {}
+        if quantity > 0:
+            self._add_boxes(key, quantity)
+
+    def remove_row(self, key: Hashable):
+        """Remove a SKU row and all of its boxes"""
+        if key not in self.rows:
+            return
+        self._remove_boxes(key, self.rows[key]['quantity'])
+        del self.rows[key]
+        del self.locations[key]
+
+    def results(self) -> Dict[str, Any]:
+        """
+        Current calculation results in the TruckCalculator format
+
+        Returns:
+            Dictionary as returned by calculate_requirements, plus 'packed_trucks' from the box assignment
+        """
+        if not self.rows:
+            results = self.calculator.calculate_requirements([])
+        else:
+            results = self.calculator.calculate_requirements([
+                {'total_volume': self.total_volume, 'total_weight': self.total_weight}
+            ])
+
+        results['packed_trucks'] = len(self.trucks)
+        return results
+
+    def assignment(self) -> List[Dict[str, Any]]:
+        """Per-truck load of the current box assignment"""
+        return [
+            {
+                'volume': truck['volume'],
+                'weight': truck['weight'],
+                'boxes': dict(truck['boxes']),
+                'utilization': max(truck['volume'] / self.truck_volume_capacity,
+                                   truck['weight'] / self.truck_weight_capacity) * 100
+            }
+            for _, truck in sorted(self.trucks.items())
+        ]
+
+    def _fits(self, truck: Dict[str, Any], row: Dict[str, Any]) -> int:
+        """Number of boxes of a row that still fit in a truck"""
+        limits = []
+        if row['volume_per_box'] > 0:
+            limits.append((self.truck_volume_capacity - truck['volume']) / row['volume_per_box'])
+        if row['weight_per_box'] > 0:
+            limits.append((self.truck_weight_capacity - truck['weight']) / row['weight_per_box'])
+        if not limits:
+            return math.inf
+        return max(0, math.floor(min(limits) + 1e-9))
+
+    def _place(self, truck_id: int, key: Hashable, count: int):
+        """Put boxes of a row into a truck"""
+        row = self.rows[key]
+        truck = self.trucks[truck_id]
+        truck['volume'] += count * row['volume_per_box']
+        truck['weight'] += count * row['weight_per_box']
+        truck['boxes'][key] = truck['boxes'].get(key, 0) + count
+        self.locations[key][truck_id] = self.locations[key].get(truck_id, 0) + count
+        self._update_open(truck_id)
+
+    def _take(self, truck_id: int, key: Hashable, count: int):
+        """Remove boxes of a row from a truck"""
+        row = self.rows[key]
+        truck = self.trucks[truck_id]
+        truck['volume'] -= count * row['volume_per_box']
+        truck['weight'] -= count * row['weight_per_box']
+        truck['boxes'][key] -= count
+        if truck['boxes'][key] == 0:
+            del truck['boxes'][key]
+        self.locations[key][truck_id] -= count
+        if self.locations[key][truck_id] == 0:
+            del self.locations[key][truck_id]
+        self._update_open(truck_id)
+
+    def _add_boxes(self, key: Hashable, count: int):
+        """First-fit the new boxes into existing trucks, opening trucks as needed"""
+        row = self.rows[key]
+
+        # Placing can close trucks, so walk a copy of the ordered open list
+        for truck_id in list(self.open_trucks):
+            if count == 0:
+                return
+            placed = min(count, self._fits(self.trucks[truck_id], row))
+            if placed:
+                self._place(truck_id, key, placed)
+                count -= placed
+
+        while count > 0:
+            truck_id = self._open_truck()
+            # An oversized box still gets its own truck
+            placed = min(count, max(1, self._fits(self.trucks[truck_id], row)))
+            self._place(truck_id, key, placed)
+            count -= placed
+
+    def _remove_boxes(self, key: Hashable, count: int):
+        """Remove boxes from the newest trucks first, then repair the touched trucks"""
+        touched = []
+
+        for truck_id in sorted(self.locations[key], reverse=True):
+            if count == 0:
+                break
+            taken = min(count, self.locations[key][truck_id])
+            self._take(truck_id, key, taken)
+            touched.append(truck_id)
+            count -= taken
+
+        self._repair(touched)
+
+    def _repair(self, touched: List[int]):
+        """Drain the last truck into space freed in the touched trucks and drop empty trucks"""
+        for truck_id in touched:
+            if truck_id in self.trucks and not self.trucks[truck_id]['boxes']:
+                self._close_truck(truck_id)
+
+        moved = True
+        while moved and self.trucks:
+            moved = False
+            last_id = max(self.trucks)
+            last = self.trucks[last_id]
+
+            for truck_id in sorted(touched):
+                if truck_id == last_id or truck_id not in self.trucks:
+                    continue
+                for key in list(last['boxes']):
+                    count = min(last['boxes'][key], self._fits(self.trucks[truck_id], self.rows[key]))
+                    if count:
+                        self._take(last_id, key, count)
+                        self._place(truck_id, key, count)
+                        moved = True
+
+            if not last['boxes']:
+                self._close_truck(last_id)
+            else:
+                break
+
+    def _open_truck(self) -> int:
+        """Open a new empty truck"""
+        truck_id = self._next_truck_id
+        self._next_truck_id += 1
+        self.trucks[truck_id] = {'volume': 0.0, 'weight': 0.0, 'boxes': {}}
+        # Ids only grow, so a new truck goes at the end
+        self.open_trucks.append(truck_id)
+        return truck_id
+
+    def _close_truck(self, truck_id: int):
+        """Drop an empty truck"""
+        del self.trucks[truck_id]
+        self._set_open(truck_id, False)
+
+    def _update_open(self, truck_id: int):
+        """Keep a truck in the open set while more than 1% of either capacity is free"""
+        truck = self.trucks[truck_id]
+        if (truck['volume'] < self.truck_volume_capacity * 0.99 and
+                truck['weight'] < self.truck_weight_capacity * 0.99):
+            self._set_open(truck_id, True)
+        else:
+            self._set_open(truck_id, False)
+
+    def _set_open(self, truck_id: int, is_open: bool):
+        """Insert or remove a truck id in the sorted open list"""
+        index = bisect_left(self.open_trucks, truck_id)
+        present = index < len(self.open_trucks) and self.open_trucks[index] == truck_id
+        if is_open and not present:
+            self.open_trucks.insert(index, truck_id)
+        elif not is_open and present:
+            del self.open_trucks[index]
@@ -0,0 +1,204 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# Finished jobs are forgotten after this many seconds
+DEFAULT_RETENTION_SECONDS = 3600.0
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMED_OUT = 'timed_out'
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED, TIMED_OUT)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it was cancelled"""
+
+
+class JobTimedOut(JobCancelled):
+    """Raised inside a job when its time budget ran out"""
+
+
+class Job:
+    """State of one background job, updated by the worker and read by the UI"""
+
+    def __init__(self, name: str, time_budget: Optional[float] = None):
+        """
+        Initialize job
+
+        Args:
+            name: Label shown in the UI
+            time_budget: Seconds the job may run before it is stopped
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.time_budget = time_budget
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._future = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds the job has been running"""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def time_left(self) -> float:
+        """Seconds left of the time budget (infinite without one)"""
+        if self.time_budget is None:
+            return float('inf')
+        return max(self.time_budget - self.elapsed, 0.0)
+
+    def report(self, fraction: float, message: str = ''):
+        """
+        Progress callback for solvers; also the point where cancellation takes effect
+
+        Args:
+            fraction: Completed share of the work between 0 and 1
+            message: Current step
+        """
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+        if message:
+            self.message = message
+        self.check()
+
+    def check(self):
+        """Stop the job if it was cancelled or ran out of time"""
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+        if self.time_budget is not None and self.elapsed > self.time_budget:
+            raise JobTimedOut(self.id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Snapshot of the job for display"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'elapsed': self.elapsed,
+            'error': self.error
+        }
+
+
+class JobRunner:
+    """Runs long solves on a thread pool so reruns never wait on them"""
+
+    def __init__(self, max_workers: Optional[int] = None, retention: float = DEFAULT_RETENTION_SECONDS):
+        """
+        Initialize job runner
+
+        Args:
+            max_workers: Concurrent jobs, defaults to JOB_WORKERS or 4
+            retention: Seconds finished jobs are kept for their results to be read
+        """
+        max_workers = max_workers or int(os.getenv('JOB_WORKERS', '4'))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self.retention = retention
+
+    def submit(self, name: str, fn: Callable[..., Any], *args, time_budget: Optional[float] = None, **kwargs) -> str:
+        """
+        Submit a solve
+
+        The function receives the job's progress callback as the 'progress' keyword
+        argument; calling it also stops the job once it is cancelled or out of time.
+
+        Args:
+            name: Label shown in the UI
+            fn: Function to run
+            time_budget: Seconds the job may run
+            *args, **kwargs: Arguments for the function
+
+        Returns:
+            Job ID
+        """
+        job = Job(name, time_budget)
+        with self._lock:
+            self._purge()
+            self._jobs[job.id] = job
+        job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Job by ID, or None once it expired"""
+        return self._jobs.get(job_id)
+
+    def jobs(self, job_ids: List[str]) -> List[Job]:
+        """Known jobs among the given IDs, in submission order"""
+        return [self._jobs[job_id] for job_id in job_ids if job_id in self._jobs]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Request cancellation of a job
+
+        Queued jobs never start; running jobs stop at their next progress report.
+
+        Returns:
+            True if the job was still unfinished
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+
+        job._cancel.set()
+        if job._future is not None and job._future.cancel():
+            self._finish(job, CANCELLED)
+        return True
+
+    def _run(self, job: Job, fn: Callable[..., Any], args, kwargs):
+        """Worker entry point"""
+        if job._cancel.is_set():
+            self._finish(job, CANCELLED)
+            return
+
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = fn(*args, progress=job.report, **kwargs)
+            job.progress = 1.0
+            self._finish(job, DONE)
+        except JobTimedOut:
+            self._finish(job, TIMED_OUT)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, FAILED)
+
+    @staticmethod
+    def _finish(job: Job, status: str):
+        """Record the final state of a job"""
+        job.finished_at = time.time()
+        if job.started_at is None:
+            job.started_at = job.finished_at
+        job.status = status
+
+    def _purge(self):
+        """Forget finished jobs past their retention (lock held)"""
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
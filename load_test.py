@@ -0,0 +1,333 @@
+"""
+Concurrent-user load test for the Streamlit app
+
+Drives app.py headlessly through Streamlit's AppTest API with N simulated sessions that
+enter SKUs, calculate, load a template and open the analytics dashboard, then reports
+rerun latency percentiles, memory per session and database connections/operations.
+
+AppTest keeps a process-global runtime, so sessions cannot run on threads of one process.
+Each worker process plays the role of one server process: its sessions interleave their
+actions round-robin and share the process-wide caches and connections, while worker
+processes run in parallel.
+
+Usage:
+    python load_test.py --sessions 20 --iterations 5
+    python load_test.py --sessions 50 --processes 4 --mongodb-uri mongodb://localhost:27017/
+    python load_test.py --sessions 20 --mock-db      # in-process DB stand-in (needs mongomock)
+
+With --mock-db each worker gets its own in-memory database and no driver events, so the
+connection and command counts are only reported against a real server.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import tracemalloc
+from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any
+
+import numpy as np
+import pymongo
+from pymongo import monitoring
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+
+class DatabaseMonitor(monitoring.CommandListener, monitoring.ConnectionPoolListener):
+    """Counts database commands and connections opened by every client in the process"""
+
+    def __init__(self):
+        self.commands = Counter()
+        self.connections_created = 0
+        self.connections_open = 0
+        self.max_connections_open = 0
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        with self._lock:
+            self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+            self.connections_open += 1
+            self.max_connections_open = max(self.max_connections_open, self.connections_open)
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_open -= 1
+
+    # Remaining pool events are not needed for the report
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): pass
+    def connection_checked_out(self, event): pass
+    def connection_checked_in(self, event): pass
+
+
+def _find(widgets, label: str):
+    """Find a widget by its label"""
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"Widget '{label}' not found")
+
+
+class SimulatedSession:
+    """One simulated planner working through the app"""
+
+    def __init__(self, session_index: int, timeout: float):
+        """
+        Initialize session
+
+        Args:
+            session_index: Index used to vary inputs between sessions
+            timeout: Per-rerun timeout in seconds
+        """
+        from streamlit.testing.v1 import AppTest
+
+        self.index = session_index
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.latencies = defaultdict(list)
+        self.errors = []
+
+    def _rerun(self, action: str, interaction=None):
+        """Apply an interaction and time the resulting rerun"""
+        start = time.perf_counter()
+        try:
+            if interaction is None:
+                self.app.run()
+            else:
+                interaction().run()
+        except Exception as e:
+            self.errors.append(f"{action}: {e}")
+        self.latencies[action].append(time.perf_counter() - start)
+
+        if self.app.exception:
+            self.errors.append(f"{action}: {self.app.exception[0].value}")
+
+    def steps(self, iterations: int):
+        """Scripted actions, yielding after each rerun so sessions can interleave"""
+        self._rerun('initial_load')
+        yield
+
+        for iteration in range(iterations):
+            self._rerun('enter_destination',
+                        lambda: _find(self.app.text_input, "🎯 Destination").input(f"City {self.index % 7}"))
+            yield
+            self._rerun('enter_sku',
+                        lambda: self.app.text_input(key="sku_name_0").input(f"SKU {self.index}-{iteration}"))
+            yield
+            self._rerun('set_quantity',
+                        lambda: self.app.number_input(key="quantity_0").set_value(10 + iteration * 5))
+            yield
+            self._rerun('calculate',
+                        lambda: _find(self.app.button, "🔍 Calculate Truck Requirements").click())
+            yield
+            self._rerun('open_template_dialog',
+                        lambda: _find(self.app.button, "📋 Load SKU Template").click())
+            yield
+            self._rerun('analytics',
+                        lambda: _find(self.app.button, "📈 View Analytics Dashboard").click())
+            yield
+
+
+def run_worker(session_indexes: List[int], iterations: int, timeout: float,
+               mongodb_uri: str, mock_db: bool) -> Dict[str, Any]:
+    """
+    Run a group of sessions inside one process, interleaving their actions
+
+    Args:
+        session_indexes: Indexes of the sessions handled by this worker
+        iterations: Scripted action loops per session
+        timeout: Per-rerun timeout in seconds
+        mongodb_uri: Database to test against
+        mock_db: Replace the driver with mongomock
+
+    Returns:
+        Raw measurements of this worker
+    """
+    # Never point a load test at the production cluster by accident
+    os.environ['MONGODB_URI'] = mongodb_uri
+    if mock_db:
+        import mongomock
+        pymongo.MongoClient = mongomock.MongoClient
+
+    monitor = DatabaseMonitor()
+    monitoring.register(monitor)
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+
+    sessions = [SimulatedSession(index, timeout) for index in session_indexes]
+    active = [session.steps(iterations) for session in sessions]
+    while active:
+        active = [steps for steps in active if next(steps, StopIteration) is not StopIteration]
+
+    # Sessions are still referenced here, so traced memory includes every session's state
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = defaultdict(list)
+    errors = []
+    for session in sessions:
+        for action, values in session.latencies.items():
+            latencies[action].extend(values)
+        errors.extend(session.errors)
+
+    return {
+        'sessions': len(sessions),
+        'latencies': dict(latencies),
+        'errors': errors,
+        'memory_bytes': current - baseline,
+        'peak_memory_bytes': peak,
+        'db_commands': dict(monitor.commands),
+        'db_connections_created': monitor.connections_created,
+        'db_connections_peak': monitor.max_connections_open
+    }
+
+
+def run_load_test(sessions: int, iterations: int, processes: int, timeout: float,
+                  mongodb_uri: str, mock_db: bool = False) -> Dict[str, Any]:
+    """
+    Run simulated sessions across worker processes and collect measurements
+
+    Args:
+        sessions: Number of simulated sessions
+        iterations: Scripted action loops per session
+        processes: Worker processes (simulated server processes)
+        timeout: Per-rerun timeout in seconds
+        mongodb_uri: Database to test against
+        mock_db: Replace the driver with mongomock
+
+    Returns:
+        Report dictionary
+    """
+    processes = max(1, min(processes, sessions))
+    groups = [list(range(sessions))[i::processes] for i in range(processes)]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        workers = list(pool.map(
+            run_worker,
+            groups,
+            [iterations] * processes,
+            [timeout] * processes,
+            [mongodb_uri] * processes,
+            [mock_db] * processes
+        ))
+    elapsed = time.perf_counter() - start
+
+    latencies = defaultdict(list)
+    errors = []
+    commands = Counter()
+    for worker in workers:
+        for action, values in worker['latencies'].items():
+            latencies[action].extend(values)
+        errors.extend(worker['errors'])
+        commands.update(worker['db_commands'])
+
+    all_latencies = np.concatenate([np.array(values) for values in latencies.values()])
+    actions = {
+        action: _latency_stats(np.array(values))
+        for action, values in sorted(latencies.items())
+    }
+    actions['all'] = _latency_stats(all_latencies)
+
+    return {
+        'sessions': sessions,
+        'iterations': iterations,
+        'processes': processes,
+        'elapsed_seconds': elapsed,
+        'reruns_per_second': len(all_latencies) / elapsed if elapsed > 0 else 0,
+        'latency_ms': actions,
+        'memory_per_session_kb': sum(worker['memory_bytes'] for worker in workers) / sessions / 1024,
+        'peak_memory_mb': max(worker['peak_memory_bytes'] for worker in workers) / 1024 / 1024,
+        'db_commands': dict(commands),
+        'db_commands_total': sum(commands.values()),
+        'db_connections_created': sum(worker['db_connections_created'] for worker in workers),
+        'db_connections_peak': sum(worker['db_connections_peak'] for worker in workers),
+        'errors': errors[:20],
+        'error_count': len(errors)
+    }
+
+
+def _latency_stats(values: np.ndarray) -> Dict[str, float]:
+    """Latency percentiles in milliseconds"""
+    if values.size == 0:
+        return {'count': 0, 'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+    return {
+        'count': int(values.size),
+        'p50': float(np.percentile(values, 50) * 1000),
+        'p90': float(np.percentile(values, 90) * 1000),
+        'p99': float(np.percentile(values, 99) * 1000),
+        'max': float(values.max() * 1000)
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    """Print a readable summary of the load test"""
+    print(f"\nSessions: {report['sessions']}  Iterations: {report['iterations']}  "
+          f"Processes: {report['processes']}  Elapsed: {report['elapsed_seconds']:.1f}s  "
+          f"Reruns/s: {report['reruns_per_second']:.1f}")
+
+    print(f"\n{'Action':<22}{'Count':>8}{'P50 ms':>10}{'P90 ms':>10}{'P99 ms':>10}{'Max ms':>10}")
+    for action, stats in report['latency_ms'].items():
+        print(f"{action:<22}{stats['count']:>8}{stats['p50']:>10.1f}{stats['p90']:>10.1f}"
+              f"{stats['p99']:>10.1f}{stats['max']:>10.1f}")
+
+    print(f"\nMemory per session: {report['memory_per_session_kb']:.0f} KB  "
+          f"(peak traced per process {report['peak_memory_mb']:.1f} MB)")
+    print(f"DB connections created: {report['db_connections_created']}  "
+          f"peak open: {report['db_connections_peak']}  commands: {report['db_commands_total']}")
+    for command, count in sorted(report['db_commands'].items(), key=lambda item: -item[1]):
+        print(f"  {command:<20}{count:>8}")
+
+    if report['error_count']:
+        print(f"\n{report['error_count']} errors, first ones:")
+        for error in report['errors']:
+            print(f"  {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-user load test for the truck calculator")
+    parser.add_argument('--sessions', type=int, default=10, help="Number of simulated sessions")
+    parser.add_argument('--iterations', type=int, default=3, help="Action loops per session")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes, each simulating one server process")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Per-rerun timeout in seconds")
+    parser.add_argument('--mongodb-uri', default='mongodb://localhost:27017/', help="Database to test against")
+    parser.add_argument('--mock-db', action='store_true', help="Use an in-process mongomock database")
+    parser.add_argument('--json', dest='json_path', help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    if args.mock_db:
+        try:
+            import mongomock  # noqa: F401
+        except ImportError:
+            sys.exit("--mock-db needs mongomock: pip install mongomock")
+
+    report = run_load_test(args.sessions, args.iterations, args.processes, args.timeout,
+                           args.mongodb_uri, args.mock_db)
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import os
+import time
+import logging
+import tempfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Rolling window of samples kept per stage
+DEFAULT_WINDOW = 500
+
+# Percentiles reported in the diagnostics panel and Prometheus output
+REPORTED_QUANTILES = (0.5, 0.9, 0.99)
+
+logger = logging.getLogger(__name__)
+
+
+class StageMetrics:
+    """Process-wide rolling timings for each stage of a Streamlit rerun"""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        """
+        Initialize the metrics registry
+
+        Args:
+            window: Number of most recent samples kept per stage
+        """
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, int] = {}
+        self._sums: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        """Record one timing sample for a stage"""
+        with self._lock:
+            if stage not in self._samples:
+                self._samples[stage] = deque(maxlen=self.window)
+                self._counts[stage] = 0
+                self._sums[stage] = 0.0
+            self._samples[stage].append(seconds)
+            self._counts[stage] += 1
+            self._sums[stage] += seconds
+
+    @contextmanager
+    def timed(self, stage: str):
+        """Context manager timing the enclosed block as one sample of a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarize every stage over its rolling window
+
+        Returns:
+            Dictionary keyed by stage with count, sum, last and percentile values (seconds)
+        """
+        with self._lock:
+            snapshot = {stage: list(samples) for stage, samples in self._samples.items()}
+            counts = dict(self._counts)
+            sums = dict(self._sums)
+
+        summary = {}
+        for stage, samples in snapshot.items():
+            ordered = sorted(samples)
+            stats = {
+                'count': counts[stage],
+                'sum': sums[stage],
+                'last': samples[-1] if samples else 0.0
+            }
+            for quantile in REPORTED_QUANTILES:
+                stats[f'p{int(quantile * 100)}'] = _percentile(ordered, quantile)
+            summary[stage] = stats
+
+        return summary
+
+    def to_prometheus(self) -> str:
+        """Render the current summary in the Prometheus text exposition format"""
+        lines = [
+            '# HELP truck_app_stage_seconds Wall-clock time spent in each stage of a rerun',
+            '# TYPE truck_app_stage_seconds summary'
+        ]
+        for stage, stats in sorted(self.summary().items()):
+            for quantile in REPORTED_QUANTILES:
+                value = stats[f'p{int(quantile * 100)}']
+                lines.append(f'truck_app_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'truck_app_stage_seconds_sum{{stage="{stage}"}} {stats["sum"]:.6f}')
+            lines.append(f'truck_app_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus_file(self, path: Optional[str] = None) -> Optional[str]:
+        """
+        Write the Prometheus text output to a file for a node exporter textfile collector
+
+        Args:
+            path: Target file, defaults to the METRICS_FILE environment variable
+
+        Returns:
+            Path written to, or None when no path is configured or the write failed
+        """
+        path = path or os.getenv('METRICS_FILE')
+        if not path:
+            return None
+
+        # Write atomically so scrapers never read a partial file; every rerun gets its own
+        # temporary file since sessions write concurrently
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(path)),
+                                             prefix=f".{os.path.basename(path)}.", suffix='.tmp',
+                                             delete=False) as f:
+                tmp_path = f.name
+                f.write(self.to_prometheus())
+            # Temporary files are private; the collector usually runs as another user
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Failed to write metrics file %s: %s", path, e)
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return None
+        return path
+
+    def reset(self):
+        """Drop all recorded samples"""
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+            self._sums.clear()
+
+
+def _percentile(ordered: List[float], quantile: float) -> float:
+    """Linear-interpolated percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * quantile
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+# Shared by every session served by this process
+stage_metrics = StageMetrics()
@@ -1,18 +1,26 @@
-import random
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from utils.calculations import truck_cost
 
 class OptimizationEngine:
     """Provides optimization suggestions for truck utilization"""
     
-    def __init__(self, truck_spec: Dict[str, float]):
+    def __init__(self, truck_spec: Dict[str, float], truck_types: Optional[Dict[str, Dict[str, float]]] = None):
         """
         Initialize optimization engine
         
         Args:
             truck_spec: Dictionary containing truck specifications
+            truck_types: Optional dictionary of all truck types, enables switch and mix suggestions
         """
         self.truck_volume_capacity = truck_spec['volume']
         self.truck_weight_capacity = truck_spec['weight']
+        self.truck_cost = truck_cost(truck_spec)
+        self.truck_types = truck_types or {}
+        # Without a configured cost, truck_cost falls back to volume, which is no measure of savings
+        self.costs_configured = 'cost' in truck_spec or any('cost' in spec for spec in self.truck_types.values())
     
     def generate_suggestions(self, results: Dict[str, Any], skus: List[Dict[str, Any]]) -> List[str]:
         """
@@ -23,85 +31,176 @@ class OptimizationEngine:
             skus: List of current SKUs
             
         Returns:
-            List of suggestion strings
+            List of suggestion strings, best first
         """
-        suggestions = []
-        
-        utilization = results['utilization_percentage']
-        limiting_factor = results['limiting_factor']
-        trucks_needed = results['trucks_needed']
-        
-        # Calculate spare capacity
-        if limiting_factor == 'volume':
-            spare_capacity = (self.truck_volume_capacity * trucks_needed) - results['total_volume']
-            capacity_unit = 'm³'
-        else:
-            spare_capacity = (self.truck_weight_capacity * trucks_needed) - results['total_weight']
-            capacity_unit = 'kg'
-        
-        # Basic utilization improvement suggestions
-        if utilization < 50:
-            suggestions.append(f"Consider consolidating shipments - you have {spare_capacity:.2f} {capacity_unit} of unused capacity")
-            suggestions.append("Look for additional SKUs going to the same destination or nearby locations")
-        elif utilization < 70:
-            suggestions.append(f"You can add {spare_capacity:.2f} {capacity_unit} more cargo to improve efficiency")
-            suggestions.append("Consider adding fast-moving items to fill the remaining space")
-        
-        # SKU-specific suggestions
-        if skus:
-            suggestions.extend(self._generate_sku_specific_suggestions(skus, spare_capacity, limiting_factor))
-        
-        # Alternative truck type suggestions
-        suggestions.extend(self._generate_truck_type_suggestions(results, skus))
-        
-        # Route optimization suggestions
-        suggestions.extend(self._generate_route_suggestions())
-        
-        return suggestions[:5]  # Return top 5 suggestions
+        return [action['description'] for action in self.rank_actions(results, skus)[:5]]
     
-    def _generate_sku_specific_suggestions(self, skus: List[Dict[str, Any]], spare_capacity: float, limiting_factor: str) -> List[str]:
-        """Generate suggestions specific to current SKUs"""
-        suggestions = []
+    def rank_actions(self, results: Dict[str, Any], skus: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Enumerate candidate actions, evaluate them in vectorized batches and rank them
         
-        # Find SKUs with potential for quantity increases
-        for sku in skus:
-            if limiting_factor == 'volume':
-                additional_units = int(spare_capacity / sku['volume_per_box'])
-            else:
-                additional_units = int(spare_capacity / sku['weight_per_box'])
+        Candidates are switching truck type, mixing two truck types, deferring units of a
+        SKU and adding units of a SKU into the spare capacity. Every candidate is evaluated
+        with the same rules as TruckCalculator; the ranking is deterministic. Cost saved
+        ranks first only when truck costs are configured, otherwise trucks saved do.
+        
+        Args:
+            results: Calculation results
+            skus: List of current SKUs
             
-            if additional_units > 0:
-                suggestions.append(f"Add {additional_units} more units of '{sku['name']}' to improve utilization")
-                break  # Only suggest for one SKU to avoid clutter
+        Returns:
+            List of actions with 'action', 'description', 'trucks_after', 'trucks_saved',
+            'cost_saved' (0 without configured costs) and 'utilization_after', best first
+        """
+        if not skus or results['trucks_needed'] == 0:
+            return []
         
-        # Suggest combining similar SKUs
-        if len(skus) > 1:
-            suggestions.append("Consider combining similar SKUs into a single shipment")
+        total_volume = results['total_volume']
+        total_weight = results['total_weight']
+        trucks_now = results['trucks_needed']
+        cost_now = trucks_now * self.truck_cost
         
-        return suggestions
+        actions = []
+        actions.extend(self._evaluate_fleet_options(total_volume, total_weight, trucks_now, cost_now))
+        actions.extend(self._evaluate_deferrals(skus, total_volume, total_weight, trucks_now))
+        actions.extend(self._evaluate_additions(skus, total_volume, total_weight, trucks_now))
+        
+        if not self.costs_configured:
+            for action in actions:
+                action['cost_saved'] = 0.0
+        
+        actions.sort(key=lambda action: (
+            -round(action['cost_saved'], 6),
+            -action['trucks_saved'],
+            -round(action['utilization_after'], 6),
+            action['description']
+        ))
+        return actions
     
-    def _generate_truck_type_suggestions(self, results: Dict[str, Any], skus: List[Dict[str, Any]]) -> List[str]:
-        """Generate truck type optimization suggestions"""
-        suggestions = []
+    def _evaluate_fleet_options(self, total_volume: float, total_weight: float,
+                                trucks_now: int, cost_now: float) -> List[Dict[str, Any]]:
+        """Evaluate every single-type and two-type fleet for the load in one broadcast"""
+        if not self.truck_types:
+            return []
+        
+        names = list(self.truck_types)
+        volumes = np.array([self.truck_types[name]['volume'] for name in names], dtype=float)
+        weights = np.array([self.truck_types[name]['weight'] for name in names], dtype=float)
+        costs = np.array([truck_cost(self.truck_types[name]) for name in names], dtype=float)
+        
+        fractional = np.maximum(total_volume / volumes, total_weight / weights)
+        single_trucks = np.ceil(fractional - 1e-9)
+        single_costs = single_trucks * costs
         
-        # This is a simplified suggestion - in practice, you'd calculate for different truck types
-        if results['utilization_percentage'] < 60:
-            suggestions.append("Consider using a smaller truck type if available for better cost efficiency")
-        elif results['utilization_percentage'] > 95:
-            suggestions.append("Consider using a larger truck type to accommodate future growth")
+        # Mixed fleet: full trucks of type a, the remainder on one truck of type b
+        full = np.floor(fractional + 1e-9)
+        remaining_volume = np.maximum(total_volume - full * volumes, 0.0)
+        remaining_weight = np.maximum(total_weight - full * weights, 0.0)
+        tail_fits = (remaining_volume[:, None] <= volumes[None, :] + 1e-9) & (remaining_weight[:, None] <= weights[None, :] + 1e-9)
+        mix_valid = tail_fits & (full[:, None] > 0) & (full[:, None] < single_trucks[:, None]) & ~np.eye(len(names), dtype=bool)
+        mix_costs = full[:, None] * costs[:, None] + costs[None, :]
         
-        return suggestions
+        actions = []
+        for i, name in enumerate(names):
+            if (volumes[i] == self.truck_volume_capacity and weights[i] == self.truck_weight_capacity):
+                continue
+            utilization = fractional[i] / single_trucks[i] * 100
+            actions.append(self._action(
+                'switch_type',
+                f"Switch to {int(single_trucks[i])} {name} truck(s) at {utilization:.0f}% utilization",
+                int(single_trucks[i]), trucks_now, cost_now - single_costs[i], utilization
+            ))
+        
+        for i, j in zip(*np.nonzero(mix_valid)):
+            trucks_after = int(full[i]) + 1
+            capacity_share = total_volume / (full[i] * volumes[i] + volumes[j])
+            weight_share = total_weight / (full[i] * weights[i] + weights[j])
+            utilization = max(capacity_share, weight_share) * 100
+            actions.append(self._action(
+                'mix_types',
+                f"Use {int(full[i])} {names[i]} truck(s) plus 1 {names[j]} truck for the remainder",
+                trucks_after, trucks_now, cost_now - mix_costs[i, j], utilization
+            ))
+        
+        # An option needing more trucks is never offered as a saving
+        if self.costs_configured:
+            return [action for action in actions if action['trucks_saved'] >= 0 and action['cost_saved'] > 1e-9]
+        return [action for action in actions if action['trucks_saved'] > 0]
     
-    def _generate_route_suggestions(self) -> List[str]:
-        """Generate route and logistics optimization suggestions"""
-        suggestions = [
-            "Check for nearby destinations that could be combined in the same route",
-            "Consider scheduling flexibility to combine multiple orders",
-            "Evaluate if partial shipments could be consolidated with future orders"
+    def _evaluate_deferrals(self, skus: List[Dict[str, Any]], total_volume: float,
+                            total_weight: float, trucks_now: int) -> List[Dict[str, Any]]:
+        """Smallest number of units per SKU to defer so the load fits one truck fewer"""
+        if trucks_now <= 1:
+            return []
+        
+        quantities = np.array([sku['quantity'] for sku in skus], dtype=float)
+        volumes = np.array([sku['volume_per_box'] for sku in skus], dtype=float)
+        weights = np.array([sku['weight_per_box'] for sku in skus], dtype=float)
+        
+        excess_volume = max(total_volume - (trucks_now - 1) * self.truck_volume_capacity, 0.0)
+        excess_weight = max(total_weight - (trucks_now - 1) * self.truck_weight_capacity, 0.0)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            units_volume = np.where(excess_volume > 0, np.ceil(excess_volume / volumes - 1e-9), 0)
+            units_weight = np.where(excess_weight > 0, np.ceil(excess_weight / weights - 1e-9), 0)
+            units = np.nan_to_num(np.maximum(units_volume, units_weight), nan=np.inf, posinf=np.inf)
+            feasible = units <= quantities
+            
+            # Infeasible rows hold inf units; zero-size SKUs turn them into NaN, which is never read
+            remaining_volume = total_volume - units * volumes
+            remaining_weight = total_weight - units * weights
+            utilization = np.maximum(remaining_volume / ((trucks_now - 1) * self.truck_volume_capacity),
+                                     remaining_weight / ((trucks_now - 1) * self.truck_weight_capacity)) * 100
+        
+        return [
+            self._action(
+                'defer_units',
+                f"Defer {int(units[i])} unit(s) of '{skus[i]['name']}' to the next shipment to save a truck",
+                trucks_now - 1, trucks_now, self.truck_cost, utilization[i]
+            )
+            for i in np.nonzero(feasible)[0]
         ]
+    
+    def _evaluate_additions(self, skus: List[Dict[str, Any]], total_volume: float,
+                            total_weight: float, trucks_now: int) -> List[Dict[str, Any]]:
+        """Largest number of units per SKU that fit in the spare capacity of the current trucks"""
+        volumes = np.array([sku['volume_per_box'] for sku in skus], dtype=float)
+        weights = np.array([sku['weight_per_box'] for sku in skus], dtype=float)
         
-        # Return a random selection to provide variety
-        return random.sample(suggestions, min(2, len(suggestions)))
+        spare_volume = trucks_now * self.truck_volume_capacity - total_volume
+        spare_weight = trucks_now * self.truck_weight_capacity - total_weight
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            units = np.minimum(np.where(volumes > 0, np.floor(spare_volume / volumes + 1e-9), np.inf),
+                               np.where(weights > 0, np.floor(spare_weight / weights + 1e-9), np.inf))
+            
+            # Zero-size SKUs hold inf units and NaN totals; they are filtered out below
+            new_volume = total_volume + units * volumes
+            new_weight = total_weight + units * weights
+            utilization = np.maximum(new_volume / (trucks_now * self.truck_volume_capacity),
+                                     new_weight / (trucks_now * self.truck_weight_capacity)) * 100
+        
+        return [
+            self._action(
+                'add_units',
+                f"Add {int(units[i])} more units of '{skus[i]['name']}' to reach {utilization[i]:.0f}% utilization at no extra trucks",
+                trucks_now, trucks_now, 0.0, utilization[i]
+            )
+            for i in np.nonzero(np.isfinite(units) & (units > 0))[0]
+        ]
+    
+    @staticmethod
+    def _action(action: str, description: str, trucks_after: int, trucks_now: int,
+                cost_saved: float, utilization_after: float) -> Dict[str, Any]:
+        """Build a ranked action record"""
+        return {
+            'action': action,
+            'description': description,
+            'trucks_after': trucks_after,
+            'trucks_saved': trucks_now - trucks_after,
+            'cost_saved': float(cost_saved),
+            'utilization_after': float(utilization_after)
+        }
     
     def calculate_optimal_quantities(self, skus: List[Dict[str, Any]], target_utilization: float = 85.0) -> Dict[str, Any]:
         """
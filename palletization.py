@@ -0,0 +1,242 @@
+import heapq
+import math
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple
+
+# Standard Euro pallet: 1.2 m x 0.8 m footprint loaded to 1.8 m
+DEFAULT_PALLET_SPEC = {
+    'volume': 1.73,
+    'height': 1.8,
+    'weight': 1000.0,
+    'tare_weight': 25.0
+}
+
+# Distinct box/pallet combinations kept in the pattern cache
+PATTERN_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def _solve_pattern(volume_per_box: float, weight_per_box: float, box_height: float,
+                   pallet_volume: float, pallet_height: float, pallet_weight: float) -> Tuple[int, int, int]:
+    """
+    Boxes per layer, layers and boxes per pallet for one box size on one pallet size
+
+    A box without volume or height is limited by weight alone; one with neither volume
+    nor weight takes no pallet space and gets 0 boxes per pallet.
+    """
+    weight_limit = math.floor(pallet_weight / weight_per_box + 1e-9) if weight_per_box > 0 else None
+
+    if volume_per_box <= 0 or box_height <= 0:
+        if weight_limit is None:
+            return 0, 0, 0
+        # A box heavier than a pallet still gets its own pallet
+        return 0, 0, max(weight_limit, 1)
+
+    footprint = pallet_volume / pallet_height
+    box_footprint = volume_per_box / box_height
+
+    per_layer = math.floor(footprint / box_footprint + 1e-9)
+    layers = math.floor(pallet_height / box_height + 1e-9)
+    boxes = per_layer * layers
+
+    if weight_limit is not None:
+        boxes = min(boxes, weight_limit)
+
+    # An oversized box still gets its own pallet
+    return per_layer, layers, max(boxes, 1)
+
+
+def pallet_pattern(sku: Dict[str, Any], pallet_spec: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Single-SKU pallet pattern, cached per box and pallet size
+
+    Boxes are stacked in layers; without a 'height_per_box' a box is taken to be a cube.
+    Inputs are rounded before the cache lookup so recurring SKUs hit the cache.
+
+    Args:
+        sku: SKU dictionary with 'volume_per_box', 'weight_per_box' and optional 'height_per_box'
+        pallet_spec: Dictionary containing pallet 'volume', 'height' and 'weight' limits
+
+    Returns:
+        Dictionary with 'per_layer', 'layers' and 'boxes_per_pallet' (0 for boxes
+        without volume or weight, which ride on the first pallet)
+    """
+    volume_per_box = float(sku['volume_per_box'])
+    box_height = float(sku.get('height_per_box') or volume_per_box ** (1 / 3))
+
+    per_layer, layers, boxes = _solve_pattern(
+        round(volume_per_box, 6),
+        round(float(sku['weight_per_box']), 6),
+        round(box_height, 6),
+        round(float(pallet_spec['volume']), 6),
+        round(float(pallet_spec['height']), 6),
+        round(float(pallet_spec['weight']), 6)
+    )
+    return {'per_layer': per_layer, 'layers': layers, 'boxes_per_pallet': boxes}
+
+
+def pattern_cache_info():
+    """Hit and miss counts of the pallet pattern cache"""
+    return _solve_pattern.cache_info()
+
+
+class PalletPlanner:
+    """Two-level planning: boxes onto pallets, then pallets into trucks"""
+
+    def __init__(self, truck_spec: Dict[str, float], pallet_spec: Dict[str, float] = None):
+        """
+        Initialize pallet planner
+
+        Args:
+            truck_spec: Dictionary containing 'volume' and 'weight' capacity
+            pallet_spec: Dictionary containing pallet 'volume', 'height', 'weight' and 'tare_weight'
+        """
+        self.pallet_spec = dict(DEFAULT_PALLET_SPEC, **(pallet_spec or {}))
+        self.truck_volume_capacity = truck_spec['volume']
+        self.truck_weight_capacity = truck_spec['weight']
+        # Pallets are not stacked, so each one takes a full pallet volume of truck space
+        self.pallet_positions = max(1, math.floor(self.truck_volume_capacity / self.pallet_spec['volume'] + 1e-9))
+
+    def plan(self, skus: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Pack boxes onto pallets and pallets into trucks
+
+        Each SKU fills whole pallets with its cached pattern; the remainders are combined
+        onto mixed pallets. Pallets are then loaded heaviest first into the truck with the
+        most weight left, opening trucks only when none has room.
+
+        Args:
+            skus: List of SKU dictionaries
+
+        Returns:
+            Dictionary in the TruckCalculator format, plus pallet counts, per-SKU patterns
+            and the per-truck load
+        """
+        pallets, patterns = self._build_pallets(skus)
+        trucks = self._load_trucks(pallets)
+        return self._report(skus, pallets, patterns, trucks)
+
+    def _build_pallets(self, skus: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Full single-SKU pallets from the patterns, then mixed pallets for the remainders"""
+        pallets = []
+        patterns = []
+        remainders = []
+        sizeless = 0
+
+        for sku in skus:
+            pattern = pallet_pattern(sku, self.pallet_spec)
+            if pattern['boxes_per_pallet'] == 0:
+                # Boxes without volume or weight take no room; they ride on the first pallet
+                sizeless += int(sku['quantity'])
+                patterns.append(dict(pattern, name=sku['name'], full_pallets=0, loose_boxes=int(sku['quantity'])))
+                continue
+
+            full, remainder = divmod(int(sku['quantity']), pattern['boxes_per_pallet'])
+            patterns.append(dict(pattern, name=sku['name'], full_pallets=full, loose_boxes=remainder))
+
+            if full:
+                load_weight = pattern['boxes_per_pallet'] * sku['weight_per_box']
+                pallets.extend({'mixed': False, 'weight': load_weight + self.pallet_spec['tare_weight'],
+                                'volume': pattern['boxes_per_pallet'] * sku['volume_per_box']} for _ in range(full))
+            if remainder:
+                remainders.append((sku, remainder))
+
+        # Larger boxes go on first so they end up at the bottom of the mixed pallets
+        remainders.sort(key=lambda item: item[0]['volume_per_box'], reverse=True)
+
+        current = None
+        for sku, count in remainders:
+            while count > 0:
+                if current is None:
+                    current = {'mixed': True, 'weight': self.pallet_spec['tare_weight'], 'volume': 0.0}
+                    pallets.append(current)
+
+                fits = self._fits(current, sku)
+                if fits == 0:
+                    # An oversized box still gets an empty pallet of its own
+                    if current['volume'] == 0.0 and current['weight'] == self.pallet_spec['tare_weight']:
+                        fits = 1
+                    else:
+                        current = None
+                        continue
+
+                placed = min(count, fits)
+                current['volume'] += placed * sku['volume_per_box']
+                current['weight'] += placed * sku['weight_per_box']
+                count -= placed
+
+        if sizeless and not pallets:
+            pallets.append({'mixed': True, 'weight': self.pallet_spec['tare_weight'], 'volume': 0.0})
+
+        return pallets, patterns
+
+    def _fits(self, pallet: Dict[str, Any], sku: Dict[str, Any]) -> int:
+        """Boxes of a SKU that still fit on a mixed pallet"""
+        limits = []
+        if sku['volume_per_box'] > 0:
+            limits.append((self.pallet_spec['volume'] - pallet['volume']) / sku['volume_per_box'])
+        if sku['weight_per_box'] > 0:
+            limits.append((self.pallet_spec['weight'] + self.pallet_spec['tare_weight'] - pallet['weight']) / sku['weight_per_box'])
+        if not limits:
+            return math.inf
+        return max(0, math.floor(min(limits) + 1e-9))
+
+    def _load_trucks(self, pallets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Heaviest pallet first into the truck with the most remaining weight and a free position"""
+        total_weight = sum(pallet['weight'] for pallet in pallets)
+        # Start from the lower bound so heavy pallets spread out instead of filling one truck by weight
+        lower_bound = max(math.ceil(len(pallets) / self.pallet_positions),
+                          math.ceil(total_weight / self.truck_weight_capacity - 1e-9)) if pallets else 0
+
+        trucks = [{'pallets': 0, 'mixed_pallets': 0, 'volume': 0.0, 'weight': 0.0} for _ in range(lower_bound)]
+        # Max-heap of (-remaining weight, truck index) over trucks with free positions
+        heap = [(-self.truck_weight_capacity, index) for index in range(lower_bound)]
+
+        for pallet in sorted(pallets, key=lambda p: p['weight'], reverse=True):
+            if heap and -heap[0][0] + 1e-9 >= pallet['weight']:
+                remaining, index = heapq.heappop(heap)
+                remaining = -remaining
+            else:
+                index = len(trucks)
+                trucks.append({'pallets': 0, 'mixed_pallets': 0, 'volume': 0.0, 'weight': 0.0})
+                remaining = self.truck_weight_capacity
+
+            truck = trucks[index]
+            truck['pallets'] += 1
+            truck['mixed_pallets'] += pallet['mixed']
+            truck['volume'] += pallet['volume']
+            truck['weight'] += pallet['weight']
+
+            if truck['pallets'] < self.pallet_positions:
+                heapq.heappush(heap, (-(remaining - pallet['weight']), index))
+
+        return [truck for truck in trucks if truck['pallets']]
+
+    def _report(self, skus: List[Dict[str, Any]], pallets: List[Dict[str, Any]],
+                patterns: List[Dict[str, Any]], trucks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the plan in the TruckCalculator result format"""
+        trucks_needed = len(trucks)
+        total_volume = sum(sku['total_volume'] for sku in skus)
+        total_weight = sum(pallet['weight'] for pallet in pallets)
+
+        # Truck space is taken by pallet positions, not by the box volume on them
+        position_utilization = len(pallets) / (self.pallet_positions * trucks_needed) * 100 if trucks_needed else 0
+        weight_utilization = total_weight / (self.truck_weight_capacity * trucks_needed) * 100 if trucks_needed else 0
+        limiting_factor = 'volume' if position_utilization >= weight_utilization else 'weight'
+
+        return {
+            'total_volume': total_volume,
+            'total_weight': total_weight,
+            'trucks_needed': trucks_needed,
+            'trucks_needed_volume': math.ceil(len(pallets) / self.pallet_positions) if pallets else 0,
+            'trucks_needed_weight': math.ceil(total_weight / self.truck_weight_capacity) if pallets else 0,
+            'utilization_percentage': max(position_utilization, weight_utilization),
+            'limiting_factor': limiting_factor if trucks_needed else None,
+            'volume_utilization': position_utilization,
+            'weight_utilization': weight_utilization,
+            'pallets': len(pallets),
+            'mixed_pallets': sum(pallet['mixed'] for pallet in pallets),
+            'pallet_positions': self.pallet_positions,
+            'pallet_patterns': patterns,
+            'truck_loads': trucks
+        }
@@ -0,0 +1,51 @@
+import json
+import hashlib
+from typing import Any, Dict, List, Optional
+
+# Bump when a solver change makes stored plans stale; old plans are then never looked up again
+SOLVER_VERSION = 1
+
+# Result fields that can be large and live only in the stored plan, not in every calculation
+PLAN_DETAIL_FIELDS = ('truck_loads', 'pallet_patterns')
+
+
+def canonical_skus(skus: List[Dict[str, Any]]) -> List[List[Any]]:
+    """SKU rows reduced to what a plan depends on, in a fixed order"""
+    return sorted(
+        [sku['name'], int(sku['quantity']), float(sku['volume_per_box']), float(sku['weight_per_box']),
+         None if sku.get('height_per_box') is None else float(sku['height_per_box'])]
+        for sku in skus
+    )
+
+
+def plan_hash(skus: List[Dict[str, Any]], truck_spec: Dict[str, float],
+              pallet_spec: Optional[Dict[str, float]] = None, solver_budget: float = 0) -> str:
+    """
+    Content address of a plan
+
+    Identical manifests planned for the same truck capacities with the same solver
+    settings share one hash, whatever the row order, truck type name or destination.
+
+    Args:
+        skus: List of SKU dictionaries
+        truck_spec: Dictionary containing 'volume' and 'weight' capacity
+        pallet_spec: Pallet limits when planning in pallet mode
+        solver_budget: Seconds for the anytime packing solver
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    payload = {
+        'solver_version': SOLVER_VERSION,
+        'skus': canonical_skus(skus),
+        'truck_spec': {'volume': float(truck_spec['volume']), 'weight': float(truck_spec['weight'])},
+        'pallet_spec': pallet_spec,
+        'solver_budget': float(solver_budget)
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def plan_summary(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Results without the plan details, as kept in a calculation that references its stored plan"""
+    return {key: value for key, value in results.items() if key not in PLAN_DETAIL_FIELDS}
@@ -0,0 +1,319 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Dict, Any, Optional
+
+from utils.anytime_packing import AnytimePacker
+from utils.calculations import TruckCalculator
+from utils.optimization import OptimizationEngine
+from utils.palletization import PalletPlanner
+from utils.plan_store import plan_hash
+from utils.visualizations import create_utilization_chart, create_sku_breakdown_chart
+from utils.worker_pool import SHARED_SOLVE_THRESHOLD, SharedManifest, SharedWorkerPool, evaluate_truck_types
+
+# Finished and in-flight plans kept per server process
+DEFAULT_MAX_ENTRIES = 256
+
+# Utilization below which the results view shows optimization suggestions
+SUGGESTION_THRESHOLD = 70
+
+
+def normalize_skus(skus: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """SKU rows with totals filled in, e.g. for template rows stored without them"""
+    return [
+        dict(
+            sku,
+            total_volume=sku['quantity'] * sku['volume_per_box'],
+            total_weight=sku['quantity'] * sku['weight_per_box']
+        )
+        for sku in skus
+        if sku.get('name') and sku.get('quantity', 0) > 0
+    ]
+
+
+def plan_key(skus: List[Dict[str, Any]], truck_type: str, truck_types: Dict[str, Dict[str, float]],
+             pallet_spec: Optional[Dict[str, float]] = None, solver_budget: float = 0) -> str:
+    """Stable key of everything a precomputed plan depends on"""
+    payload = {
+        'skus': [[sku['name'], sku['quantity'], sku['volume_per_box'], sku['weight_per_box'],
+                  sku.get('height_per_box')] for sku in skus],
+        'truck_type': truck_type,
+        # Suggestions compare against the other truck types, so all specs are part of the key
+        'truck_types': truck_types,
+        'pallet_spec': pallet_spec,
+        'solver_budget': solver_budget
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def compute_plan(skus: List[Dict[str, Any]], truck_type: str, truck_types: Dict[str, Dict[str, float]],
+                 pallet_spec: Optional[Dict[str, float]] = None, solver_budget: float = 0,
+                 results: Optional[Dict[str, Any]] = None,
+                 progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+    """
+    Everything the results view needs for one truck type
+
+    Args:
+        skus: List of SKU dictionaries
+        truck_type: Truck type to plan for
+        truck_types: Dictionary of truck types with their specifications
+        pallet_spec: Pallet limits when planning in pallet mode
+        solver_budget: Seconds for the anytime packing solver; 0 keeps the capacity estimate
+        results: Results already solved elsewhere, e.g. a stored plan, instead of solving again
+        progress: Optional callback of the packing solver
+
+    Returns:
+        Dictionary with 'results', 'suggestions' and the 'utilization_chart' and
+        'sku_breakdown_chart' figures
+    """
+    truck_spec = truck_types[truck_type]
+    if results is None:
+        if pallet_spec:
+            results = PalletPlanner(truck_spec, pallet_spec).plan(skus)
+        elif solver_budget > 0:
+            results = AnytimePacker(truck_spec, seed=0).solve(skus, time_budget=solver_budget, progress=progress)
+        else:
+            results = TruckCalculator(truck_spec).calculate_requirements(skus)
+
+    suggestions = []
+    if results['utilization_percentage'] < SUGGESTION_THRESHOLD:
+        suggestions = OptimizationEngine(truck_spec, truck_types).generate_suggestions(results, skus)
+
+    return {
+        'results': results,
+        'suggestions': suggestions,
+        'utilization_chart': create_utilization_chart(results, truck_spec, results['trucks_needed']),
+        'sku_breakdown_chart': create_sku_breakdown_chart(skus)
+    }
+
+
+class PlanPrecomputer:
+    """Computes plans for every truck type on a background thread pool and keeps the results"""
+
+    def __init__(self, max_workers: Optional[int] = None, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 pool: Optional[SharedWorkerPool] = None):
+        """
+        Initialize precomputer
+
+        Args:
+            max_workers: Thread pool size, defaults to PRECOMPUTE_WORKERS or 2
+            max_entries: Number of plans kept, least recently used evicted first
+            pool: Worker processes for packing large manifests into all truck types at once
+        """
+        max_workers = max_workers or int(os.getenv('PRECOMPUTE_WORKERS', '2'))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='plan-precompute')
+        self._plans: 'OrderedDict[str, Future]' = OrderedDict()
+        # Session -> keys of its latest request, whose queued solves a newer request supersedes
+        self._requests: Dict[str, List[str]] = {}
+        self._max_entries = max_entries
+        # Reentrant: a plan that already failed runs its done callback inside _track
+        self._lock = threading.RLock()
+        self.pool = pool
+        self.hits = 0
+        self.misses = 0
+        self.store_hits = 0
+
+    def submit(self, skus: List[Dict[str, Any]], truck_types: Dict[str, Dict[str, float]],
+               pallet_spec: Optional[Dict[str, float]] = None, solver_budget: float = 0,
+               store=None, session: Optional[str] = None) -> int:
+        """
+        Schedule plans for every truck type that is not cached or in flight yet
+
+        Args:
+            skus: List of SKU dictionaries
+            truck_types: Dictionary of truck types with their specifications
+            pallet_spec: Pallet limits when planning in pallet mode
+            solver_budget: Seconds for the anytime packing solver per plan
+            store: Connected MongoDBManager whose plan store is shared across processes and restarts
+            session: Requesting session; its earlier plans that are still queued are cancelled
+
+        Returns:
+            Number of plans scheduled
+        """
+        skus = normalize_skus(skus)
+        if not skus:
+            return 0
+
+        # Large packing solves go to the worker processes together, one truck type per worker
+        shared = (solver_budget > 0 and not pallet_spec and self.pool is not None
+                  and len(skus) >= SHARED_SOLVE_THRESHOLD)
+
+        scheduled = 0
+        pending = {}
+        keys = []
+        with self._lock:
+            for truck_type in truck_types:
+                key = plan_key(skus, truck_type, truck_types, pallet_spec, solver_budget)
+                keys.append(key)
+                if key in self._plans:
+                    continue
+                if shared:
+                    future = pending[truck_type] = Future()
+                else:
+                    future = self._executor.submit(self._compute, skus, truck_type, truck_types, pallet_spec,
+                                                   solver_budget, store)
+                self._track(key, future)
+                scheduled += 1
+
+            if session is not None:
+                self._supersede(self._requests.pop(session, []), keys)
+                self._requests[session] = keys
+            self._evict()
+
+        if pending:
+            self._executor.submit(self._solve_shared, skus, truck_types, solver_budget, pending, store)
+
+        return scheduled
+
+    def get(self, skus: List[Dict[str, Any]], truck_type: str, truck_types: Dict[str, Dict[str, float]],
+            pallet_spec: Optional[Dict[str, float]] = None, solver_budget: float = 0,
+            store=None, progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+        """
+        Precomputed plan for one truck type
+
+        Waits for a plan that is being computed; a plan still queued behind other solves,
+        missing or failed is computed on the calling thread instead. With a solver budget
+        this can take that long, so the script thread uses peek and leaves the wait to a job.
+
+        Args:
+            skus: List of SKU dictionaries
+            truck_type: Truck type to plan for
+            truck_types: Dictionary of truck types with their specifications
+            pallet_spec: Pallet limits when planning in pallet mode
+            solver_budget: Seconds for the anytime packing solver
+            store: Connected MongoDBManager whose plan store is shared across processes and restarts
+            progress: Optional callback of the packing solver when the plan is computed here
+
+        Returns:
+            Plan as returned by compute_plan
+        """
+        skus = normalize_skus(skus)
+        key = plan_key(skus, truck_type, truck_types, pallet_spec, solver_budget)
+
+        with self._lock:
+            future = self._plans.get(key)
+            # A queued plan is cancelled and computed here rather than waiting its turn
+            if future is not None and future.cancel():
+                del self._plans[key]
+                future = None
+            if future is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+
+        if future is not None:
+            return future.result()
+
+        plan = self._compute(skus, truck_type, truck_types, pallet_spec, solver_budget, store, progress=progress)
+        future = Future()
+        future.set_result(plan)
+        with self._lock:
+            self.misses += 1
+            self._plans[key] = future
+            self._evict()
+
+        return plan
+
+    def peek(self, skus: List[Dict[str, Any]], truck_type: str, truck_types: Dict[str, Dict[str, float]],
+             pallet_spec: Optional[Dict[str, float]] = None, solver_budget: float = 0) -> Optional[Dict[str, Any]]:
+        """Finished plan for one truck type, or None while it is queued, solving, failed or missing"""
+        key = plan_key(normalize_skus(skus), truck_type, truck_types, pallet_spec, solver_budget)
+
+        with self._lock:
+            future = self._plans.get(key)
+            if future is None or not future.done() or future.cancelled() or future.exception() is not None:
+                return None
+            self._plans.move_to_end(key)
+            self.hits += 1
+
+        return future.result()
+
+    def _track(self, key: str, future: Future):
+        """Cache a scheduled plan; a plan that fails is dropped so the next request computes it again (lock held)"""
+        self._plans[key] = future
+
+        def forget_failed(done: Future):
+            if done.cancelled() or done.exception() is None:
+                return
+            with self._lock:
+                if self._plans.get(key) is done:
+                    del self._plans[key]
+
+        future.add_done_callback(forget_failed)
+
+    def _supersede(self, previous: List[str], current: List[str]):
+        """Cancel a session's earlier plans that are still queued and not part of its new request (lock held)"""
+        for key in set(previous) - set(current):
+            future = self._plans.get(key)
+            if future is not None and future.cancel():
+                del self._plans[key]
+
+    def _compute(self, skus: List[Dict[str, Any]], truck_type: str, truck_types: Dict[str, Dict[str, float]],
+                 pallet_spec: Optional[Dict[str, float]] = None, solver_budget: float = 0, store=None,
+                 solved: Optional[Dict[str, Any]] = None,
+                 progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+        """
+        compute_plan backed by the plan store; the plan carries its content hash as 'plan_hash'
+
+        Args:
+            store: Connected MongoDBManager holding stored plans, if any
+            solved: Results just solved on the worker pool, stored like any fresh solve
+            progress: Optional callback of the packing solver
+        """
+        truck_spec = truck_types[truck_type]
+        content_hash = plan_hash(skus, truck_spec, pallet_spec, solver_budget)
+        connected = store is not None and store.connected
+
+        results = solved
+        if results is None and connected:
+            results = store.get_stored_plan(content_hash)
+            if results is not None:
+                with self._lock:
+                    self.store_hits += 1
+        fresh = solved is not None or results is None
+
+        plan = compute_plan(skus, truck_type, truck_types, pallet_spec, solver_budget, results=results, progress=progress)
+        if fresh and connected:
+            store.store_plan(content_hash, truck_spec, skus, plan['results'])
+
+        return dict(plan, plan_hash=content_hash)
+
+    def _solve_shared(self, skus: List[Dict[str, Any]], truck_types: Dict[str, Dict[str, float]],
+                      solver_budget: float, pending: Dict[str, Future], store=None):
+        """Pack the manifest into the pending truck types on the worker pool and complete their plans"""
+        # Plans cancelled while queued are skipped; the rest are running from here on
+        pending = {name: future for name, future in pending.items() if future.set_running_or_notify_cancel()}
+        connected = store is not None and store.connected
+
+        # Truck types with a stored plan skip the solve
+        unsolved = {
+            name: truck_types[name] for name in pending
+            if not connected or store.get_stored_plan(plan_hash(skus, truck_types[name], None, solver_budget)) is None
+        }
+
+        solved = {}
+        try:
+            if unsolved:
+                with SharedManifest.from_skus(skus) as manifest:
+                    evaluation = evaluate_truck_types(manifest, unsolved, self.pool, time_budget=solver_budget)
+                solved = {name: AnytimePacker(spec).report(skus, evaluation[name]['packing'])
+                          for name, spec in unsolved.items()}
+        except Exception as e:
+            for future in pending.values():
+                future.set_exception(e)
+            return
+
+        for truck_type, future in pending.items():
+            try:
+                future.set_result(self._compute(skus, truck_type, truck_types, solver_budget=solver_budget, store=store,
+                                                solved=solved.get(truck_type)))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _evict(self):
+        """Drop the least recently used plans beyond the size limit (lock held)"""
+        while len(self._plans) > self._max_entries:
+            key, future = self._plans.popitem(last=False)
+            future.cancel()
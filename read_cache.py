@@ -0,0 +1,185 @@
+import os
+import time
+import functools
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# Safety net for writes made by other processes when change streams are unavailable
+DEFAULT_TTL_SECONDS = 30.0
+
+# Seconds the change listener waits before reconnecting, doubled per failure up to the maximum
+LISTENER_RETRY_SECONDS = 5.0
+LISTENER_MAX_RETRY_SECONDS = 600.0
+
+# Set by a read that failed and returned a fallback value, which must not be cached
+_read_state = threading.local()
+
+
+def mark_read_failed():
+    """Keep the fallback value of a failed read out of the cache; call from the read's error handler"""
+    _read_state.failed = True
+
+
+class ReadCache:
+    """Process-wide cache of database reads, invalidated through per-collection version counters"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL_SECONDS):
+        """
+        Initialize read cache
+
+        Args:
+            ttl: Maximum age of an entry in seconds
+        """
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Tuple[int, float, Any]] = {}
+        self._versions = defaultdict(int)
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, collection: str) -> int:
+        """Current version of a collection"""
+        return self._versions[collection]
+
+    def invalidate(self, collection: str):
+        """Bump a collection's version so every cached read over it is stale"""
+        with self._lock:
+            self._versions[collection] += 1
+
+    def get_or_load(self, key: Hashable, collection: str, loader: Callable[[], Any]) -> Any:
+        """
+        Return a cached value or load it, with one loader per key at a time
+
+        Args:
+            key: Cache key for the read
+            collection: Collection whose writes invalidate the read
+            loader: Function performing the database read
+
+        Returns:
+            Cached or freshly loaded value
+        """
+        cached = self._lookup(key, collection)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Concurrent sessions asking for the same read wait for one query instead of each issuing it
+        with key_lock:
+            cached = self._lookup(key, collection)
+            if cached is not None:
+                return cached
+
+            version = self.version(collection)
+            # A failure inside this read also taints any cached read it is nested in
+            outer_failed = getattr(_read_state, 'failed', False)
+            _read_state.failed = False
+            try:
+                value = loader()
+            finally:
+                failed = _read_state.failed
+                _read_state.failed = outer_failed or failed
+            with self._lock:
+                self.misses += 1
+                if not failed:
+                    self._entries[key] = (version, time.monotonic(), value)
+            return value
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, key: Hashable, collection: str):
+        """Return a fresh cached value or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        version, loaded_at, value = entry
+        if version != self.version(collection) or time.monotonic() - loaded_at > self.ttl:
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+
+read_cache = ReadCache(ttl=float(os.getenv('READ_CACHE_TTL', DEFAULT_TTL_SECONDS)))
+
+
+def cached_read(collection: str):
+    """Cache a MongoDBManager read method in the process-wide read cache"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.connected or self.client is None:
+                return method(self, *args, **kwargs)
+
+            key = (self.db.name, method.__name__, args, tuple(sorted(kwargs.items())))
+            return read_cache.get_or_load(key, collection, lambda: method(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def invalidates(*collections: str):
+    """Bump the cache version of the given collections after a MongoDBManager write method"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                for collection in collections:
+                    read_cache.invalidate(collection)
+        return wrapper
+    return decorator
+
+
+_listener_started = False
+_listener_lock = threading.Lock()
+
+
+def start_change_listener(db, collections) -> bool:
+    """
+    Invalidate the cache from MongoDB change streams so writes by other processes show up at once
+
+    Change streams need a replica set (MongoDB Atlas has one); on a standalone server the
+    listener backs off and retries while the TTL bounds staleness. One listener runs per
+    process, however many sessions connect.
+
+    Args:
+        db: pymongo Database
+        collections: Collection names to watch
+
+    Returns:
+        True if a listener thread was started by this call
+    """
+    global _listener_started
+    with _listener_lock:
+        if _listener_started:
+            return False
+        _listener_started = True
+
+    def listen():
+        pipeline = [{'$match': {'ns.coll': {'$in': list(collections)}}}]
+        delay = LISTENER_RETRY_SECONDS
+        while True:
+            try:
+                with db.watch(pipeline) as stream:
+                    delay = LISTENER_RETRY_SECONDS
+                    for change in stream:
+                        read_cache.invalidate(change['ns']['coll'])
+            except Exception:
+                pass
+            # Writes may have been missed while the stream was down
+            for collection in collections:
+                read_cache.invalidate(collection)
+            time.sleep(delay)
+            delay = min(delay * 2, LISTENER_MAX_RETRY_SECONDS)
+
+    threading.Thread(target=listen, name='read-cache-change-listener', daemon=True).start()
+    return True
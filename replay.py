@@ -0,0 +1,330 @@
+import os
+from collections import deque
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+
+from utils.anytime_packing import AnytimePacker
+from utils.consolidation import normalize_destination
+
+# Calculations per cursor batch and per task
+DEFAULT_BATCH_SIZE = 10_000
+
+# Below this many calculations the process pool costs more than it saves
+REPLAY_PARALLEL_THRESHOLD = 20_000
+
+REPLAY_PERIODS = ('day', 'week', 'month')
+
+# Per (destination, period) sums, in this order
+_SUMS = ('calculations', 'trucks_before', 'trucks_after', 'utilization_before', 'utilization_after',
+         'total_volume', 'total_weight')
+
+_COLUMNS = ('destination', 'truck_type', 'timestamp', 'total_volume', 'total_weight', 'trucks_needed',
+            'utilization_percentage')
+
+
+def period_key(timestamp: datetime, period: str) -> str:
+    """Reporting period of a timestamp, e.g. '2025-05-14', '2025-W20' or '2025-05'"""
+    if period == 'day':
+        return timestamp.strftime('%Y-%m-%d')
+    if period == 'week':
+        year, week, _ = timestamp.isocalendar()
+        return f"{year}-W{week:02d}"
+    return timestamp.strftime('%Y-%m')
+
+
+def _trucks_and_utilization(volumes: np.ndarray, weights: np.ndarray, volume_capacity: np.ndarray,
+                            weight_capacity: np.ndarray, trucks: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """TruckCalculator's trucks and utilization for many loads at once; packed truck counts may be given"""
+    trucks_volume = np.ceil(volumes / volume_capacity)
+    trucks_weight = np.ceil(weights / weight_capacity)
+    if trucks is None:
+        trucks = np.maximum(trucks_volume, trucks_weight)
+
+    # Volume is the limiting factor on ties, as in calculate_requirements
+    limiting = np.where(trucks_volume >= trucks_weight, volumes / volume_capacity, weights / weight_capacity)
+    utilization = np.divide(limiting * 100, trucks, out=np.zeros_like(limiting), where=trucks > 0)
+    return trucks, utilization
+
+
+def _replay_batch(batch: Dict[str, list], proposed: Dict[str, Dict[str, float]], period: str,
+                  packing: bool) -> Dict[str, Any]:
+    """Worker entry point: replay a batch of calculations and sum the outcome per destination and period"""
+    volume_capacity = np.array([proposed.get(t, {}).get('volume', np.nan) for t in batch['truck_type']], dtype=float)
+    weight_capacity = np.array([proposed.get(t, {}).get('weight', np.nan) for t in batch['truck_type']], dtype=float)
+    matched = ~(np.isnan(volume_capacity) | np.isnan(weight_capacity))
+    rows = np.flatnonzero(matched)
+
+    volumes = np.array(batch['total_volume'], dtype=float)[rows]
+    weights = np.array(batch['total_weight'], dtype=float)[rows]
+
+    packed = None
+    if packing:
+        packed = np.array([
+            len(AnytimePacker(proposed[batch['truck_type'][i]]).solve_arrays(
+                np.array([sku['volume_per_box'] for sku in batch['skus'][i]], dtype=float),
+                np.array([sku['weight_per_box'] for sku in batch['skus'][i]], dtype=float),
+                np.array([sku['quantity'] for sku in batch['skus'][i]], dtype=float),
+                time_budget=0
+            )['contents'])
+            for i in rows.tolist()
+        ], dtype=float)
+
+    trucks_after, utilization_after = _trucks_and_utilization(
+        volumes, weights, volume_capacity[rows], weight_capacity[rows], packed
+    )
+
+    labels = {}
+    destinations = []
+    for i in rows.tolist():
+        key = normalize_destination(batch['destination'][i])
+        labels.setdefault(key, batch['destination'][i])
+        destinations.append(key)
+
+    frame = pd.DataFrame({
+        'destination': destinations,
+        'period': [period_key(batch['timestamp'][i], period) for i in rows.tolist()],
+        'calculations': 1,
+        'trucks_before': np.array(batch['trucks_needed'], dtype=float)[rows],
+        'trucks_after': trucks_after,
+        'utilization_before': np.array(batch['utilization_percentage'], dtype=float)[rows],
+        'utilization_after': utilization_after,
+        'total_volume': volumes,
+        'total_weight': weights
+    })
+    sums = frame.groupby(['destination', 'period'], sort=False)[list(_SUMS)].sum()
+
+    return {
+        'sums': {key: values for key, values in zip(sums.index.tolist(), sums.to_numpy().tolist())},
+        'labels': labels,
+        'skipped': int((~matched).sum())
+    }
+
+
+def _empty_batch(packing: bool) -> Dict[str, list]:
+    return {column: [] for column in _COLUMNS + (('skus',) if packing else ())}
+
+
+def _database_batches(db_manager, query: Dict[str, Any], packing: bool,
+                      batch_size: int) -> Iterator[Dict[str, list]]:
+    """Stored calculations as column batches, read with batched cursor reads"""
+    projection = {'destination': 1, 'truck_type': 1, 'timestamp': 1, 'results.total_volume': 1,
+                  'results.total_weight': 1, 'results.trucks_needed': 1, 'results.utilization_percentage': 1}
+    if packing:
+        projection.update({'skus': 1, 'skus_packed': 1})
+
+    batch = _empty_batch(packing)
+    for calculation in db_manager.iter_calculations(query=query, projection=projection, batch_size=batch_size):
+        results = calculation.get('results') or {}
+        timestamp = calculation.get('timestamp')
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        if timestamp is None:
+            continue
+
+        batch['destination'].append(calculation.get('destination', ''))
+        batch['truck_type'].append(calculation.get('truck_type'))
+        batch['timestamp'].append(timestamp)
+        batch['total_volume'].append(float(results.get('total_volume', 0) or 0))
+        batch['total_weight'].append(float(results.get('total_weight', 0) or 0))
+        batch['trucks_needed'].append(float(results.get('trucks_needed', 0) or 0))
+        batch['utilization_percentage'].append(float(results.get('utilization_percentage', 0) or 0))
+        if packing:
+            batch['skus'].append([
+                {key: sku[key] for key in ('quantity', 'volume_per_box', 'weight_per_box')}
+                for sku in calculation.get('skus', [])
+            ])
+
+        if len(batch['destination']) >= batch_size:
+            yield batch
+            batch = _empty_batch(packing)
+
+    if batch['destination']:
+        yield batch
+
+
+def _archive_batches(archive, start: Optional[datetime], end: Optional[datetime],
+                     batch_size: int) -> Iterator[Dict[str, list]]:
+    """Archived calculations as column batches, read from the memory-mapped monthly files"""
+    table = archive.table('calculations', columns=[
+        'destination', 'truck_type', 'timestamp', 'total_volume', 'total_weight', 'trucks_needed',
+        'utilization_percentage'
+    ])
+    if table is None:
+        return
+    if start:
+        table = table.filter(pc.greater_equal(table['timestamp'], start))
+    if end:
+        table = table.filter(pc.less(table['timestamp'], end))
+
+    for record_batch in table.to_batches(max_chunksize=batch_size):
+        columns = record_batch.to_pydict()
+        yield {
+            'destination': [destination or '' for destination in columns['destination']],
+            'truck_type': columns['truck_type'],
+            'timestamp': columns['timestamp'],
+            'total_volume': [value or 0.0 for value in columns['total_volume']],
+            'total_weight': [value or 0.0 for value in columns['total_weight']],
+            'trucks_needed': [value or 0 for value in columns['trucks_needed']],
+            'utilization_percentage': [value or 0.0 for value in columns['utilization_percentage']]
+        }
+
+
+class _Totals:
+    """Running per (destination, period) sums merged from the batch results"""
+
+    def __init__(self):
+        self.sums: Dict[Tuple[str, str], np.ndarray] = {}
+        self.labels: Dict[str, str] = {}
+        self.skipped = 0
+
+    def merge(self, partial: Dict[str, Any]):
+        for key, values in partial['sums'].items():
+            if key in self.sums:
+                self.sums[key] += values
+            else:
+                self.sums[key] = np.array(values, dtype=float)
+        for key, label in partial['labels'].items():
+            self.labels.setdefault(key, label)
+        self.skipped += partial['skipped']
+
+    def rows(self, by: List[str]) -> List[Dict[str, Any]]:
+        """Deltas grouped by 'destination', 'period' or both"""
+        if not self.sums:
+            return []
+        frame = pd.DataFrame(
+            [list(key) + values.tolist() for key, values in self.sums.items()],
+            columns=['destination', 'period'] + list(_SUMS)
+        )
+        grouped = frame.groupby(by, sort=True)[list(_SUMS)].sum().reset_index()
+
+        rows = []
+        for record in grouped.to_dict('records'):
+            count = record['calculations']
+            row = {}
+            if 'destination' in record:
+                row['destination'] = self.labels.get(record['destination'], record['destination'])
+            if 'period' in record:
+                row['period'] = record['period']
+            row.update(_deltas(record, count))
+            rows.append(row)
+        return rows
+
+    def totals(self) -> Dict[str, Any]:
+        total = (np.sum(list(self.sums.values()), axis=0) if self.sums else np.zeros(len(_SUMS))).tolist()
+        return _deltas(dict(zip(_SUMS, total)), total[0])
+
+
+def _deltas(sums: Dict[str, float], count: float) -> Dict[str, Any]:
+    """Trucks and average utilization before and after, with their deltas"""
+    utilization_before = sums['utilization_before'] / count if count else 0.0
+    utilization_after = sums['utilization_after'] / count if count else 0.0
+    return {
+        'calculations': int(count),
+        'trucks_before': int(sums['trucks_before']),
+        'trucks_after': int(sums['trucks_after']),
+        'trucks_delta': int(sums['trucks_after'] - sums['trucks_before']),
+        'utilization_before': utilization_before,
+        'utilization_after': utilization_after,
+        'utilization_delta': utilization_after - utilization_before,
+        'total_volume': sums['total_volume'],
+        'total_weight': sums['total_weight']
+    }
+
+
+def replay_history(db_manager, proposed_specs: Dict[str, Dict[str, float]], period: str = 'month',
+                   start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   packing: bool = False, include_archive: bool = True, workers: Optional[int] = None,
+                   batch_size: int = DEFAULT_BATCH_SIZE,
+                   progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+    """
+    Replay stored calculations under proposed truck specifications
+
+    Calculations are streamed in cursor batches and each batch is replayed in a process
+    pool while the next one is read; workers return per destination and period sums, so
+    memory stays bounded however many calculations are replayed. Each calculation keeps
+    its truck type and is re-planned with that type's proposed capacities.
+
+    Args:
+        db_manager: Connected MongoDBManager
+        proposed_specs: Proposed 'volume' and 'weight' per truck type; other truck types are skipped
+        period: 'day', 'week' or 'month'
+        start: Replay calculations from this timestamp (inclusive)
+        end: Replay calculations before this timestamp
+        packing: Re-plan with the anytime packer on the stored SKUs instead of the capacity
+            estimate; archived calculations have no SKUs and are left out
+        include_archive: Also replay archived months
+        workers: Process pool size, defaults to the CPU count
+        batch_size: Calculations per cursor batch and per task
+        progress: Optional callback receiving the completed share and the current step
+
+    Returns:
+        Dictionary with 'totals', 'by_destination', 'by_period' and 'by_destination_period'
+        rows of trucks and average utilization before and after, plus the numbers of
+        'calculations' replayed and 'skipped' for truck types without a proposal
+    """
+    if period not in REPLAY_PERIODS:
+        raise ValueError(f"Unknown period '{period}', expected one of {REPLAY_PERIODS}")
+
+    query = {}
+    if start or end:
+        query['timestamp'] = {key: value for key, value in (('$gte', start), ('$lt', end)) if value}
+
+    workers = workers or os.cpu_count() or 1
+    expected = db_manager.count_calculations(query)
+    batches = _database_batches(db_manager, query, packing, batch_size)
+    if include_archive and not packing and db_manager.archive.enabled:
+        expected += db_manager.archive.summary()['total_calculations']
+        batches = chain(batches, _archive_batches(db_manager.archive, start, end, batch_size))
+
+    totals = _Totals()
+    replayed = 0
+
+    def merge(partial, size):
+        nonlocal replayed
+        totals.merge(partial)
+        replayed += size
+        if progress:
+            progress(replayed / max(expected, 1), f"Replayed {replayed:,} of {expected:,} calculations")
+
+    if progress:
+        progress(0.0, "Reading calculations")
+
+    if workers <= 1 or expected < REPLAY_PARALLEL_THRESHOLD:
+        for batch in batches:
+            merge(_replay_batch(batch, proposed_specs, period, packing), len(batch['destination']))
+    else:
+        # Spawned, not forked: replays run on a job thread of the multi-threaded server
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+            try:
+                # Keep a couple of batches per worker in flight while the cursor reads ahead
+                in_flight = deque()
+                for batch in batches:
+                    in_flight.append((pool.submit(_replay_batch, batch, proposed_specs, period, packing),
+                                      len(batch['destination'])))
+                    while len(in_flight) >= workers * 2:
+                        future, size = in_flight.popleft()
+                        merge(future.result(), size)
+                while in_flight:
+                    future, size = in_flight.popleft()
+                    merge(future.result(), size)
+            except BaseException:
+                # A cancelled replay should not wait for the batches still queued
+                pool.shutdown(cancel_futures=True)
+                raise
+
+    return {
+        'calculations': replayed - totals.skipped,
+        'skipped': totals.skipped,
+        'period': period,
+        'totals': totals.totals(),
+        'by_destination': sorted(totals.rows(['destination']), key=lambda row: row['trucks_delta']),
+        'by_period': totals.rows(['period']),
+        'by_destination_period': totals.rows(['destination', 'period'])
+    }
@@ -0,0 +1,232 @@
+import os
+import csv
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from utils.calculations import TruckCalculator
+from utils.consolidation import normalize_destination, split_load
+
+EARTH_RADIUS_KM = 6371.0088
+
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.csv')
+
+
+@lru_cache(maxsize=4)
+def load_gazetteer(path: Optional[str] = None) -> Dict[str, Tuple[float, float]]:
+    """
+    Load destination coordinates from a local CSV gazetteer (name, latitude, longitude)
+
+    Args:
+        path: Gazetteer file, defaults to GAZETTEER_PATH or the bundled gazetteer.csv
+
+    Returns:
+        Dictionary of normalized place name to (latitude, longitude)
+    """
+    path = path or os.getenv('GAZETTEER_PATH', DEFAULT_GAZETTEER_PATH)
+    gazetteer = {}
+
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            gazetteer[normalize_destination(row['name'])] = (float(row['latitude']), float(row['longitude']))
+
+    return gazetteer
+
+
+def resolve_coordinates(destination: str, gazetteer: Dict[str, Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    """Look up a destination, falling back to the place name before the first comma"""
+    key = normalize_destination(destination)
+    if key in gazetteer:
+        return gazetteer[key]
+    return gazetteer.get(key.split(',', 1)[0].strip())
+
+
+def haversine_matrix(latitudes, longitudes) -> np.ndarray:
+    """
+    Great-circle distances between every pair of points
+
+    Args:
+        latitudes: Sequence of latitudes in degrees
+        longitudes: Sequence of longitudes in degrees
+
+    Returns:
+        Square matrix of distances in kilometres
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class RoutePlanner:
+    """Builds capacity-feasible multi-stop routes from a depot"""
+
+    def __init__(self, truck_spec: Dict[str, float], depot: str,
+                 gazetteer: Optional[Dict[str, Tuple[float, float]]] = None):
+        """
+        Initialize route planner
+
+        Args:
+            truck_spec: Dictionary containing 'volume' and 'weight' capacity
+            depot: Depot destination name, resolved through the gazetteer
+            gazetteer: Optional preloaded gazetteer
+        """
+        calculator = TruckCalculator(truck_spec)
+        self.truck_volume_capacity = calculator.truck_volume_capacity
+        self.truck_weight_capacity = calculator.truck_weight_capacity
+        self.gazetteer = gazetteer if gazetteer is not None else load_gazetteer()
+        self.depot = depot
+        self.depot_coordinates = resolve_coordinates(depot, self.gazetteer)
+
+        if self.depot_coordinates is None:
+            raise ValueError(f"Depot '{depot}' not found in gazetteer")
+
+    def plan(self, stops: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Plan multi-stop routes with the Clarke-Wright savings heuristic and 2-opt improvement
+
+        Args:
+            stops: Stops with 'destination' and either 'results' or 'total_volume'/'total_weight'
+
+        Returns:
+            Dictionary with routes (stops, distance, utilization), dedicated full loads
+            and destinations missing from the gazetteer
+        """
+        loads = []
+        coordinates = [self.depot_coordinates]
+        unresolved = []
+        dedicated = []
+
+        for stop in stops:
+            results = stop.get('results', stop)
+            load = {
+                'destination': stop.get('destination', ''),
+                'volume': float(results.get('total_volume', 0) or 0),
+                'weight': float(results.get('total_weight', 0) or 0)
+            }
+            if load['volume'] <= 0 and load['weight'] <= 0:
+                continue
+
+            position = resolve_coordinates(load['destination'], self.gazetteer)
+            if position is None:
+                unresolved.append(load['destination'])
+                continue
+
+            # Full truckloads go out and back; only the remainder joins a shared route
+            full, partial = split_load(load, self.truck_volume_capacity, self.truck_weight_capacity)
+            if full:
+                dedicated.append({'destination': load['destination'], 'trucks': full})
+            if partial:
+                loads.append(partial)
+                coordinates.append(position)
+
+        if not loads:
+            return self._summarize([], None, loads, dedicated, unresolved, coordinates)
+
+        coords = np.asarray(coordinates)
+        distances = haversine_matrix(coords[:, 0], coords[:, 1])
+        volumes = np.array([0.0] + [load['volume'] for load in loads])
+        weights = np.array([0.0] + [load['weight'] for load in loads])
+
+        routes = self._savings_routes(distances, volumes, weights)
+        routes = [self._two_opt(route, distances) for route in routes]
+
+        return self._summarize(routes, distances, loads, dedicated, unresolved, coordinates)
+
+    def _savings_routes(self, distances: np.ndarray, volumes: np.ndarray, weights: np.ndarray) -> List[List[int]]:
+        """Merge single-stop routes in order of decreasing savings while capacity allows"""
+        n = len(volumes) - 1
+        routes = {i: [i] for i in range(1, n + 1)}
+        route_of = list(range(n + 1))
+        route_volume = volumes.copy()
+        route_weight = weights.copy()
+
+        # Savings s(i, j) = d(0, i) + d(0, j) - d(i, j) for every stop pair, best first
+        rows, cols = np.triu_indices(n, k=1)
+        rows += 1
+        cols += 1
+        savings = distances[0, rows] + distances[0, cols] - distances[rows, cols]
+        order = np.argsort(-savings, kind='stable')
+
+        for i, j in zip(rows[order].tolist(), cols[order].tolist()):
+            ri, rj = route_of[i], route_of[j]
+            if ri == rj:
+                continue
+            if (route_volume[ri] + route_volume[rj] > self.truck_volume_capacity + 1e-9 or
+                    route_weight[ri] + route_weight[rj] > self.truck_weight_capacity + 1e-9):
+                continue
+
+            first, second = routes[ri], routes[rj]
+            # Both stops must be route endpoints so the merge keeps a single path
+            if first[-1] != i:
+                if first[0] != i:
+                    continue
+                first = first[::-1]
+            if second[0] != j:
+                if second[-1] != j:
+                    continue
+                second = second[::-1]
+
+            routes[ri] = first + second
+            for stop in second:
+                route_of[stop] = ri
+            route_volume[ri] += route_volume[rj]
+            route_weight[ri] += route_weight[rj]
+            del routes[rj]
+
+        return list(routes.values())
+
+    @staticmethod
+    def _two_opt(route: List[int], distances: np.ndarray) -> List[int]:
+        """Improve a depot-to-depot route by reversing segments while it gets shorter"""
+        path = [0] + route + [0]
+        improved = True
+
+        while improved:
+            improved = False
+            for i in range(1, len(path) - 2):
+                for j in range(i + 1, len(path) - 1):
+                    a, b, c, d = path[i - 1], path[i], path[j], path[j + 1]
+                    delta = distances[a, c] + distances[b, d] - distances[a, b] - distances[c, d]
+                    if delta < -1e-9:
+                        path[i:j + 1] = path[i:j + 1][::-1]
+                        improved = True
+
+        return path[1:-1]
+
+    def _summarize(self, routes, distances, loads, dedicated, unresolved, coordinates) -> Dict[str, Any]:
+        """Build the route plan report"""
+        planned = []
+
+        for route in routes:
+            path = [0] + route + [0]
+            distance = float(sum(distances[a, b] for a, b in zip(path[:-1], path[1:])))
+            volume = sum(loads[stop - 1]['volume'] for stop in route)
+            weight = sum(loads[stop - 1]['weight'] for stop in route)
+            volume_utilization = volume / self.truck_volume_capacity * 100
+            weight_utilization = weight / self.truck_weight_capacity * 100
+
+            planned.append({
+                'stops': [loads[stop - 1]['destination'] for stop in route],
+                'coordinates': [coordinates[stop] for stop in path],
+                'distance_km': distance,
+                'volume': volume,
+                'weight': weight,
+                'volume_utilization': volume_utilization,
+                'weight_utilization': weight_utilization,
+                'utilization': max(volume_utilization, weight_utilization)
+            })
+
+        return {
+            'depot': self.depot,
+            'routes': planned,
+            'total_distance_km': sum(route['distance_km'] for route in planned),
+            'trucks_needed': len(planned) + sum(load['trucks'] for load in dedicated),
+            'dedicated_loads': dedicated,
+            'unresolved_destinations': sorted(set(unresolved))
+        }
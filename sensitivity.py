@@ -0,0 +1,72 @@
+from typing import List, Dict, Any
+
+import numpy as np
+
+
+def capacity_grid(truck_types: Dict[str, Dict[str, float]], size: int = 200, span: float = 0.5) -> Dict[str, np.ndarray]:
+    """
+    Build evenly spaced capacity values around each truck type's current specification
+
+    Args:
+        truck_types: Dictionary of truck types with their specifications
+        size: Number of grid points per capacity axis
+        span: Relative range around the current value (0.5 covers -50% to +50%)
+
+    Returns:
+        Dictionary with 'volume' and 'weight' arrays of shape (truck types, size)
+    """
+    specs = list(truck_types.values())
+    volumes = np.array([spec['volume'] for spec in specs], dtype=float)
+    weights = np.array([spec['weight'] for spec in specs], dtype=float)
+    steps = np.linspace(1 - span, 1 + span, size)
+
+    return {
+        'volume': volumes[:, None] * steps[None, :],
+        'weight': weights[:, None] * steps[None, :]
+    }
+
+
+def capacity_sensitivity(skus: List[Dict[str, Any]], truck_types: Dict[str, Dict[str, float]],
+                         size: int = 200, span: float = 0.5) -> Dict[str, Any]:
+    """
+    Evaluate the manifest over a grid of volume and weight capacities for every truck type
+
+    Uses the same rules as TruckCalculator.calculate_requirements, broadcast over an
+    array of shape (truck types, volume values, weight values).
+
+    Args:
+        skus: List of SKU dictionaries
+        truck_types: Dictionary of truck types with their specifications
+        size: Number of grid points per capacity axis
+        span: Relative range around the current value
+
+    Returns:
+        Dictionary with the capacity axes and per-type 'trucks_needed' and 'utilization' matrices
+    """
+    total_volume = sum(sku['total_volume'] for sku in skus)
+    total_weight = sum(sku['total_weight'] for sku in skus)
+    grid = capacity_grid(truck_types, size, span)
+
+    volume_capacity = grid['volume'][:, :, None]
+    weight_capacity = grid['weight'][:, None, :]
+
+    trucks_volume = np.ceil(total_volume / volume_capacity)
+    trucks_weight = np.ceil(total_weight / weight_capacity)
+    trucks_needed = np.maximum(trucks_volume, trucks_weight)
+
+    # Utilization follows the limiting factor, volume winning ties as in TruckCalculator
+    with np.errstate(divide='ignore', invalid='ignore'):
+        utilization = np.where(
+            trucks_volume >= trucks_weight,
+            total_volume / (volume_capacity * trucks_needed),
+            total_weight / (weight_capacity * trucks_needed)
+        ) * 100
+    utilization = np.nan_to_num(utilization)
+
+    return {
+        'truck_types': list(truck_types.keys()),
+        'volume_values': grid['volume'],
+        'weight_values': grid['weight'],
+        'trucks_needed': trucks_needed.astype(int),
+        'utilization': utilization
+    }
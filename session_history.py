@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import uuid
+import weakref
+from collections import deque
+from typing import List, Dict, Any, Optional
+
+# Summary records kept per session
+DEFAULT_MAX_ENTRIES = 20
+
+# Hours after which spilled details left behind by ended sessions or processes are swept
+DEFAULT_SPILL_TTL_HOURS = 24
+
+
+def _remove_session_files(spill_dir: str, session_id: str):
+    """Delete every spilled detail file of one session"""
+    try:
+        entries = list(os.scandir(spill_dir))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.name.startswith(f"{session_id}_") and entry.name.endswith('.json'):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def sweep_spill_dir(spill_dir: str, ttl_hours: float) -> int:
+    """
+    Delete spilled detail files older than the TTL
+
+    Catches files of sessions whose cleanup never ran, e.g. after the server process was killed.
+
+    Args:
+        spill_dir: Spill directory
+        ttl_hours: Age in hours after which a file is deleted
+
+    Returns:
+        Number of files deleted
+    """
+    cutoff = time.time() - ttl_hours * 3600
+    removed = 0
+    try:
+        entries = list(os.scandir(spill_dir))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.name.endswith('.json') and entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+class SessionHistory:
+    """Fixed-size session history of compact summaries with optional on-disk details"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, spill_dir: Optional[str] = None):
+        """
+        Initialize session history
+
+        Args:
+            max_entries: Number of summaries kept; older entries are evicted
+            spill_dir: Directory for full calculation details, defaults to SESSION_SPILL_DIR (disabled if unset)
+        """
+        self.max_entries = max_entries
+        self.spill_dir = spill_dir or os.getenv('SESSION_SPILL_DIR')
+        self.session_id = uuid.uuid4().hex
+        self._entries = deque()
+        self._next_id = 0
+
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            sweep_spill_dir(self.spill_dir, float(os.getenv('SESSION_SPILL_TTL_HOURS', DEFAULT_SPILL_TTL_HOURS)))
+            # The session's files go when its history is dropped with the session state
+            self._cleanup = weakref.finalize(self, _remove_session_files, self.spill_dir, self.session_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __bool__(self) -> bool:
+        return bool(self._entries)
+
+    def append(self, calculation_data: Dict[str, Any]):
+        """Record a calculation as a summary, spilling the full details to disk if enabled"""
+        entry_id = self._next_id
+        self._next_id += 1
+
+        results = calculation_data['results']
+        summary = {
+            'id': entry_id,
+            'destination': calculation_data['destination'],
+            'truck_type': calculation_data['truck_type'],
+            'timestamp': calculation_data['timestamp'],
+            'sku_count': len(calculation_data['skus']),
+            'trucks_needed': results['trucks_needed'],
+            'utilization_percentage': results['utilization_percentage'],
+            'has_details': False
+        }
+
+        if self.spill_dir:
+            with open(self._detail_path(entry_id), 'w') as f:
+                json.dump(calculation_data, f, default=str)
+            summary['has_details'] = True
+
+        self._entries.append(summary)
+        while len(self._entries) > self.max_entries:
+            self._discard(self._entries.popleft())
+
+    def recent(self, count: int) -> List[Dict[str, Any]]:
+        """Most recent summaries, newest first"""
+        return list(self._entries)[-count:][::-1]
+
+    def load_details(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        """Reload the full calculation of an entry from disk, or None if it was not spilled"""
+        if not self.spill_dir:
+            return None
+
+        try:
+            with open(self._detail_path(entry_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def clear(self):
+        """Remove every entry and its spilled details"""
+        while self._entries:
+            self._discard(self._entries.popleft())
+
+    def _discard(self, summary: Dict[str, Any]):
+        """Delete the spilled details of an evicted entry"""
+        if summary['has_details']:
+            try:
+                os.remove(self._detail_path(summary['id']))
+            except OSError:
+                pass
+
+    def _detail_path(self, entry_id: int) -> str:
+        """File holding the details of an entry"""
+        return os.path.join(self.spill_dir, f"{self.session_id}_{entry_id}.json")
@@ -0,0 +1,254 @@
+import math
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+# Centroid budget of a t-digest; error near the tails is roughly 1/compression
+DEFAULT_COMPRESSION = 100
+
+# HyperLogLog precision: 2^12 one-byte registers, about 1.6% standard error
+DEFAULT_PRECISION = 12
+
+
+class TDigest:
+    """Mergeable t-digest for streaming quantiles"""
+
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        """
+        Initialize digest
+
+        Args:
+            compression: Centroid budget; more centroids give tighter quantiles
+        """
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def add(self, value: float, weight: float = 1.0):
+        """Add one observation"""
+        self.add_many([value], [weight])
+
+    def add_many(self, values: Iterable[float], weights: Optional[Iterable[float]] = None):
+        """Add observations and recompress"""
+        values = np.asarray(list(values), dtype=float)
+        if values.size == 0:
+            return
+        weights = np.ones_like(values) if weights is None else np.asarray(list(weights), dtype=float)
+
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, weights]))
+
+    def merge(self, other: 'TDigest'):
+        """Fold another digest into this one"""
+        if other.weights.size == 0:
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Approximate quantile
+
+        Args:
+            q: Quantile between 0 and 1
+
+        Returns:
+            Estimated value, or None for an empty digest
+        """
+        if self.weights.size == 0:
+            return None
+        if self.weights.size == 1:
+            return float(self.means[0])
+
+        total = self.weights.sum()
+        # Centroid i covers the cumulative weight around its center
+        centers = np.cumsum(self.weights) - self.weights / 2
+        target = q * total
+
+        if target <= centers[0]:
+            return float(np.interp(target, [0, centers[0]], [self.min, self.means[0]]))
+        if target >= centers[-1]:
+            return float(np.interp(target, [centers[-1], total], [self.means[-1], self.max]))
+        return float(np.interp(target, centers, self.means))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact form for storing in a document"""
+        return {
+            'compression': self.compression,
+            'means': self.means.astype('<f8').tobytes(),
+            'weights': self.weights.astype('<f8').tobytes(),
+            'min': self.min if self.weights.size else None,
+            'max': self.max if self.weights.size else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'TDigest':
+        """Rebuild a digest stored with to_dict"""
+        digest = cls(data['compression'] if data else DEFAULT_COMPRESSION)
+        if data and data.get('means'):
+            digest.means = np.frombuffer(data['means'], dtype='<f8').copy()
+            digest.weights = np.frombuffer(data['weights'], dtype='<f8').copy()
+            digest.min = data['min']
+            digest.max = data['max']
+        return digest
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        """Merge neighbouring centroids while they stay within the k1 scale budget"""
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+
+        def k(q):
+            return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+        merged_means = [means[0]]
+        merged_weights = [weights[0]]
+        cumulative = 0.0
+        k_left = k(0.0)
+
+        for mean, weight in zip(means[1:].tolist(), weights[1:].tolist()):
+            proposed = merged_weights[-1] + weight
+            if k((cumulative + proposed) / total) - k_left <= 1.0:
+                merged_means[-1] += (mean - merged_means[-1]) * weight / proposed
+                merged_weights[-1] = proposed
+            else:
+                cumulative += merged_weights[-1]
+                k_left = k(cumulative / total)
+                merged_means.append(mean)
+                merged_weights.append(weight)
+
+        self.means = np.array(merged_means)
+        self.weights = np.array(merged_weights)
+
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch"""
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        """
+        Initialize sketch
+
+        Args:
+            precision: Number of index bits; uses 2^precision registers
+        """
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, item: str):
+        """Add one item"""
+        value = int.from_bytes(hashlib.blake2b(str(item).encode('utf-8'), digest_size=8).digest(), 'big')
+        index = value >> (64 - self.precision)
+        remainder = value & ((1 << (64 - self.precision)) - 1)
+        # Position of the leftmost 1-bit in the remaining bits
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        """Fold another sketch of the same precision into this one"""
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        """Estimated number of distinct items"""
+        m = self.registers.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(float)))
+
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact form for storing in a document"""
+        return {'precision': self.precision, 'registers': self.registers.tobytes()}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'HyperLogLog':
+        """Rebuild a sketch stored with to_dict"""
+        sketch = cls(data['precision'] if data else DEFAULT_PRECISION)
+        if data:
+            sketch.registers = np.frombuffer(data['registers'], dtype=np.uint8).copy()
+        return sketch
+
+
+class CalculationSketch:
+    """Utilization and truck quantiles plus distinct destinations and SKUs for a set of calculations"""
+
+    def __init__(self):
+        self.calculations = 0
+        self.utilization = TDigest()
+        self.trucks_needed = TDigest()
+        self.destinations = HyperLogLog()
+        self.skus = HyperLogLog()
+
+    def add(self, calculation: Dict[str, Any]):
+        """Add one calculation"""
+        results = calculation.get('results', {})
+        self.calculations += 1
+        self.utilization.add(float(results.get('utilization_percentage', 0) or 0))
+        self.trucks_needed.add(float(results.get('trucks_needed', 0) or 0))
+        self.destinations.add(' '.join(str(calculation.get('destination', '')).lower().split()))
+        for sku in calculation.get('skus', []):
+            self.skus.add(' '.join(str(sku['name']).lower().split()))
+
+    def merge(self, other: 'CalculationSketch'):
+        """Fold another sketch into this one"""
+        self.calculations += other.calculations
+        self.utilization.merge(other.utilization)
+        self.trucks_needed.merge(other.trucks_needed)
+        self.destinations.merge(other.destinations)
+        self.skus.merge(other.skus)
+
+    def summary(self) -> Dict[str, Any]:
+        """Percentiles and distinct counts for display"""
+        return {
+            'calculations': self.calculations,
+            'utilization_p10': self.utilization.quantile(0.1),
+            'utilization_p50': self.utilization.quantile(0.5),
+            'utilization_p90': self.utilization.quantile(0.9),
+            'trucks_p50': self.trucks_needed.quantile(0.5),
+            'trucks_p90': self.trucks_needed.quantile(0.9),
+            'distinct_destinations': self.destinations.count() if self.calculations else 0,
+            'distinct_skus': self.skus.count() if self.calculations else 0
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact form for storing in a document"""
+        return {
+            'calculations': self.calculations,
+            'utilization': self.utilization.to_dict(),
+            'trucks_needed': self.trucks_needed.to_dict(),
+            'destinations': self.destinations.to_dict(),
+            'skus': self.skus.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'CalculationSketch':
+        """Rebuild a sketch stored with to_dict"""
+        sketch = cls()
+        if data:
+            sketch.calculations = data['calculations']
+            sketch.utilization = TDigest.from_dict(data['utilization'])
+            sketch.trucks_needed = TDigest.from_dict(data['trucks_needed'])
+            sketch.destinations = HyperLogLog.from_dict(data['destinations'])
+            sketch.skus = HyperLogLog.from_dict(data['skus'])
+        return sketch
+
+
+def sketch_day(timestamp) -> str:
+    """Day partition of a calculation timestamp"""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return timestamp.strftime('%Y-%m-%d')
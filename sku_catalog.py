@@ -0,0 +1,169 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict, Counter
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Optional
+
+# Upper bound on names scored per fuzzy lookup
+FUZZY_CANDIDATES = 50
+
+# Upper bound on posting-list entries counted per fuzzy lookup
+FUZZY_POSTING_BUDGET = 2000
+
+
+def normalize_sku_name(name: str) -> str:
+    """Normalize a SKU name for case- and whitespace-insensitive lookups"""
+    return ' '.join(str(name).lower().split())
+
+
+def trigrams(text: str) -> set:
+    """Character trigrams of a padded string"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SkuCatalog:
+    """In-memory SKU master catalog with prefix and fuzzy name search"""
+
+    def __init__(self, items: Optional[Iterable[Dict[str, Any]]] = None):
+        """
+        Initialize catalog
+
+        Args:
+            items: Catalog items with 'name', 'volume_per_box' and 'weight_per_box'
+        """
+        self._items: Dict[str, Dict[str, Any]] = {}
+        # Sorted normalized names: a prefix is a contiguous range found by binary search
+        self._sorted_keys: List[str] = []
+        # Trigram -> normalized names, for typo-tolerant matching
+        self._trigram_index = defaultdict(set)
+        self._lock = threading.Lock()
+
+        if items:
+            self.bulk_load(items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def bulk_load(self, items: Iterable[Dict[str, Any]]):
+        """Replace the catalog contents and rebuild both indexes"""
+        with self._lock:
+            self._items = {}
+            self._trigram_index = defaultdict(set)
+            for item in items:
+                key = normalize_sku_name(item['name'])
+                self._items[key] = self._record(item)
+                for gram in trigrams(key):
+                    self._trigram_index[gram].add(key)
+            self._sorted_keys = sorted(self._items)
+
+    def add(self, item: Dict[str, Any]):
+        """Insert or update a single catalog item"""
+        key = normalize_sku_name(item['name'])
+        with self._lock:
+            if key not in self._items:
+                position = bisect_left(self._sorted_keys, key)
+                self._sorted_keys.insert(position, key)
+                for gram in trigrams(key):
+                    self._trigram_index[gram].add(key)
+            self._items[key] = self._record(item)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Exact (normalized) name lookup"""
+        return self._items.get(normalize_sku_name(name))
+
+    def prefix_search(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Catalog items whose name starts with the prefix, in alphabetical order
+
+        Args:
+            prefix: Typed name prefix
+            limit: Maximum number of matches
+
+        Returns:
+            List of catalog items
+        """
+        key = normalize_sku_name(prefix)
+        if not key:
+            return []
+
+        matches = []
+        # add() inserts into the sorted names from other sessions' reruns
+        with self._lock:
+            position = bisect_left(self._sorted_keys, key)
+            while position < len(self._sorted_keys) and len(matches) < limit:
+                candidate = self._sorted_keys[position]
+                if not candidate.startswith(key):
+                    break
+                matches.append(self._items[candidate])
+                position += 1
+
+        return matches
+
+    def fuzzy_search(self, text: str, limit: int = 10, min_similarity: float = 0.5) -> List[Dict[str, Any]]:
+        """
+        Catalog items ranked by trigram overlap, tolerant of typos
+
+        Candidates are counted over the posting lists of the rarest query trigrams within
+        a fixed budget, so the cost does not grow with the catalog.
+
+        Args:
+            text: Typed name
+            limit: Maximum number of matches
+            min_similarity: Minimum share of the query trigrams a match must contain
+
+        Returns:
+            List of catalog items, best match first
+        """
+        key = normalize_sku_name(text)
+        if not key:
+            return []
+
+        query = trigrams(key)
+
+        # add() extends the posting sets from other sessions' reruns
+        with self._lock:
+            postings = sorted(
+                (self._trigram_index[gram] for gram in query if gram in self._trigram_index),
+                key=len
+            )
+            if not postings:
+                return []
+
+            hits = Counter()
+            counted = 0
+            for posting in postings:
+                if counted and counted + len(posting) > FUZZY_POSTING_BUDGET:
+                    break
+                hits.update(islice(posting, FUZZY_POSTING_BUDGET))
+                counted += len(posting)
+
+            scored = []
+            for candidate, _ in hits.most_common(FUZZY_CANDIDATES):
+                overlap = len(query & trigrams(candidate)) / len(query)
+                if overlap >= min_similarity:
+                    scored.append((-overlap, len(candidate), candidate))
+
+            scored.sort()
+            return [self._items[candidate] for _, _, candidate in scored[:limit]]
+
+    def search(self, text: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Prefix matches first, topped up with fuzzy matches"""
+        matches = self.prefix_search(text, limit)
+        if len(matches) < limit:
+            seen = {normalize_sku_name(item['name']) for item in matches}
+            for item in self.fuzzy_search(text, limit):
+                if normalize_sku_name(item['name']) not in seen:
+                    matches.append(item)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    @staticmethod
+    def _record(item: Dict[str, Any]) -> Dict[str, Any]:
+        """Catalog record as exposed to callers"""
+        return {
+            'name': item['name'],
+            'volume_per_box': float(item['volume_per_box']),
+            'weight_per_box': float(item['weight_per_box'])
+        }
@@ -0,0 +1,93 @@
+from typing import List, Dict, Any
+
+import numpy as np
+
+PACKED_FORMAT = 'packed-v1'
+
+
+def encode_skus(skus: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Pack a SKU list into binary columns
+
+    Names go into a string table referenced by int32 indexes, quantities are int32 and
+    per-box volume/weight float32. Derived totals are dropped and rebuilt on decode.
+
+    Args:
+        skus: List of SKU dictionaries
+
+    Returns:
+        Dictionary of binary columns suitable for storing in a document
+    """
+    names = []
+    name_index = {}
+    indexes = np.empty(len(skus), dtype='<i4')
+
+    for i, sku in enumerate(skus):
+        name = sku['name']
+        if name not in name_index:
+            name_index[name] = len(names)
+            names.append(name)
+        indexes[i] = name_index[name]
+
+    return {
+        'format': PACKED_FORMAT,
+        'count': len(skus),
+        'names': '\0'.join(names).encode('utf-8'),
+        'name_index': indexes.tobytes(),
+        'quantity': np.array([sku['quantity'] for sku in skus], dtype='<i4').tobytes(),
+        'volume_per_box': np.array([sku['volume_per_box'] for sku in skus], dtype='<f4').tobytes(),
+        'weight_per_box': np.array([sku['weight_per_box'] for sku in skus], dtype='<f4').tobytes()
+    }
+
+
+def decode_skus(packed: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Rebuild the SKU list from binary columns
+
+    Args:
+        packed: Dictionary produced by encode_skus
+
+    Returns:
+        List of SKU dictionaries including total_volume and total_weight
+    """
+    if packed.get('format') != PACKED_FORMAT:
+        raise ValueError(f"Unsupported SKU format '{packed.get('format')}'")
+
+    if packed['count'] == 0:
+        return []
+
+    names = bytes(packed['names']).decode('utf-8').split('\0')
+    indexes = np.frombuffer(bytes(packed['name_index']), dtype='<i4')
+    quantities = np.frombuffer(bytes(packed['quantity']), dtype='<i4').tolist()
+    # Shortest float32 repr round-trips the values as typed (0.1 rather than 0.10000000149)
+    volumes = np.frombuffer(bytes(packed['volume_per_box']), dtype='<f4').astype(str).astype(float).tolist()
+    weights = np.frombuffer(bytes(packed['weight_per_box']), dtype='<f4').astype(str).astype(float).tolist()
+
+    return [
+        {
+            'name': names[index],
+            'quantity': quantity,
+            'volume_per_box': volume,
+            'weight_per_box': weight,
+            'total_volume': quantity * volume,
+            'total_weight': quantity * weight
+        }
+        for index, quantity, volume, weight in zip(indexes.tolist(), quantities, volumes, weights)
+    ]
+
+
+def pack_calculation(calculation: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of a calculation document with its SKUs in packed form"""
+    if 'skus' not in calculation:
+        return calculation
+
+    packed = {key: value for key, value in calculation.items() if key != 'skus'}
+    packed['skus_packed'] = encode_skus(calculation['skus'])
+    return packed
+
+
+def unpack_calculation(calculation: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode packed SKUs in place so readers always see a plain 'skus' list"""
+    if 'skus_packed' in calculation:
+        calculation['skus'] = decode_skus(calculation.pop('skus_packed'))
+    return calculation
@@ -0,0 +1,117 @@
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+DISTRIBUTIONS = ('uniform', 'normal', 'triangular')
+
+# Upper bound on sampled cells (scenarios x SKUs) held in memory per batch
+MAX_BATCH_CELLS = 2_000_000
+
+
+def sample_quantities(rng: np.random.Generator, quantities: np.ndarray, spreads: np.ndarray,
+                      distribution: str, scenarios: int) -> np.ndarray:
+    """
+    Draw integer quantities for a batch of scenarios
+
+    Args:
+        rng: NumPy random generator
+        quantities: Planned quantity per SKU
+        spreads: Relative variation per SKU (0.15 means ±15%)
+        distribution: One of 'uniform', 'normal' or 'triangular'
+        scenarios: Number of scenarios in the batch
+
+    Returns:
+        Array of shape (scenarios, SKUs)
+    """
+    shape = (scenarios, len(quantities))
+
+    if distribution == 'uniform':
+        factors = rng.uniform(1 - spreads, 1 + spreads, size=shape)
+    elif distribution == 'normal':
+        # The spread is treated as a 2-sigma band
+        factors = rng.normal(1.0, spreads / 2, size=shape)
+    elif distribution == 'triangular':
+        factors = 1 + spreads * (rng.random(shape) + rng.random(shape) - 1)
+    else:
+        raise ValueError(f"Unknown distribution '{distribution}'")
+
+    return np.maximum(np.rint(quantities * factors), 0)
+
+
+def simulate_demand(skus: List[Dict[str, Any]], truck_spec: Dict[str, float], spread: float = 0.15,
+                    distribution: str = 'uniform', scenarios: int = 100_000,
+                    booked_trucks: Optional[int] = None, seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Monte Carlo distribution of trucks needed under quantity uncertainty
+
+    Scenario totals go through the same rules as TruckCalculator.calculate_requirements,
+    evaluated in vectorized batches.
+
+    Args:
+        skus: List of SKU dictionaries; an optional 'quantity_spread' overrides the spread per SKU
+        truck_spec: Dictionary containing 'volume' and 'weight' capacity
+        spread: Default relative quantity variation
+        distribution: One of 'uniform', 'normal' or 'triangular'
+        scenarios: Number of scenarios to sample
+        booked_trucks: Trucks booked; defaults to the point estimate
+        seed: Optional random seed for reproducible runs
+
+    Returns:
+        Dictionary with P50/P90/P99 trucks needed, overflow probability and a trucks histogram
+    """
+    if not skus:
+        return {}
+
+    quantities = np.array([sku['quantity'] for sku in skus], dtype=float)
+    volumes = np.array([sku['volume_per_box'] for sku in skus], dtype=float)
+    weights = np.array([sku['weight_per_box'] for sku in skus], dtype=float)
+    spreads = np.array([sku.get('quantity_spread', spread) for sku in skus], dtype=float)
+
+    volume_capacity = truck_spec['volume']
+    weight_capacity = truck_spec['weight']
+
+    point_trucks = int(max(np.ceil(quantities @ volumes / volume_capacity),
+                           np.ceil(quantities @ weights / weight_capacity)))
+    if booked_trucks is None:
+        booked_trucks = point_trucks
+
+    rng = np.random.default_rng(seed)
+    batch_size = max(1, min(scenarios, MAX_BATCH_CELLS // len(skus)))
+    trucks_needed = np.empty(scenarios, dtype=np.int64)
+    utilization = np.empty(scenarios, dtype=float)
+
+    for start in range(0, scenarios, batch_size):
+        stop = min(start + batch_size, scenarios)
+        sampled = sample_quantities(rng, quantities, spreads, distribution, stop - start)
+
+        total_volume = sampled @ volumes
+        total_weight = sampled @ weights
+        trucks_volume = np.ceil(total_volume / volume_capacity)
+        trucks_weight = np.ceil(total_weight / weight_capacity)
+        trucks = np.maximum(trucks_volume, trucks_weight)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            batch_utilization = np.where(
+                trucks_volume >= trucks_weight,
+                total_volume / (volume_capacity * trucks),
+                total_weight / (weight_capacity * trucks)
+            ) * 100
+
+        trucks_needed[start:stop] = trucks
+        utilization[start:stop] = np.nan_to_num(batch_utilization)
+
+    truck_counts, frequencies = np.unique(trucks_needed, return_counts=True)
+
+    return {
+        'scenarios': scenarios,
+        'distribution': distribution,
+        'point_estimate': point_trucks,
+        'booked_trucks': booked_trucks,
+        'p50': int(np.percentile(trucks_needed, 50, method='higher')),
+        'p90': int(np.percentile(trucks_needed, 90, method='higher')),
+        'p99': int(np.percentile(trucks_needed, 99, method='higher')),
+        'mean_trucks': float(trucks_needed.mean()),
+        'overflow_probability': float((trucks_needed > booked_trucks).mean()),
+        'mean_utilization': float(utilization.mean()),
+        'histogram': {int(count): int(freq) for count, freq in zip(truck_counts, frequencies)}
+    }
@@ -227,3 +227,111 @@ def create_efficiency_gauge(utilization_percentage: float) -> go.Figure:
     
     fig.update_layout(height=300)
     return fig
+
+def create_route_map(route_plan: Dict[str, Any]) -> go.Figure:
+    """
+    Create a map of multi-stop routes starting and ending at the depot
+    
+    Args:
+        route_plan: Results from RoutePlanner.plan
+        
+    Returns:
+        Plotly figure object
+    """
+    fig = go.Figure()
+    
+    for i, route in enumerate(route_plan['routes']):
+        latitudes = [point[0] for point in route['coordinates']]
+        longitudes = [point[1] for point in route['coordinates']]
+        
+        fig.add_trace(go.Scattergeo(
+            lat=latitudes,
+            lon=longitudes,
+            mode='lines+markers',
+            name=f"Truck {i + 1} ({route['utilization']:.0f}%)",
+            text=[route_plan['depot']] + route['stops'] + [route_plan['depot']],
+            hoverinfo='text',
+            line=dict(width=2),
+            marker=dict(size=6)
+        ))
+    
+    fig.update_layout(
+        title='Planned Routes',
+        geo=dict(scope='north america', showland=True, landcolor='rgb(243, 243, 243)'),
+        showlegend=True,
+        height=500
+    )
+    
+    return fig
+
+def create_sensitivity_heatmap(sensitivity: Dict[str, Any], truck_index: int, metric: str = 'trucks_needed') -> go.Figure:
+    """
+    Create a heatmap of trucks needed or utilization over volume and weight capacity
+    
+    Args:
+        sensitivity: Results from capacity_sensitivity
+        truck_index: Position of the truck type in sensitivity['truck_types']
+        metric: 'trucks_needed' or 'utilization'
+        
+    Returns:
+        Plotly figure object
+    """
+    truck_type = sensitivity['truck_types'][truck_index]
+    is_trucks = metric == 'trucks_needed'
+    
+    fig = go.Figure(go.Heatmap(
+        z=sensitivity[metric][truck_index],
+        x=sensitivity['weight_values'][truck_index],
+        y=sensitivity['volume_values'][truck_index],
+        colorscale='Blues' if is_trucks else 'RdYlGn',
+        colorbar=dict(title='Trucks' if is_trucks else 'Utilization %'),
+        hovertemplate='Weight: %{x:.0f} kg<br>Volume: %{y:.1f} m³<br>Value: %{z:.1f}<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title=f"{truck_type} Truck - {'Trucks Needed' if is_trucks else 'Utilization %'}",
+        xaxis_title='Weight Capacity (kg)',
+        yaxis_title='Volume Capacity (m³)',
+        height=450
+    )
+    
+    return fig
+
+def create_truck_distribution_chart(simulation: Dict[str, Any]) -> go.Figure:
+    """
+    Create a bar chart of the simulated trucks-needed distribution
+    
+    Args:
+        simulation: Results from simulate_demand
+        
+    Returns:
+        Plotly figure object
+    """
+    truck_counts = list(simulation['histogram'].keys())
+    probabilities = [freq / simulation['scenarios'] * 100 for freq in simulation['histogram'].values()]
+    colors = ['indianred' if count > simulation['booked_trucks'] else 'lightblue' for count in truck_counts]
+    
+    fig = go.Figure(go.Bar(
+        x=truck_counts,
+        y=probabilities,
+        marker_color=colors,
+        text=[f'{p:.1f}%' for p in probabilities],
+        textposition='outside'
+    ))
+    
+    fig.add_vline(
+        x=simulation['booked_trucks'] + 0.5,
+        line_dash='dash',
+        line_color='red',
+        annotation_text='Booked capacity'
+    )
+    
+    fig.update_layout(
+        title='Trucks Needed Across Demand Scenarios',
+        xaxis_title='Trucks Needed',
+        yaxis_title='Probability (%)',
+        xaxis=dict(dtick=1),
+        height=400
+    )
+    
+    return fig
@@ -0,0 +1,287 @@
+import os
+import math
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.anytime_packing import AnytimePacker
+from utils.calculations import TruckCalculator
+
+# Manifest columns, one float64 row per SKU
+MANIFEST_COLUMNS = ('quantity', 'volume_per_box', 'weight_per_box')
+
+# Manifests each worker keeps attached between tasks
+WORKER_ATTACHMENTS = 8
+
+# Below this many SKU rows the workers cost more than they save
+SHARED_SOLVE_THRESHOLD = 2000
+
+# Seconds between worker checks for attached manifests the parent has unlinked
+WORKER_RELEASE_SECONDS = 2.0
+
+# (shared memory block name, number of SKU rows)
+ManifestHandle = Tuple[str, int]
+
+
+class SharedManifest:
+    """SKU quantities, box volumes and box weights in one shared memory block"""
+
+    def __init__(self, quantity: np.ndarray, volume_per_box: np.ndarray, weight_per_box: np.ndarray):
+        """
+        Copy the manifest columns into a new shared memory block
+
+        Args:
+            quantity: Boxes per SKU
+            volume_per_box: Box volume per SKU
+            weight_per_box: Box weight per SKU
+        """
+        rows = len(quantity)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(rows * len(MANIFEST_COLUMNS) * 8, 1))
+        self.array = np.ndarray((len(MANIFEST_COLUMNS), rows), dtype=np.float64, buffer=self._shm.buf)
+        self.array[0] = quantity
+        self.array[1] = volume_per_box
+        self.array[2] = weight_per_box
+
+    @classmethod
+    def from_skus(cls, skus: List[Dict[str, Any]]) -> 'SharedManifest':
+        """Manifest of SKU dictionaries, in list order"""
+        return cls(
+            np.fromiter((sku['quantity'] for sku in skus), dtype=np.float64, count=len(skus)),
+            np.fromiter((sku['volume_per_box'] for sku in skus), dtype=np.float64, count=len(skus)),
+            np.fromiter((sku['weight_per_box'] for sku in skus), dtype=np.float64, count=len(skus))
+        )
+
+    @property
+    def handle(self) -> ManifestHandle:
+        """What a task needs to attach the manifest; this is all that gets pickled"""
+        return self._shm.name, self.array.shape[1]
+
+    @property
+    def rows(self) -> int:
+        return self.array.shape[1]
+
+    def close(self):
+        """Release and remove the block"""
+        if self._shm is None:
+            return
+        del self.array
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def __enter__(self) -> 'SharedManifest':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Worker side: block name -> open shared memory, least recently used first
+_attached: 'OrderedDict[str, shared_memory.SharedMemory]' = OrderedDict()
+_attached_lock = threading.Lock()
+
+
+def attach_manifest(handle: ManifestHandle) -> np.ndarray:
+    """
+    Read-only view of a shared manifest, with rows quantity, volume_per_box and weight_per_box
+
+    Blocks stay attached across tasks, so a manifest fanned out over many tasks is mapped
+    once per worker.
+    """
+    name, rows = handle
+    with _attached_lock:
+        shm = _attached.get(name)
+        if shm is None:
+            shm = shared_memory.SharedMemory(name=name)
+            _attached[name] = shm
+            while len(_attached) > WORKER_ATTACHMENTS:
+                _, oldest = _attached.popitem(last=False)
+                oldest.close()
+        else:
+            _attached.move_to_end(name)
+
+    view = np.ndarray((len(MANIFEST_COLUMNS), rows), dtype=np.float64, buffer=shm.buf)
+    view.flags.writeable = False
+    return view
+
+
+def _unlinked(name: str) -> bool:
+    """Whether the parent has removed a shared memory block"""
+    try:
+        probe = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return True
+    probe.close()
+    return False
+
+
+def release_unlinked_manifests() -> int:
+    """
+    Close attachments whose block the parent has unlinked
+
+    An unlinked block's memory is only freed once every process has closed it, so
+    finished manifests must not stay mapped in idle workers.
+
+    Returns:
+        Number of attachments closed
+    """
+    released = 0
+    with _attached_lock:
+        for name in [name for name in _attached if _unlinked(name)]:
+            try:
+                _attached[name].close()
+            except BufferError:
+                # A task still reads it; try again on the next pass
+                continue
+            del _attached[name]
+            released += 1
+    return released
+
+
+def _release_loop():
+    while True:
+        time.sleep(WORKER_RELEASE_SECONDS)
+        release_unlinked_manifests()
+
+
+def _start_worker():
+    """Worker initializer: release finished manifests in the background"""
+    threading.Thread(target=_release_loop, name='manifest-release', daemon=True).start()
+
+
+def _manifest_totals(handle: ManifestHandle, start: int, stop: int) -> Tuple[float, float]:
+    """Total volume and weight of a slice of SKU rows"""
+    manifest = attach_manifest(handle)
+    quantity = manifest[0, start:stop]
+    return float(quantity @ manifest[1, start:stop]), float(quantity @ manifest[2, start:stop])
+
+
+def _pack_truck_type(handle: ManifestHandle, truck_spec: Dict[str, float], time_budget: float) -> Dict[str, Any]:
+    """Anytime packing of the whole manifest into one truck type"""
+    manifest = attach_manifest(handle)
+    return AnytimePacker(truck_spec, seed=0).solve_arrays(manifest[1], manifest[2], manifest[0], time_budget=time_budget)
+
+
+class SharedWorkerPool:
+    """Persistent process pool whose tasks read manifests from shared memory instead of pickled copies"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Initialize worker pool; processes start on first use
+
+        Args:
+            max_workers: Worker processes, defaults to SOLVER_WORKERS or the CPU count
+        """
+        self.max_workers = max_workers or int(os.getenv('SOLVER_WORKERS', '0')) or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def map(self, fn: Callable[..., Any], manifest: SharedManifest, tasks: List[Tuple],
+            progress: Optional[Callable[[float, str], None]] = None) -> List[Any]:
+        """
+        Run fn(handle, *task) for every task, in order
+
+        Args:
+            fn: Module-level function taking the manifest handle first
+            manifest: Shared manifest the tasks read
+            tasks: Extra arguments per task
+            progress: Optional callback receiving the completed share; raising from it cancels the queued tasks
+
+        Returns:
+            Task results in task order
+        """
+        futures = [self._pool().submit(fn, manifest.handle, *task) for task in tasks]
+        try:
+            results = []
+            for done, future in enumerate(futures, start=1):
+                results.append(future.result())
+                if progress:
+                    progress(done / len(futures), f"{done} of {len(futures)} tasks")
+            return results
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """The process pool, started on first use"""
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the server's threads; the start-up cost is paid once
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=get_context('spawn'),
+                                                     initializer=_start_worker)
+            return self._executor
+
+
+def manifest_totals(manifest: SharedManifest, pool: SharedWorkerPool) -> Tuple[float, float]:
+    """Total volume and weight of a manifest, summed in slices across the workers"""
+    chunk = max(math.ceil(manifest.rows / pool.max_workers), 1)
+    tasks = [(start, min(start + chunk, manifest.rows)) for start in range(0, manifest.rows, chunk)]
+    partials = pool.map(_manifest_totals, manifest, tasks)
+    return sum(volume for volume, _ in partials), sum(weight for _, weight in partials)
+
+
+def evaluate_truck_types(manifest: SharedManifest, truck_types: Dict[str, Dict[str, float]],
+                         pool: SharedWorkerPool, time_budget: float = 0,
+                         progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Compare truck types for one manifest, as TruckCalculator.optimize_truck_type does
+
+    With a time budget every truck type is also packed by the anytime solver, one type
+    per worker.
+
+    Args:
+        manifest: Shared manifest
+        truck_types: Dictionary of truck types with their specifications
+        pool: Worker pool
+        time_budget: Seconds of anytime packing per truck type; 0 skips packing
+        progress: Optional callback receiving the completed share
+
+    Returns:
+        Per truck type 'trucks_needed', 'utilization', 'total_capacity_volume' and
+        'total_capacity_weight'; with packing also 'packing', the assignment from
+        AnytimePacker.solve_arrays, whose truck count replaces the estimate
+    """
+    total_volume, total_weight = manifest_totals(manifest, pool)
+    totals = [{'total_volume': total_volume, 'total_weight': total_weight}]
+
+    packings = {}
+    if time_budget > 0:
+        names = list(truck_types)
+        solved = pool.map(_pack_truck_type, manifest, [(truck_types[name], time_budget) for name in names], progress)
+        packings = dict(zip(names, solved))
+
+    evaluation = {}
+    for name, spec in truck_types.items():
+        results = TruckCalculator(spec).calculate_requirements(totals)
+        trucks_needed = results['trucks_needed']
+        utilization = results['utilization_percentage']
+
+        if name in packings:
+            trucks_needed = len(packings[name]['contents'])
+            if trucks_needed:
+                utilization = (total_volume / (spec['volume'] * trucks_needed) if results['limiting_factor'] == 'volume'
+                               else total_weight / (spec['weight'] * trucks_needed)) * 100
+
+        evaluation[name] = {
+            'trucks_needed': trucks_needed,
+            'utilization': utilization,
+            'total_capacity_volume': spec['volume'] * trucks_needed,
+            'total_capacity_weight': spec['weight'] * trucks_needed
+        }
+        if name in packings:
+            evaluation[name]['packing'] = packings[name]
+
+    return evaluation